@@ -1,5 +1,18 @@
 import streamlit as st
 import config
+from src.dbConfig import dbConfig
+
+db = dbConfig()
+
+# Verifica a conexão com o banco de dados (com uma tentativa de reconexão) antes de carregar as páginas
+if not db.verifica_conexao():
+    st.error("Não foi possível conectar ao banco de dados. Verifique database.MONGO_URI nos secrets e se o servidor está acessível.", icon="🚨")
+    st.stop()
+
+# Garante os índices do banco de dados uma única vez por processo. Índices que não puderam ser criados
+# (ex.: competências duplicadas impedindo um índice único) são exibidos como aviso, sem interromper a aplicação
+for falha in db.garante_indices():
+    st.warning(f"{falha} Execute `python manutencao.py cria-indices --remove-duplicados`.", icon="⚠️")
 
 # Dicionário que mapeia as páginas da aplicação
 pages = {
@@ -10,6 +23,12 @@ pages = {
             title="Início",
             icon=config.ICON_PAGE_HOME
         ),
+        # Define a página com o status de envio e consolidação de todas as organizações
+        st.Page(
+            page="pages/rede.py",
+            title="Status da Rede",
+            icon=config.ICON_PAGE_REDE
+        ),
         # Define a página para envio de métricas
         st.Page(
             page="pages/envioMetricas.py",
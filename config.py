@@ -1,8 +1,11 @@
 MONTH_MASK = { 1 :"Janeiro", 2 :"Fevereiro", 3 :"Março", 4 :"Abril", 5 :"Maio", 6 :"Junho", 7 :"Julho", 8 :"Agosto", 9 :"Setembro", 10:"Outubro", 11:"Novembro", 12:"Dezembro" }
+# Colunas dos meses na grade de status da página inicial (App.monta_historico)
+MESES_HISTORICO = ["JAN", "FEV", "MAR", "ABR", "MAIO", "JUN", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
 YEARS = [ 2023, 2024 ]
 ICON_PAGE_HOME = ":material/home:"
 ICON_PAGE_CONSOLIDACAO = ":material/add_chart:"
 ICON_PAGE_ENVIO_METRICAS = ":material/cloud_upload:"
+ICON_PAGE_REDE = ":material/grid_view:"
 PATH_LOGO = "img/ecg_40dp_999999.svg"
 PATH_HOME_IMG = "img/planet_100dp_999999.svg"
 COLUNAS_OBIGATORIAS = ['cd_cnes', 'ano', 'mes', 'partos_vaginais', 'partos_cesareos',
@@ -34,3 +37,220 @@ COLUNAS_OBIGATORIAS = ['cd_cnes', 'ano', 'mes', 'partos_vaginais', 'partos_cesar
        'cli_profilaxia', 'cir_orto_total_pacientes', 'cir_orto_profilaxia',
        'cir_nao_orto_total_pacientes', 'cir_nao_orto_profilaxia',
        'quedas_com_dano', 'eventos_sentinela']
+
+# Esquema de tipos do CSV de métricas: tempos aceitam decimais, demais colunas são contagens inteiras.
+# Os blocos são lidos com os tipos inferidos e convertidos para este esquema após a validação (App.converte_tipos),
+# para que valores ausentes, não numéricos ou com casas decimais em colunas inteiras sejam reportados pela validação, e não como erro de conversão.
+COLUNAS_TEMPO = ['total_tempo_permanencia_emergencia_hr', 'tempo_total_emergencia_nvl2_min', 'tempo_total_emergencia_nvl3_min']
+TIPOS_COLUNAS = { coluna: ("float64" if coluna in COLUNAS_TEMPO else "int64") for coluna in COLUNAS_OBIGATORIAS }
+TAMANHO_BLOCO_UPLOAD = 5000
+CAMPO_HASH_METRICAS = "hash_metricas"  # Impressão digital do conteúdo das métricas, gravada em metricas e resultados_kpis
+
+# Regras de validação das métricas, avaliadas de forma vetorizada por src.Validador.
+# Tipos de regra: "numerico" (valor numérico), "inteiro" (sem casas decimais), "intervalo" (entre minimo e maximo)
+# e "menor_igual" (cada coluna da esquerda não pode superar a coluna correspondente da direita).
+COLUNAS_METRICAS = [coluna for coluna in COLUNAS_OBIGATORIAS if coluna not in ['cd_cnes', 'ano', 'mes']]
+REGRAS_VALIDACAO = [
+    { "nome": "valor_nao_numerico", "tipo": "numerico", "colunas": COLUNAS_OBIGATORIAS },
+    { "nome": "valor_nao_inteiro", "tipo": "inteiro", "colunas": [coluna for coluna in COLUNAS_OBIGATORIAS if coluna not in COLUNAS_TEMPO] },
+    { "nome": "cnes_invalido", "tipo": "intervalo", "colunas": ["cd_cnes"], "minimo": 1, "maximo": 9999999 },
+    { "nome": "ano_invalido", "tipo": "intervalo", "colunas": ["ano"], "minimo": 1900, "maximo": 2100 },
+    { "nome": "mes_invalido", "tipo": "intervalo", "colunas": ["mes"], "minimo": 1, "maximo": 12 },
+    { "nome": "valor_negativo", "tipo": "intervalo", "colunas": COLUNAS_METRICAS, "minimo": 0 },
+    { "nome": "obitos_maior_que_saidas", "tipo": "menor_igual",
+      "pares": [(f"{clinica}_{faixa}_obitos", f"{clinica}_{faixa}_saidas") for clinica in ["cli", "cir"] for faixa in ["neo_precoce", "neo_tardio", "pedi", "ad", "idoso"]] },
+    { "nome": "reinternacoes_maior_que_saidas", "tipo": "menor_igual",
+      "pares": [("cli_reinternacoes", "cli_saidas_anterior"), ("cir_reinternacoes", "cir_saidas_anterior")] },
+    { "nome": "antibiotico_maior_que_cirurgias", "tipo": "menor_igual", "pares": [("cirurgias_com_antibiotico", "total_cirurgias_limpas")] },
+    { "nome": "profilaxia_maior_que_pacientes", "tipo": "menor_igual",
+      "pares": [("cli_profilaxia", "cli_total_pacientes"), ("cir_orto_profilaxia", "cir_orto_total_pacientes"), ("cir_nao_orto_profilaxia", "cir_nao_orto_total_pacientes")] },
+]
+LIMITE_RELATORIO_VALIDACAO = 1000  # Linhas do relatório de violações exibidas na página de envio
+LIMITE_ERROS_BLOCOS = 10  # Mensagens de erro exibidas na validação do envio em blocos
+
+# Registro declarativo dos KPIs: para cada KPI, o tipo de cálculo (taxa ×100, densidade ×1000 ou tempo médio)
+# e, para cada estratificação e para o valor total, as colunas somadas no numerador e no denominador.
+# A ordem das estratificações é a ordem em que aparecem no documento de resultados.
+REGISTRO_KPIS = {
+    "rkpi_1": { "calculo": "taxa",
+                "estratificacao": {},
+                "valor": (["partos_vaginais"], ["partos_vaginais", "partos_cesareos"]) },
+    "rkpi_2": { "calculo": "taxa",
+                "estratificacao": { "clinico": (["cli_reinternacoes"], ["cli_saidas_anterior"]),
+                                    "cirurgico": (["cir_reinternacoes"], ["cir_saidas_anterior"]) },
+                "valor": (["cli_reinternacoes", "cir_reinternacoes"], ["cli_saidas_anterior", "cir_saidas_anterior"]) },
+    "rkpi_3": { "calculo": "densidade",
+                "estratificacao": {},
+                "valor": (["pcr_eventos"], ["pacientes_dia"]) },
+    "rkpi_4": { "calculo": "tempo_medio",
+                "estratificacao": { "cli_neo_precoce": (["cli_neo_precoce_obitos"], ["cli_neo_precoce_saidas"]),
+                                    "cli_neo_tardio": (["cli_neo_tardio_obitos"], ["cli_neo_tardio_saidas"]),
+                                    "cli_pedi": (["cli_pedi_obitos"], ["cli_pedi_saidas"]),
+                                    "cli_ad": (["cli_ad_obitos"], ["cli_ad_saidas"]),
+                                    "cli_idoso": (["cli_idoso_obitos"], ["cli_idoso_saidas"]),
+                                    "cir_neo_precoce": (["cir_neo_precoce_obitos"], ["cir_neo_precoce_saidas"]),
+                                    "cir_neo_tardio": (["cir_neo_tardio_obitos"], ["cir_neo_tardio_saidas"]),
+                                    "cir_pedi": (["cir_pedi_obitos"], ["cir_pedi_saidas"]),
+                                    "cir_ad": (["cir_ad_obitos"], ["cir_ad_saidas"]),
+                                    "cir_idoso": (["cir_idoso_obitos"], ["cir_idoso_saidas"]),
+                                    "clinico": (["cli_neo_precoce_obitos", "cli_neo_tardio_obitos", "cli_pedi_obitos", "cli_ad_obitos", "cli_idoso_obitos"],
+                                                ["cli_neo_precoce_saidas", "cli_neo_tardio_saidas", "cli_pedi_saidas", "cli_ad_saidas", "cli_idoso_saidas"]),
+                                    "cirurgico": (["cir_neo_precoce_obitos", "cir_neo_tardio_obitos", "cir_pedi_obitos", "cir_ad_obitos", "cir_idoso_obitos"],
+                                                  ["cir_neo_precoce_saidas", "cir_neo_tardio_saidas", "cir_pedi_saidas", "cir_ad_saidas", "cir_idoso_saidas"]),
+                                    "neo_precoce": (["cli_neo_precoce_obitos", "cir_neo_precoce_obitos"], ["cli_neo_precoce_saidas", "cir_neo_precoce_saidas"]),
+                                    "neo_tardio": (["cli_neo_tardio_obitos", "cir_neo_tardio_obitos"], ["cli_neo_tardio_saidas", "cir_neo_tardio_saidas"]),
+                                    "pedi": (["cli_pedi_obitos", "cir_pedi_obitos"], ["cli_pedi_saidas", "cir_pedi_saidas"]),
+                                    "ad": (["cli_ad_obitos", "cir_ad_obitos"], ["cli_ad_saidas", "cir_ad_saidas"]),
+                                    "idoso": (["cli_idoso_obitos", "cir_idoso_obitos"], ["cli_idoso_saidas", "cir_idoso_saidas"]) },
+                "valor": (["cli_neo_precoce_obitos", "cli_neo_tardio_obitos", "cli_pedi_obitos", "cli_ad_obitos", "cli_idoso_obitos",
+                           "cir_neo_precoce_obitos", "cir_neo_tardio_obitos", "cir_pedi_obitos", "cir_ad_obitos", "cir_idoso_obitos"],
+                          ["cli_neo_precoce_saidas", "cli_neo_tardio_saidas", "cli_pedi_saidas", "cli_ad_saidas", "cli_idoso_saidas",
+                           "cir_neo_precoce_saidas", "cir_neo_tardio_saidas", "cir_pedi_saidas", "cir_ad_saidas", "cir_idoso_saidas"]) },
+    "rkpi_5": { "calculo": "tempo_medio",
+                "estratificacao": { "cli_pedi": (["cli_pedi_pacientes_dia"], ["cli_pedi_saidas"]),
+                                    "cli_ad": (["cli_ad_pacientes_dia"], ["cli_ad_saidas"]),
+                                    "cli_idoso": (["cli_idoso_pacientes_dia"], ["cli_idoso_saidas"]),
+                                    "cir_pedi": (["cir_pedi_pacientes_dia"], ["cir_pedi_saidas"]),
+                                    "cir_ad": (["cir_ad_pacientes_dia"], ["cir_ad_saidas"]),
+                                    "cir_idoso": (["cir_idoso_pacientes_dia"], ["cir_idoso_saidas"]),
+                                    "clinico": (["cli_pedi_pacientes_dia", "cli_ad_pacientes_dia", "cli_idoso_pacientes_dia"],
+                                                ["cli_pedi_saidas", "cli_ad_saidas", "cli_idoso_saidas"]),
+                                    "cirurgico": (["cir_pedi_pacientes_dia", "cir_ad_pacientes_dia", "cir_idoso_pacientes_dia"],
+                                                  ["cir_pedi_saidas", "cir_ad_saidas", "cir_idoso_saidas"]),
+                                    "pedi": (["cir_pedi_pacientes_dia", "cli_pedi_pacientes_dia"], ["cir_pedi_saidas", "cli_pedi_saidas"]),
+                                    "ad": (["cir_ad_pacientes_dia", "cli_ad_pacientes_dia"], ["cir_ad_saidas", "cli_ad_saidas"]),
+                                    "idoso": (["cir_idoso_pacientes_dia", "cli_idoso_pacientes_dia"], ["cir_idoso_saidas", "cli_idoso_saidas"]) },
+                "valor": (["cli_pedi_pacientes_dia", "cli_ad_pacientes_dia", "cli_idoso_pacientes_dia",
+                           "cir_pedi_pacientes_dia", "cir_ad_pacientes_dia", "cir_idoso_pacientes_dia"],
+                          ["cli_pedi_saidas", "cli_ad_saidas", "cli_idoso_saidas",
+                           "cir_pedi_saidas", "cir_ad_saidas", "cir_idoso_saidas"]) },
+    "rkpi_6": { "calculo": "tempo_medio",
+                "estratificacao": {},
+                "valor": (["total_tempo_permanencia_emergencia_hr"], ["total_pacientes_emergencia"]) },
+    "rkpi_7": { "calculo": "tempo_medio",
+                "estratificacao": { "nvl2": (["tempo_total_emergencia_nvl2_min"], ["pacientes_emergencia_nvl2"]),
+                                    "nvl3": (["tempo_total_emergencia_nvl3_min"], ["pacientes_emergencia_nvl2"]) },
+                "valor": (["tempo_total_emergencia_nvl2_min", "tempo_total_emergencia_nvl3_min"],
+                          ["pacientes_emergencia_nvl2", "pacientes_emergencia_nvl3"]) },
+    "rkpi_8": { "calculo": "taxa",
+                "estratificacao": {},
+                "valor": (["cirurgias_com_antibiotico"], ["total_cirurgias_limpas"]) },
+    "rkpi_9": { "calculo": "taxa",
+                "estratificacao": {},
+                "valor": (["total_infeccoes"], ["total_cirurgias_limpas_anterior"]) },
+    "rkpi_10": { "calculo": "densidade",
+                 "estratificacao": { "ui_neo": (["ui_neo_infec"], ["ui_neo_cvc_dia"]),
+                                     "ui_pedi": (["ui_pedi_infec"], ["ui_pedi_cvc_dia"]),
+                                     "ui_ad": (["ui_ad_infec"], ["ui_ad_cvc_dia"]),
+                                     "uti_neo": (["uti_neo_infec"], ["uti_neo_cvc_dia"]),
+                                     "uti_pedi": (["uti_pedi_infec"], ["uti_pedi_cvc_dia"]),
+                                     "uti_ad": (["uti_ad_infec"], ["uti_ad_cvc_dia"]),
+                                     "neo": (["ui_neo_infec", "uti_neo_infec"], ["ui_neo_cvc_dia", "uti_neo_cvc_dia"]),
+                                     "pedi": (["ui_pedi_infec", "uti_pedi_infec"], ["ui_pedi_cvc_dia", "uti_pedi_cvc_dia"]),
+                                     "ad": (["ui_ad_infec", "uti_ad_infec"], ["ui_ad_cvc_dia", "uti_ad_cvc_dia"]),
+                                     "ui": (["ui_neo_infec", "ui_pedi_infec", "ui_ad_infec"], ["ui_neo_cvc_dia", "ui_pedi_cvc_dia", "ui_ad_cvc_dia"]),
+                                     "uti": (["uti_neo_infec", "uti_pedi_infec", "uti_ad_infec"], ["uti_neo_cvc_dia", "uti_pedi_cvc_dia", "uti_ad_cvc_dia"]) },
+                 "valor": (["ui_neo_infec", "ui_pedi_infec", "ui_ad_infec", "uti_neo_infec", "uti_pedi_infec", "uti_ad_infec"],
+                           ["ui_neo_cvc_dia", "ui_pedi_cvc_dia", "ui_ad_cvc_dia", "uti_neo_cvc_dia", "uti_pedi_cvc_dia", "uti_ad_cvc_dia"]) },
+    "rkpi_11": { "calculo": "densidade",
+                 "estratificacao": { "ui_neo": (["ui_neo_itu"], ["ui_neo_cvd_dia"]),
+                                     "ui_pedi": (["ui_pedi_itu"], ["ui_pedi_cvd_dia"]),
+                                     "ui_ad": (["ui_ad_itu"], ["ui_ad_cvd_dia"]),
+                                     "uti_neo": (["uti_neo_itu"], ["uti_neo_cvd_dia"]),
+                                     "uti_pedi": (["uti_pedi_itu"], ["uti_pedi_cvd_dia"]),
+                                     "uti_ad": (["uti_ad_itu"], ["uti_ad_cvd_dia"]),
+                                     "neo": (["ui_neo_itu", "uti_neo_itu"], ["ui_neo_cvd_dia", "uti_neo_cvd_dia"]),
+                                     "pedi": (["ui_pedi_itu", "uti_pedi_itu"], ["ui_pedi_cvd_dia", "uti_pedi_cvd_dia"]),
+                                     "ad": (["ui_ad_itu", "uti_ad_itu"], ["ui_ad_cvd_dia", "uti_ad_cvd_dia"]),
+                                     "ui": (["ui_neo_itu", "ui_pedi_itu", "ui_ad_itu"], ["ui_neo_cvd_dia", "ui_pedi_cvd_dia", "ui_ad_cvd_dia"]),
+                                     "uti": (["uti_neo_itu", "uti_pedi_itu", "uti_ad_itu"], ["uti_neo_cvd_dia", "uti_pedi_cvd_dia", "uti_ad_cvd_dia"]) },
+                 "valor": (["ui_neo_itu", "ui_pedi_itu", "ui_ad_itu", "uti_neo_itu", "uti_pedi_itu", "uti_ad_itu"],
+                           ["ui_neo_cvd_dia", "ui_pedi_cvd_dia", "ui_ad_cvd_dia", "uti_neo_cvd_dia", "uti_pedi_cvd_dia", "uti_ad_cvd_dia"]) },
+    "rkpi_12": { "calculo": "taxa",
+                 "estratificacao": { "cir_orto": (["cir_orto_profilaxia"], ["cir_orto_total_pacientes"]),
+                                     "cir_n_orto": (["cir_nao_orto_profilaxia"], ["cir_nao_orto_total_pacientes"]),
+                                     "cirurgico": (["cir_orto_profilaxia", "cir_nao_orto_profilaxia"], ["cir_orto_total_pacientes", "cir_nao_orto_total_pacientes"]) },
+                 "valor": (["cir_orto_profilaxia", "cir_nao_orto_profilaxia", "cli_profilaxia"],
+                           ["cir_orto_total_pacientes", "cir_nao_orto_total_pacientes", "cli_total_pacientes"]) },
+    "rkpi_13": { "calculo": "densidade",
+                 "estratificacao": {},
+                 "valor": (["quedas_com_dano"], ["pacientes_dia"]) },
+    "rkpi_14": { "calculo": "densidade",
+                 "estratificacao": {},
+                 "valor": (["eventos_sentinela"], ["pacientes_dia"]) },
+}
+
+# Campo da coleção empresas com o nome da rede (grupo de CNES) à qual a organização pertence
+CAMPO_REDE = "rede"
+
+# Cubo de numeradores e denominadores: um documento por (cd_cnes, ano, mes, kpi, estrato), com estrato "" para o valor total
+COLECAO_CUBO = "cubo_kpis"
+# Dimensões pelas quais um recorte do cubo pode ser agrupado (dbConfig.fatia_cubo), com o rótulo exibido
+DIMENSOES_CUBO = { "cd_cnes": "CNES", "ano": "Ano", "mes": "Mês", "kpi": "KPI", "estrato": "Estrato" }
+
+# Posição de cada organização entre as organizações ativas, por KPI/estrato e mês: um documento por (cd_cnes, ano, mes)
+COLECAO_RANKING = "ranking_kpis"
+
+# Status de cada (cd_cnes, ano), mantido pelas escritas em metricas e resultados_kpis (dbConfig.atualiza_status): por coleção,
+# a máscara de 12 bits dos meses gravados (bit 0 = janeiro), o último mês gravado e o número de documentos
+COLECAO_STATUS = "status_competencias"
+CAMPOS_STATUS = { "metricas": "enviado", "resultados_kpis": "consolidado" }
+# Grade de status da rede (pages/rede.py): símbolo de cada célula por código (1 = enviado, 2 = consolidado, 3 = enviado e consolidado)
+# e número de organizações por página
+SIMBOLOS_STATUS = [ "⬜", "🟨", "🟩", "🟩" ]
+TAMANHO_PAGINA_REDE = 50
+
+# Janelas de agregação dos KPIs (somas de numeradores e denominadores no período): trimestre, acumulado no ano e móvel de 12 meses
+PERIODOS_AGREGACAO = [ "trimestre", "acumulado_ano", "movel_12" ]
+ROTULOS_PERIODOS = { "trimestre": "Trimestral", "acumulado_ano": "Acumulado no ano", "movel_12": "Móvel 12 meses" }
+
+# Sentido de melhora de cada KPI para o cálculo da variação mensal: 1 quando um valor maior é melhor e -1 quando um valor menor é melhor.
+# A variação gravada é 1 quando o KPI melhorou em relação ao mês anterior e 0 caso contrário.
+SENTIDO_KPIS = { "rkpi_1": 1, "rkpi_2": -1, "rkpi_3": -1, "rkpi_4": -1, "rkpi_5": -1, "rkpi_6": -1, "rkpi_7": -1,
+                 "rkpi_8": 1, "rkpi_9": -1, "rkpi_10": -1, "rkpi_11": -1, "rkpi_12": 1, "rkpi_13": -1, "rkpi_14": -1 }
+
+# Opções do MongoClient compartilhado pelo processo (podem ser sobrescritas em [database.OPCOES] no secrets.toml)
+MONGO_OPCOES = { "maxPoolSize": 50,
+                 "minPoolSize": 0,
+                 "maxIdleTimeMS": 300000,
+                 "connectTimeoutMS": 5000,
+                 "serverSelectionTimeoutMS": 5000,
+                 "socketTimeoutMS": 30000,
+                 "compressors": "zlib",
+                 "retryWrites": True,
+                 "retryReads": True,
+                 "appname": "saturn-analytics-client" }
+
+# Catálogo de índices garantidos na inicialização (dbConfig.garante_indices).
+# O índice (cd_cnes, ano, mes) atende os filtros por cd_cnes e (cd_cnes, ano), o $or por competência
+# e a ordenação (ano DESC, mes DESC) por varredura reversa, sem SORT em memória.
+INDICES_MONGO = {
+    "metricas": [ { "nome": "cd_cnes_ano_mes", "chaves": [("cd_cnes", 1), ("ano", 1), ("mes", 1)], "unico": True } ],
+    "resultados_kpis": [ { "nome": "cd_cnes_ano_mes", "chaves": [("cd_cnes", 1), ("ano", 1), ("mes", 1)], "unico": True } ],
+    "empresas": [ { "nome": "status_nome_cd_cnes", "chaves": [("status", 1), ("nome", 1), ("cd_cnes", 1)] } ],
+    "ranking_kpis": [ { "nome": "cd_cnes_ano_mes", "chaves": [("cd_cnes", 1), ("ano", 1), ("mes", 1)], "unico": True } ],
+    "status_competencias": [ { "nome": "cd_cnes_ano", "chaves": [("cd_cnes", 1), ("ano", 1)], "unico": True },
+                             { "nome": "ano_cd_cnes", "chaves": [("ano", 1), ("cd_cnes", 1)] } ],
+    "cubo_kpis": [ { "nome": "cd_cnes_ano_mes_kpi_estrato", "chaves": [("cd_cnes", 1), ("ano", 1), ("mes", 1), ("kpi", 1), ("estrato", 1)], "unico": True },
+                   { "nome": "kpi_estrato_periodo", "chaves": [("kpi", 1), ("estrato", 1), ("periodo", 1)] },
+                   { "nome": "estrato_periodo", "chaves": [("estrato", 1), ("periodo", 1)] } ],
+}
+
+# Estágios de plano de execução proibidos na verificação de consultas (dbConfig.verifica_consultas)
+ESTAGIOS_PROIBIDOS = [ "COLLSCAN", "SORT" ]
+
+# Cache das leituras do dbConfig e dos cálculos do App (src/Cache.py): número máximo de entradas, tempo de vida de cada entrada, em segundos,
+# e tamanho máximo, em bytes, dos valores guardados em memória
+CACHE_TAMANHO_MAXIMO = 1024
+CACHE_TTL_SEGUNDOS = 300
+CACHE_MEMORIA_MAXIMA = 256 * 1024 * 1024
+# Arquivo SQLite da camada em disco do cache, para agregados caros (ex.: ".cache/saturn.sqlite"). None desativa a camada em disco
+CACHE_CAMINHO_DISCO = None
+
+# Coleção com o progresso de operações em lote que podem ser retomadas (envio de arquivos, backfill)
+COLECAO_CHECKPOINTS = "checkpoints"
+TAMANHO_LOTE_BACKFILL = 500  # Competências por lote na reconsolidação em lote (Consolidacao.backfill)
+
+# Consolidação paralela (Consolidacao.backfill com processos > 1): processos padrão e partições de CNES por processo (balanceamento)
+PROCESSOS_CONSOLIDACAO = 1
+PARTICOES_POR_PROCESSO = 4
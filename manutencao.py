@@ -0,0 +1,119 @@
+import sys
+import argparse
+import config
+
+# Importa as classes de configuração do banco de dados e de consolidação
+from src.dbConfig import dbConfig
+from src.Consolidacao import Consolidacao
+from src.Cache import cache_leituras
+
+def cria_banco(argumentos) -> dbConfig:
+    """
+    Instancia o dbConfig com a URI e o banco informados ou, na ausência deles, com os Streamlit secrets.
+
+    Args:
+        argumentos: Argumentos da linha de comando.
+
+    Returns:
+        dbConfig: Configuração do banco de dados.
+    """
+    return dbConfig(string_conexao=argumentos.uri, banco=argumentos.banco)
+
+def cria_indices(argumentos) -> int:
+    """
+    Cria os índices declarados em config.INDICES_MONGO, removendo duplicados antes se solicitado.
+    """
+    db = cria_banco(argumentos)
+    if argumentos.remove_duplicados:
+        for nome_colecao in ["metricas", "resultados_kpis"]:
+            print(f"{nome_colecao}: {db.remove_duplicados(nome_colecao)} duplicados removidos")
+    for nome in db.cria_indices():
+        print(f"Índice garantido: {nome}")
+    return 0
+
+def verifica_indices(argumentos) -> int:
+    """
+    Cria os índices e verifica o plano de execução de cada consulta catalogada. Retorna 1 se alguma consulta usar COLLSCAN ou SORT.
+    """
+    db = cria_banco(argumentos)
+    db.cria_indices()
+    try:
+        relatorio = db.verifica_consultas()
+    except Exception as e:
+        print(e, file=sys.stderr)
+        return 1
+    for nome, estagios in relatorio:
+        print(f"OK  {nome}: {' > '.join(estagios)}")
+    return 0
+
+def backfill(argumentos) -> int:
+    """
+    Reconsolida em lote as competências selecionadas (todas, um intervalo de anos ou uma lista de CNES).
+    Por padrão, apenas as competências cujas métricas mudaram desde a última consolidação são recalculadas.
+    Uma execução interrompida continua do último lote gravado quando repetida com a mesma seleção.
+    """
+    consolidacao = Consolidacao(db=cria_banco(argumentos))
+    progresso = lambda total, ultima: print(f"{total} competência(s) consolidada(s), última: {ultima[0]} {ultima[2]:02d}/{ultima[1]}")
+    _, numero_registros = consolidacao.backfill( cnes=argumentos.cnes,
+                                                 ano_inicio=argumentos.ano_inicio,
+                                                 ano_fim=argumentos.ano_fim,
+                                                 tamanho_lote=argumentos.tamanho_lote,
+                                                 progresso=progresso,
+                                                 processos=argumentos.processos,
+                                                 incremental=not argumentos.completo )
+    print(f"Concluído: {numero_registros} competência(s) consolidada(s).")
+    return 0
+
+def reconstroi_status(argumentos) -> int:
+    """
+    Recalcula os documentos de status por (cd_cnes, ano) a partir de metricas e resultados_kpis (ex.: dados gravados antes da sua criação).
+    """
+    db = cria_banco(argumentos)
+    print(f"{db.reconstroi_status()} documento(s) de status gravado(s)")
+    return 0
+
+def limpa_cache(argumentos) -> int:
+    """
+    Remove as entradas da camada em disco do cache (config.CACHE_CAMINHO_DISCO); com --expiradas, apenas as expiradas.
+    """
+    if cache_leituras.disco is None:
+        print("Camada em disco do cache desativada (config.CACHE_CAMINHO_DISCO).")
+        return 0
+    if argumentos.expiradas:
+        print(f"{cache_leituras.disco.remove_expiradas()} entrada(s) expirada(s) removida(s)")
+    else:
+        cache_leituras.limpa()
+        print(f"Cache em disco limpo: {cache_leituras.disco.caminho}")
+    return 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotinas de manutenção do banco de dados do Saturn Analytics Client.")
+    parser.add_argument("--uri", help="URI de conexão do MongoDB. Padrão: database.MONGO_URI dos secrets.")
+    parser.add_argument("--banco", help="Nome do banco de dados. Padrão: database.DATABASE dos secrets.")
+    comandos = parser.add_subparsers(dest="comando", required=True)
+
+    comando = comandos.add_parser("cria-indices", help="Cria os índices declarados em config.INDICES_MONGO.")
+    comando.add_argument("--remove-duplicados", action="store_true", help="Remove competências duplicadas antes de criar os índices únicos.")
+    comando.set_defaults(funcao=cria_indices)
+
+    comando = comandos.add_parser("verifica-indices", help="Falha se alguma consulta do dbConfig fizer COLLSCAN ou SORT em memória.")
+    comando.set_defaults(funcao=verifica_indices)
+
+    comando = comandos.add_parser("backfill", help="Reconsolida em lote as competências já enviadas, com retomada por checkpoint.")
+    comando.add_argument("--cnes", nargs="+", type=int, help="CNES das organizações. Padrão: todas.")
+    comando.add_argument("--ano-inicio", type=int, help="Primeiro ano (inclusive).")
+    comando.add_argument("--ano-fim", type=int, help="Último ano (inclusive).")
+    comando.add_argument("--tamanho-lote", type=int, default=config.TAMANHO_LOTE_BACKFILL, help="Competências por lote.")
+    comando.add_argument("--processos", type=int, default=config.PROCESSOS_CONSOLIDACAO, help="Processos da consolidação paralela (particionada por CNES). Padrão: serial.")
+    comando.add_argument("--completo", action="store_true", help="Recalcula todas as competências, mesmo as que não mudaram (ex.: após alterar a fórmula de um KPI).")
+    comando.set_defaults(funcao=backfill)
+
+    comando = comandos.add_parser("reconstroi-status", help="Recalcula o status de envio e consolidação por CNES e ano (config.COLECAO_STATUS).")
+    comando.set_defaults(funcao=reconstroi_status)
+
+    comando = comandos.add_parser("limpa-cache", help="Limpa a camada em disco do cache de leituras e agregados.")
+    comando.add_argument("--expiradas", action="store_true", help="Remove apenas as entradas expiradas.")
+    comando.set_defaults(funcao=limpa_cache)
+
+    argumentos = parser.parse_args()
+    sys.exit(argumentos.funcao(argumentos))
@@ -1,17 +1,18 @@
+import os
 import re
 import time
 import config
 import streamlit as st
 
-# Importa as classes App, KPI e dbConfig
-from src.App      import App
-from src.KPI      import KPI
-from src.dbConfig import dbConfig
+# Importa as classes App, dbConfig e Consolidacao
+from src.App          import App
+from src.dbConfig     import dbConfig
+from src.Consolidacao import Consolidacao
 
 # Instancia os objetos principais do banco de dados e do aplicativo
 db = dbConfig()
 app = App()
-kpi = KPI()
+consolidacao = Consolidacao(db=db, app=app)
 
 if 'btn_consolidacao' in st.session_state and st.session_state.btn_consolidacao == True:
     st.session_state.running = True
@@ -51,6 +52,15 @@ with st.container():
                     if ultima_consolidacao:
                         info = f"Último mês consolidado: {config.MONTH_MASK[ultima_consolidacao['mes']]} de {ultima_consolidacao['ano']}"
                         st.info(info, icon="ℹ️")
+
+                        # Exibe a posição da empresa entre as demais empresas ativas no último mês consolidado
+                        ranking = db.busca_ranking( nome_colecao=config.COLECAO_RANKING,
+                                                    cnes=cd_cnes,
+                                                    ano=ultima_consolidacao['ano'],
+                                                    mes=ultima_consolidacao['mes'] )
+                        if ranking:
+                            with st.expander("Comparação com as demais empresas"):
+                                st.dataframe(app.monta_tabela_ranking(ranking), use_container_width=True, hide_index=True)
                     else:
                         # Exibe aviso caso nenhuma consolidação seja encontrada
                         info = "Nenhuma consolidação foi encontrada para esta empresa."
@@ -86,46 +96,100 @@ with st.container():
                         if st.button(label="Consolidar", disabled=st.session_state.running, key='btn_consolidacao', use_container_width=True ): 
                             with st.empty():
                                 with st.container():          
-                                    with st.spinner(text="Consolidando..."):                                        
-                                        # Obtém métricas da empresa para o ano e mês selecionados
-                                        metricas = db.busca_metricas( nome_colecao="metricas",
-                                                                    query={ "cd_cnes": int(cd_cnes),
-                                                                            "ano": int(valor_ano),
-                                                                            "mes": app.busca_chave_pelo_valor(dicionario=config.MONTH_MASK, valor=valor_mes) } )    
-                                        
-                                        # Cria um DataFrame a partir dos dados obtidos
-                                        dataframe = app.cria_dataframe( dados=metricas )
-                                        
-                                        # Realiza cálculos de consolidação com base no DataFrame
-                                        query_resultados = app.calcular( dados=dataframe )
-                                        
-                                        # Salva os resultados no banco de dados
-                                        status_registro = db.carrega_dados( nome_colecao="resultados_kpis",
-                                                                query=query_resultados )                              
-                                        if status_registro:
-                                            ultimos_resultados = db.busca_ultimos_resultados( nome_colecao="resultados_kpis", 
-                                                                                            cnes=int(cd_cnes),
-                                                                                            ano_atual=int(valor_ano),
-                                                                                            mes_atual=app.busca_chave_pelo_valor(dicionario=config.MONTH_MASK, valor=valor_mes) )
-                                            
-                                            variacao_mensal = kpi.calcula_variacao_mensal( dados_resultado=ultimos_resultados )
-                                            status_variacao = db.atualiza_variacao_mensal( nome_colecao="resultados_kpis", 
-                                                                                        cnes=int(cd_cnes),
-                                                                                        ano=int(valor_ano),
-                                                                                        mes=app.busca_chave_pelo_valor(dicionario=config.MONTH_MASK, valor=valor_mes),
-                                                                                        dados=variacao_mensal )
+                                    with st.spinner(text="Consolidando..."):
+                                        # Calcula os KPIs e a variação mensal e grava o resultado completo em um único upsert
+                                        status_variacao = consolidacao.consolida_mes( cnes=int(cd_cnes),
+                                                                                      ano=int(valor_ano),
+                                                                                      mes=app.busca_chave_pelo_valor(dicionario=config.MONTH_MASK, valor=valor_mes) )
                                         
                                     # Exibe notificações de sucesso ou erro com base no status
                                     if all(i == True for i in status_variacao):
                                         st.info(f'Concluído!', icon="✅")
-                                        db.busca_ultima_consolidacao.clear()  # Limpa o cache da função para dados atualizados
                                         time.sleep(2)
                                         st.rerun()
                                     elif any(i == True for i in status_variacao):
                                         st.info(f'Concluída primeira consolidação!', icon="✅")
-                                        db.busca_ultima_consolidacao.clear()  # Limpa o cache da função para dados atualizados
                                         time.sleep(2)
                                         st.rerun()
                                     else:
                                         st.error('Ocorreu um erro!', icon="☠️")
-                                        db.busca_ultima_consolidacao.clear()  # Limpa o cache da função para dados atualizados                                        
+
+# Container para a reconsolidação em lote (backfill) de várias empresas e anos
+with st.expander("Reconsolidação em lote"):
+    empresas_backfill = st.multiselect( label="Empresas (vazio para todas):",
+                                        options=lista_empresas,
+                                        key='empresas_backfill' )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        ano_inicio = st.number_input(label="Ano inicial:", min_value=2000, max_value=2100, value=2023, step=1, key='ano_inicio_backfill')
+    with col2:
+        ano_fim = st.number_input(label="Ano final:", min_value=2000, max_value=2100, value=2024, step=1, key='ano_fim_backfill')
+    with col3:
+        processos = st.number_input(label="Processos:", min_value=1, max_value=os.cpu_count() or 1, value=config.PROCESSOS_CONSOLIDACAO, step=1, key='processos_backfill')
+
+    recalcula_tudo = st.checkbox(label="Recalcular todas as competências",
+                                 help="Por padrão, apenas as competências cujas métricas mudaram desde a última consolidação são recalculadas.",
+                                 key='completo_backfill')
+
+    if st.button(label="Reconsolidar", key='btn_backfill', use_container_width=True):
+        status = st.empty()
+        progresso = lambda total, ultima: status.write(f"{total} competência(s) consolidada(s). Última: {ultima[0]} - {config.MONTH_MASK[ultima[2]]} de {ultima[1]}")
+        try:
+            with st.spinner(text="Reconsolidando..."):
+                _, numero_registros = consolidacao.backfill( cnes=[re.search(r"\d+", empresa).group() for empresa in empresas_backfill],
+                                                             ano_inicio=int(ano_inicio),
+                                                             ano_fim=int(ano_fim),
+                                                             progresso=progresso,
+                                                             processos=int(processos),
+                                                             incremental=not recalcula_tudo )
+            st.info(f"Reconsolidação concluída: {numero_registros} competência(s).", icon="✅")
+        except Exception as e:
+            st.error(f"A reconsolidação foi interrompida e continuará do último lote gravado ao ser repetida. {e}", icon="☠️")
+
+# Container para os indicadores de uma rede (grupo de empresas), calculados sobre as métricas somadas
+with st.expander("Indicadores da rede"):
+    nome_rede, cnes_rede = app.seleciona_grupo( redes=db.busca_redes("empresas"),
+                                                lista_empresas=lista_empresas,
+                                                chave='consolidacao' )
+    ano_rede = st.selectbox(label="Ano:", options=config.YEARS, key='ano_rede', index=None, placeholder="Selecione o ano")
+    if cnes_rede and ano_rede:
+        with st.spinner(text="Calculando..."):
+            resultados_rede = app.calcular_rede( somas=db.soma_metricas_rede(nome_colecao="metricas", cnes=cnes_rede, ano=int(ano_rede)),
+                                                 rede=nome_rede )
+        if resultados_rede:
+            st.dataframe(app.monta_tabela_kpis(resultados_rede), use_container_width=True, hide_index=True)
+        else:
+            st.warning("Nenhuma métrica encontrada para as empresas da rede no ano selecionado.", icon="❕")
+
+# Container para o recorte do cubo de numeradores e denominadores: KPIs de um conjunto de empresas em um intervalo de competências
+with st.expander("Recorte por período"):
+    nome_recorte, cnes_recorte = app.seleciona_grupo( redes=db.busca_redes("empresas"),
+                                                      lista_empresas=lista_empresas,
+                                                      chave='recorte' )
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        ano_inicio_recorte = st.selectbox(label="Ano inicial:", options=config.YEARS, key='ano_inicio_recorte')
+    with col2:
+        mes_inicio_recorte = st.selectbox(label="Mês inicial:", options=list(config.MONTH_MASK), format_func=config.MONTH_MASK.get, key='mes_inicio_recorte')
+    with col3:
+        ano_fim_recorte = st.selectbox(label="Ano final:", options=config.YEARS, index=len(config.YEARS) - 1, key='ano_fim_recorte')
+    with col4:
+        mes_fim_recorte = st.selectbox(label="Mês final:", options=list(config.MONTH_MASK), index=11, format_func=config.MONTH_MASK.get, key='mes_fim_recorte')
+    kpis_recorte = st.multiselect(label="KPIs (vazio para todos):", options=list(config.REGISTRO_KPIS), key='kpis_recorte')
+    agrupamento_recorte = st.multiselect( label="Agrupar por:",
+                                          options=list(config.DIMENSOES_CUBO),
+                                          default=["kpi", "estrato"],
+                                          format_func=config.DIMENSOES_CUBO.get,
+                                          key='agrupamento_recorte' )
+    if cnes_recorte and agrupamento_recorte:
+        with st.spinner(text="Calculando..."):
+            fatias = app.avalia_fatias(db.fatia_cubo( nome_colecao=config.COLECAO_CUBO,
+                                                      cnes=cnes_recorte,
+                                                      inicio=(int(ano_inicio_recorte), int(mes_inicio_recorte)),
+                                                      fim=(int(ano_fim_recorte), int(mes_fim_recorte)),
+                                                      kpis=kpis_recorte or None,
+                                                      agrupamento=agrupamento_recorte ))
+        if not fatias.empty:
+            st.dataframe(fatias.rename(columns=config.DIMENSOES_CUBO), use_container_width=True, hide_index=True)
+        else:
+            st.warning("Nenhum componente consolidado encontrado para as empresas no período selecionado.", icon="❕")
@@ -1,13 +1,15 @@
 import config
 import streamlit as st
 
-# Importa as classes App e dbConfig
-from src.App      import App
-from src.dbConfig import dbConfig
+# Importa as classes App, dbConfig e Consolidacao
+from src.App          import App
+from src.dbConfig     import dbConfig
+from src.Consolidacao import Consolidacao
 
 # Instancia os objetos principais do aplicativo e da configuração do banco de dados
 app = App()
 db = dbConfig()
+consolidacao = Consolidacao(db=db, app=app)
 
 # Define o título do aplicativo na interface
 st.title("Envio de métricas")
@@ -26,8 +28,52 @@ if "download_arquivo_csv" not in st.session_state:
         # Realiza o download do arquivo modelo
         app.download_arquivo_csv()
 
+# Permite o envio em blocos, indicado para arquivos grandes (vários estabelecimentos e anos)
+envio_em_blocos = st.toggle( label="Envio em blocos",
+                             help="Lê e valida o arquivo em blocos, grava cada bloco em lote e retoma um envio interrompido do mesmo arquivo." )
+
+# Permite consolidar os indicadores de todas as competências do arquivo logo após o envio
+consolidar_envio = st.toggle( label="Consolidar após o envio",
+                              help="Calcula os KPIs e a variação mensal de todas as competências do arquivo e grava os resultados junto com as métricas." )
+
+# Envio em blocos: o arquivo inteiro é validado bloco a bloco antes do envio, para que um arquivo inválido não seja gravado parcialmente
+if arquivo_carregado and envio_em_blocos:
+    with st.spinner(text="Validando..."):
+        arquivo_valido = app.valida_arquivo_em_blocos(arquivo=arquivo_carregado)
+    if arquivo_valido and st.button( label="Enviar dados",
+                  icon=config.ICON_PAGE_ENVIO_METRICAS,
+                  use_container_width=True ):
+        barra_progresso = st.progress(0, text="Enviando...")
+        competencias_consolidadas = []
+        # Os derivados (variação dos meses seguintes e ranking) são atualizados uma única vez, após o último bloco;
+        # os blocos podem trazer um mês antes do mês anterior, então a variação das competências enviadas também é recalculada
+        competencias_adiadas = set()
+        def consolida_bloco(bloco):
+            _, _, consolidadas = consolidacao.consolida_lote(metricas=bloco, grava_metricas=False, adiadas=competencias_adiadas)
+            competencias_consolidadas.append(consolidadas)
+        def atualiza_progresso(bloco, registros, pico_memoria):
+            percentual = min(arquivo_carregado.tell() / max(arquivo_carregado.size, 1), 1.0)
+            barra_progresso.progress(percentual, text=f"Bloco {bloco+1}: {registros} registros gravados (memória: {pico_memoria / 1024 / 1024:.1f} MB)")
+        confirmacao, mensagem = db.upload_arquivo_em_blocos( blocos=app.le_arquivo_em_blocos(arquivo_carregado),
+                                                            nome_colecao="metricas",
+                                                            identificador=app.identifica_arquivo(arquivo_carregado),
+                                                            progresso=atualiza_progresso,
+                                                            apos_bloco=consolida_bloco if consolidar_envio else None )
+        # Mesmo em um envio interrompido, os blocos já consolidados têm seus derivados atualizados
+        if competencias_adiadas:
+            with st.spinner(text="Atualizando ranking..."):
+                consolidacao.atualiza_derivados(competencias_adiadas, recalcula_gravadas=True)
+        if confirmacao:
+            barra_progresso.progress(1.0, text="Concluído")
+            if consolidar_envio:
+                mensagem = f"{mensagem}, {sum(competencias_consolidadas)} competência(s) consolidada(s)"
+            st.toast( body=f'Upload concluído com sucesso! {mensagem}',
+                      icon="✅" )
+        else:
+            st.error(mensagem, icon="☠️")
+
 # Verifica se um arquivo foi carregado
-if arquivo_carregado:
+elif arquivo_carregado:
     # Valida o arquivo enviado
     validacao, dados = app.valida_arquivo(arquivo=arquivo_carregado)
     if validacao:
@@ -38,12 +84,20 @@ if arquivo_carregado:
             # Exibe uma mensagem de upload em andamento
             st.toast( body="Fazendo upload do arquivo...",
                       icon="⌛" )            
-            # Realiza o upload do arquivo no banco de dados
-            confirmacao, num_registros = db.upload_arquivo( dataframe=dados,
-                                                            nome_colecao="metricas" )
+            # Realiza o upload do arquivo no banco de dados, consolidando as competências se solicitado
+            if consolidar_envio:
+                try:
+                    confirmacao, num_registros, num_consolidadas = consolidacao.consolida_lote( metricas=dados )
+                    mensagem = f"{num_registros} registros incluídos, {num_consolidadas} competência(s) consolidada(s)"
+                except Exception as e:
+                    confirmacao, num_registros = False, e
+            else:
+                confirmacao, num_registros = db.upload_arquivo( dataframe=dados,
+                                                                nome_colecao="metricas" )
+                mensagem = f"{num_registros} registros incluídos"
             # Verifica se o upload foi bem-sucedido e exibe mensagens de feedback
             if confirmacao:
-                st.toast( body=f'Upload concluído com sucesso! {num_registros} registros incluídos',
+                st.toast( body=f'Upload concluído com sucesso! {mensagem}',
                           icon="✅" )
             else:
                 st.toast( body=f'Ocorreu um erro! {num_registros}',
@@ -1,4 +1,6 @@
 import re
+import config
+import pandas as pd
 import streamlit as st
 
 # Importa as classes App e dbConfig
@@ -21,6 +23,31 @@ if 'ano' not in st.session_state:
     st.session_state['ano'] = st.query_params.ano if 'ano' in st.query_params else None
 empresa_selecionada = [lista_empresas.index(l) for l in lista_empresas if re.search(r"\d+", l).group() == st.session_state['cnes']]
 
+# Permite alternar entre o resumo de uma empresa e os indicadores de uma rede (grupo de empresas)
+visao_rede = st.toggle(label="Visão de rede", help="Exibe os KPIs de um grupo de empresas, calculados sobre as métricas somadas.")
+
+if visao_rede:
+    st.header("Rede")
+    col1, col2 = st.columns([5, 3], vertical_alignment='bottom')
+    with col1:
+        nome_rede, cnes_rede = app.seleciona_grupo( redes=db.busca_redes("empresas"),
+                                                    lista_empresas=lista_empresas,
+                                                    chave='home' )
+    with col2:
+        ano_rede = st.segmented_control("Ano", options=config.YEARS, label_visibility="collapsed", key='ano_rede')
+
+    if not cnes_rede or not ano_rede:
+        st.info("Selecione a rede e o ano", icon="ℹ️")
+    else:
+        with st.spinner(text="Carregando..."):
+            resultados_rede = app.calcular_rede( somas=db.soma_metricas_rede(nome_colecao="metricas", cnes=cnes_rede, ano=int(ano_rede)),
+                                                 rede=nome_rede )
+        if resultados_rede:
+            st.dataframe(app.monta_tabela_kpis(resultados_rede), use_container_width=True, hide_index=True)
+        else:
+            st.info("Sem dados para exibir", icon="ℹ️")
+    st.stop()
+
 # Cria um contêiner para organizar os elementos da interface
 with st.container():
     # Define duas colunas
@@ -67,17 +94,14 @@ with st.empty():
 
             # Exibe um spinner enquanto os dados são carregados
             with st.spinner(text="Carregando..."):
-                # Recupera os dados de métricas e resultados do banco de dados
-                metricas_bruto, resultados_bruto = db.busca_resumo(
+                # Recupera, em uma única consulta, os meses enviados e consolidados no ano
+                resumo = db.busca_resumo(
                     cd_cnes=int(cd_cnes),
                     ano=int(filtro_ano)
                 )
                 
-                # Monta o histórico dos dados utilizando um método da classe App
-                historico = app.monta_historico(
-                    dados_metricas=metricas_bruto,
-                    dados_resultados=resultados_bruto
-                )
+                # Monta a grade de status dos meses utilizando um método da classe App
+                historico = app.monta_historico(resumo=resumo)
                 
                 if (historico.empty):
                     info = f"Sem dados para exibir"
@@ -90,3 +114,23 @@ with st.empty():
                         disabled=True,
                         hide_index=True
                     )
+
+                    # KPIs agregados por período (somas de numeradores e denominadores), com uma única leitura das métricas
+                    # do ano selecionado e do anterior (necessário para a janela móvel de 12 meses)
+                    periodo = st.segmented_control(
+                        "Período",
+                        options=config.PERIODOS_AGREGACAO,
+                        format_func=config.ROTULOS_PERIODOS.get,
+                        key='periodo_home'
+                    )
+                    if periodo:
+                        metricas = db.busca_metricas_selecao(
+                            nome_colecao="metricas",
+                            filtro=db.filtro_selecao(cnes=[cd_cnes], ano_inicio=int(filtro_ano) - 1, ano_fim=int(filtro_ano))
+                        )
+                        agregados = [ resultado for resultado in app.calcular_agregados(dados=pd.DataFrame(metricas), periodo=periodo)
+                                      if resultado['ano'] == int(filtro_ano) ]
+                        if agregados:
+                            st.dataframe(app.monta_tabela_kpis(agregados), use_container_width=True, hide_index=True)
+                        else:
+                            st.info("Sem dados para exibir", icon="ℹ️")
@@ -0,0 +1,57 @@
+import math
+import config
+import streamlit as st
+
+# Importa as classes App e dbConfig
+from src.App import App
+from src.dbConfig import dbConfig
+
+# Instancia objetos para a aplicação principal e para a configuração do banco de dados
+app = App()
+db = dbConfig()
+
+# Define o título principal da página
+st.title("Status da Rede")
+
+# Filtros: anos exibidos e busca por nome ou CNES
+col1, col2 = st.columns([3, 4], vertical_alignment='bottom')
+with col1:
+    anos = st.segmented_control("Anos", options=config.YEARS, selection_mode="multi", default=config.YEARS, label_visibility="collapsed")
+with col2:
+    busca = st.text_input("Empresa", placeholder="Buscar empresa ou CNES", label_visibility="collapsed")
+
+if not anos:
+    st.info("Selecione ao menos um ano", icon="ℹ️")
+    st.stop()
+
+# Recupera o status de todas as organizações em uma única consulta e monta a grade (organizações x meses)
+with st.spinner(text="Carregando..."):
+    grade = app.monta_grade_rede( status=db.busca_status_rede(anos=sorted(anos)),
+                                  lista_empresas=db.busca_empresas("empresas"),
+                                  anos=anos )
+if busca:
+    grade = grade[grade["Empresa"].str.contains(busca, case=False, regex=False)].reset_index(drop=True)
+
+if grade.empty:
+    st.info("Sem dados para exibir", icon="ℹ️")
+    st.stop()
+
+# Resumo da rede: meses enviados, consolidados e pendentes de consolidação
+celulas = grade.drop(columns="Empresa")
+enviados = celulas.isin(config.SIMBOLOS_STATUS[1:2]).to_numpy().sum()
+consolidados = celulas.isin(config.SIMBOLOS_STATUS[2:]).to_numpy().sum()
+col1, col2, col3 = st.columns(3)
+col1.metric("Empresas", len(grade))
+col2.metric("Meses consolidados", int(consolidados))
+col3.metric("Meses pendentes de consolidação", int(enviados))
+st.caption(f"{config.SIMBOLOS_STATUS[0]} sem dados   {config.SIMBOLOS_STATUS[1]} enviado   {config.SIMBOLOS_STATUS[2]} consolidado")
+
+# Paginação da grade
+paginas = math.ceil(len(grade) / config.TAMANHO_PAGINA_REDE)
+pagina = st.number_input("Página", min_value=1, max_value=paginas, value=1, step=1) if paginas > 1 else 1
+inicio = (pagina - 1) * config.TAMANHO_PAGINA_REDE
+st.dataframe(grade.iloc[inicio:inicio + config.TAMANHO_PAGINA_REDE],
+             use_container_width=True,
+             hide_index=True,
+             column_config={ "Empresa": st.column_config.TextColumn(pinned=True) })
+st.caption(f"Página {pagina} de {paginas}")
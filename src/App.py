@@ -1,6 +1,11 @@
+import re
+import hashlib
+import numpy as np
 import pandas as pd
 import streamlit as st
 from src.KPI import KPI
+from src.Validador import Validador
+from src.Cache import cacheado
 import config
 
 class App(object):
@@ -10,28 +15,15 @@ class App(object):
 
     def __init__(self):
         """
-        Inicializa o objeto da classe App com uma instância de KPI e variáveis de controle para os KPIs.
+        Inicializa o objeto da classe App com uma instância de KPI e do validador de métricas.
         """
         self.kpi = KPI()
-        self._1_proporcao_partos_vaginais = None
-        self._2_proporcao_reinternacoes_30_dias = None
-        self._3_taxa_pcr = None
-        self._4_taxa_mortalidade = None
-        self._5_tempo_medio_internacao = None
-        self._6_tempo_medio_emergencia = None
-        self._7_tempo_medio_espera_emergencia = None
-        self._8_taxa_atb_profilatico = None
-        self._9_taxa_infeccao_cirurgia_limpa = None
-        self._10_incidencia_ipcs_cvc = None
-        self._11_incidencia_itu_cvd = None
-        self._12_taxa_profilaxia_tromboembolismo = None
-        self._13_incidencia_queda = None
-        self._14_evento_sentinela = None
+        self.validador = Validador()
         pass
 
     # ENVIO
-    @st.cache_data
-    def carrega_csv_modelo(_self) -> tuple[pd.DataFrame, str]:
+    @cacheado(lambda: [])
+    def carrega_csv_modelo(self) -> tuple[pd.DataFrame, str]:
         """
         Carrega um arquivo CSV e cria um dicionário de dados com tipos de colunas.
         
@@ -44,11 +36,11 @@ class App(object):
         return dicionario_dados, arquivo.to_csv(index=False)  # Retorna o dicionário e o modelo como CSV
 
     @st.dialog("Dicionário de dados")
-    def download_arquivo_csv(_self) -> None:
+    def download_arquivo_csv(self) -> None:
         """
         Exibe o dicionário de dados e permite o download do modelo CSV.
         """
-        dicionario_dados, modelo = _self.carrega_csv_modelo()    
+        dicionario_dados, modelo = self.carrega_csv_modelo()    
         st.dataframe(dicionario_dados, use_container_width=True, hide_index=True)  # Exibe o dicionário de dados
         st.download_button(
             label="Baixar modelo em CSV",
@@ -57,6 +49,31 @@ class App(object):
             mime="text/csv",
         )
 
+    def seleciona_grupo(self, redes: dict, lista_empresas: list, chave: str) -> tuple[str, list]:
+        """
+        Exibe a seleção de um grupo de organizações: uma rede cadastrada (config.CAMPO_REDE) ou uma seleção avulsa de empresas.
+
+        Args:
+            redes (dict): Lista de CNES por nome de rede (ver dbConfig.busca_redes).
+            lista_empresas (list): Empresas no formato "nome (cnes)" (ver dbConfig.busca_empresas).
+            chave (str): Prefixo das chaves dos widgets, para uso em mais de uma página.
+
+        Returns:
+            tuple: Nome do grupo e lista de CNES (lista vazia se nada foi selecionado).
+        """
+        selecao_avulsa = "Seleção avulsa"
+        grupo = st.selectbox( placeholder="Selecione a rede",
+                              label="Rede:",
+                              options=[*redes.keys(), selecao_avulsa],
+                              key=f"{chave}_rede",
+                              index=None )
+        if grupo == selecao_avulsa:
+            empresas = st.multiselect( label="Empresas:",
+                                       options=lista_empresas,
+                                       key=f"{chave}_empresas" )
+            return grupo, [int(re.search(r"\d+", empresa).group()) for empresa in empresas]
+        return grupo, redes.get(grupo, [])
+
     # CONSOLIDAÇÃO
     def cria_dataframe(self, dados: dict) -> pd.DataFrame:
         """
@@ -79,139 +96,178 @@ class App(object):
             except ValueError as e:
                 raise Exception("Não foi possível carregar os dados da coleção:  ", e)
 
-    def cria_dicionario_resultados(self, cd_cnes: int, ano: int, mes: int) -> dict:
+    def calcular(self, dados: pd.DataFrame) -> dict:
         """
-        Cria um dicionário de resultados combinando as métricas calculadas.
-        
+        Realiza os cálculos dos KPIs a partir de um DataFrame de entrada.
+
         Args:
-            cd_cnes (int): Código da organização.
-            ano (int): Ano dos dados.
-            mes (int): Mês dos dados.
+            dados (pd.DataFrame): DataFrame contendo os dados para os cálculos.
 
         Returns:
-            dict: Dicionário contendo as informações e métricas calculadas.
-        """
-        result_dict = {
-            "cd_cnes": cd_cnes,
-            "ano": ano,
-            "mes": mes,
-            "dados": {
-                **self._1_proporcao_partos_vaginais,
-                **self._2_proporcao_reinternacoes_30_dias,
-                **self._3_taxa_pcr,
-                **self._4_taxa_mortalidade,
-                **self._5_tempo_medio_internacao,
-                **self._6_tempo_medio_emergencia,
-                **self._7_tempo_medio_espera_emergencia,
-                **self._8_taxa_atb_profilatico,
-                **self._9_taxa_infeccao_cirurgia_limpa,
-                **self._10_incidencia_ipcs_cvc,
-                **self._11_incidencia_itu_cvd,
-                **self._12_taxa_profilaxia_tromboembolismo,
-                **self._13_incidencia_queda,
-                **self._14_evento_sentinela
-            }
-        }
-        return result_dict
+            dict: Dicionário com os resultados dos KPIs calculados.
+        """
+        return self.calcular_lote(dados.head(1))[0]
 
-    def calcular(self, dados: pd.DataFrame) -> dict:
+    def calcular_lote(self, dados: pd.DataFrame) -> list:
         """
-        Realiza os cálculos dos KPIs a partir de um DataFrame de entrada.
+        Realiza os cálculos dos KPIs para todas as linhas de um DataFrame de métricas em uma única passada vetorizada.
 
         Args:
-            dados (pd.DataFrame): DataFrame contendo os dados para os cálculos.
+            dados (pd.DataFrame): DataFrame com as métricas de uma ou mais competências (cd_cnes, ano, mes).
 
         Returns:
-            dict: Dicionário com os resultados dos KPIs calculados.
+            list: Lista de dicionários de resultados, um por linha, no mesmo formato de calcular.
+        """
+        if dados.empty:
+            return []
+        resultados = self.kpi.calcula_resultados(dados)
+        chaves = dados[['cd_cnes', 'ano', 'mes']].astype(int).to_numpy().tolist()
+        lista_resultados = []
+        for (cd_cnes, ano, mes), registros in zip(chaves, resultados):
+            lista_resultados.append({
+                "cd_cnes": cd_cnes,
+                "ano": ano,
+                "mes": mes,
+                "dados": { registro.nome: registro.cria_objeto() for registro in registros }
+            })
+        return lista_resultados
+
+    def calcula_hash_metricas(self, dados: pd.DataFrame) -> pd.Series:
+        """
+        Calcula a impressão digital do conteúdo das métricas (config.COLUNAS_METRICAS) de cada competência.
+        Os valores são convertidos para float antes do hash, então a mesma competência lida do CSV ou do banco tem a mesma impressão.
+
+        Args:
+            dados (pd.DataFrame): DataFrame com as métricas de uma ou mais competências.
+
+        Returns:
+            pd.Series: Impressão digital hexadecimal de cada linha, com o mesmo índice da entrada.
+        """
+        hashes = pd.util.hash_pandas_object(dados[config.COLUNAS_METRICAS].astype('float64'), index=False)
+        return hashes.map('{:016x}'.format)
+
+    def adiciona_hash_metricas(self, dados: pd.DataFrame) -> pd.DataFrame:
+        """
+        Adiciona (ou recalcula) a coluna de impressão digital (config.CAMPO_HASH_METRICAS) em um DataFrame de métricas.
+
+        Args:
+            dados (pd.DataFrame): DataFrame com as métricas de uma ou mais competências.
+
+        Returns:
+            pd.DataFrame: Cópia do DataFrame com a coluna de impressão digital.
+        """
+        return dados.assign(**{config.CAMPO_HASH_METRICAS: self.calcula_hash_metricas(dados)})
+
+    @cacheado(lambda dados, periodo: [], disco=True)
+    def calcular_agregados(self, dados: pd.DataFrame, periodo: str) -> list:
+        """
+        Calcula os KPIs agregados em janelas de período (trimestre, acumulado no ano ou móvel de 12 meses) a partir das métricas mensais,
+        somando numeradores e denominadores no período.
+
+        Args:
+            dados (pd.DataFrame): Métricas mensais de uma ou mais organizações.
+            periodo (str): Janela de agregação (config.PERIODOS_AGREGACAO).
+
+        Returns:
+            list: Lista de dicionários de resultados, um por organização e janela, com o período, a chave da janela
+                (trimestre ou mes), o número de meses com dados e os KPIs no mesmo formato de calcular.
+        """
+        if dados.empty:
+            return []
+        agregado = self.kpi.agrega_metricas(dados, periodo)
+        resultados = self.kpi.calcula_resultados(agregado)
+        chave_janela = 'trimestre' if periodo == "trimestre" else 'mes'
+        chaves = agregado[['cd_cnes', 'ano', chave_janela, 'meses']].astype(int).to_numpy().tolist()
+        lista_resultados = []
+        for (cd_cnes, ano, janela, meses), registros in zip(chaves, resultados):
+            lista_resultados.append({
+                "cd_cnes": cd_cnes,
+                "ano": ano,
+                chave_janela: janela,
+                "periodo": periodo,
+                "meses": meses,
+                "dados": { registro.nome: registro.cria_objeto() for registro in registros }
+            })
+        return lista_resultados
+
+    def calcular_rede(self, somas: list, rede: str) -> list:
+        """
+        Calcula os KPIs, com todas as estratificações, de um grupo de organizações a partir das métricas somadas por mês
+        (ver dbConfig.soma_metricas_rede).
+
+        Args:
+            somas (list): Um documento de métricas somadas por mês.
+            rede (str): Nome da rede ou do grupo.
+
+        Returns:
+            list: Lista de dicionários de resultados, um por mês, com a rede, o número de organizações e os KPIs no mesmo formato de calcular.
+        """
+        if not somas:
+            return []
+        dados = pd.DataFrame(somas)
+        resultados = self.kpi.calcula_resultados(dados)
+        lista_resultados = []
+        for (ano, mes, organizacoes), registros in zip(dados[['ano', 'mes', 'organizacoes']].astype(int).to_numpy().tolist(), resultados):
+            lista_resultados.append({
+                "rede": rede,
+                "ano": ano,
+                "mes": mes,
+                "organizacoes": organizacoes,
+                "dados": { registro.nome: registro.cria_objeto() for registro in registros }
+            })
+        return lista_resultados
+
+    def avalia_fatias(self, fatias: list) -> pd.DataFrame:
+        """
+        Calcula o valor dos KPIs de fatias do cubo de numeradores e denominadores (ver dbConfig.fatia_cubo).
+
+        Args:
+            fatias (list): Documentos com as dimensões do agrupamento, kpi, numerador e denominador.
+
+        Returns:
+            pd.DataFrame: As fatias com a coluna valor.
+        """
+        if not fatias:
+            return pd.DataFrame()
+        dados = pd.DataFrame(fatias)
+        return dados.assign(valor=self.kpi.avalia_componentes(dados))
+
+    def monta_tabela_kpis(self, resultados: list) -> pd.DataFrame:
         """
-        self._1_proporcao_partos_vaginais = self.kpi.kpi1( total_partos_vaginais = dados.at[0,'partos_vaginais'],
-                                                           total_partos_cesareos = dados.at[0,'partos_cesareos'] )
-        self._2_proporcao_reinternacoes_30_dias = self.kpi.kpi2 ( cli_total_reinternacoes_30_dias = dados.at[0,'cli_reinternacoes'],
-                                                                  cli_total_saida_mes_anterior = dados.at[0,'cli_saidas_anterior'],
-                                                                  cir_total_reinternacoes_30_dias = dados.at[0,'cir_reinternacoes'],
-                                                                  cir_total_saida_mes_anterior = dados.at[0,'cir_saidas_anterior'] )
-        self._3_taxa_pcr = self.kpi.kpi3( total_pcr = dados.at[0,'pcr_eventos'],
-                                          total_pacientes_dia = dados.at[0,'pacientes_dia'] )
-        self._4_taxa_mortalidade = self.kpi.kpi4( cli_neo_precoce_total_obitos = dados.at[0,'cli_neo_precoce_obitos'],
-                                                  cli_neo_precoce_total_saidas = dados.at[0,'cli_neo_precoce_saidas'],
-                                                  cli_neo_tardio_total_obitos = dados.at[0,'cli_neo_tardio_obitos'],
-                                                  cli_neo_tardio_total_saidas = dados.at[0,'cli_neo_tardio_saidas'],
-                                                  cli_pedi_total_obitos = dados.at[0,'cli_pedi_obitos'],
-                                                  cli_pedi_total_saidas = dados.at[0,'cli_pedi_saidas'],
-                                                  cli_ad_total_obitos = dados.at[0,'cli_ad_obitos'],
-                                                  cli_ad_total_saidas = dados.at[0,'cli_ad_saidas'],
-                                                  cli_idoso_total_obitos = dados.at[0,'cli_idoso_obitos'],
-                                                  cli_idoso_total_saidas = dados.at[0,'cli_idoso_saidas'],
-                                                  cir_neo_precoce_total_obitos = dados.at[0,'cir_neo_precoce_obitos'],
-                                                  cir_neo_precoce_total_saidas = dados.at[0,'cir_neo_precoce_saidas'],
-                                                  cir_neo_tardio_total_obitos = dados.at[0,'cir_neo_tardio_obitos'],
-                                                  cir_neo_tardio_total_saidas = dados.at[0,'cir_neo_tardio_saidas'],
-                                                  cir_pedi_total_obitos = dados.at[0,'cir_pedi_obitos'],
-                                                  cir_pedi_total_saidas = dados.at[0,'cir_pedi_saidas'],
-                                                  cir_ad_total_obitos = dados.at[0,'cir_ad_obitos'],
-                                                  cir_ad_total_saidas = dados.at[0,'cir_ad_saidas'],
-                                                  cir_idoso_total_obitos = dados.at[0,'cir_idoso_obitos'],
-                                                  cir_idoso_total_saidas = dados.at[0,'cir_idoso_saidas'] )
-        self._5_tempo_medio_internacao = self.kpi.kpi5( cli_pedi_total_pacientes_dia = dados.at[0,'cli_pedi_pacientes_dia'],
-                                                        cli_pedi_total_saidas = dados.at[0,'cli_pedi_saidas'],
-                                                        cli_ad_total_pacientes_dia = dados.at[0,'cli_ad_pacientes_dia'],
-                                                        cli_ad_total_saidas = dados.at[0,'cli_ad_saidas'],
-                                                        cli_idoso_total_pacientes_dia = dados.at[0,'cli_idoso_pacientes_dia'],
-                                                        cli_idoso_total_saidas = dados.at[0,'cli_idoso_saidas'],
-                                                        cir_pedi_total_pacientes_dia = dados.at[0,'cir_pedi_pacientes_dia'],
-                                                        cir_pedi_total_saidas = dados.at[0,'cir_pedi_saidas'],
-                                                        cir_ad_total_pacientes_dia = dados.at[0,'cir_ad_pacientes_dia'],
-                                                        cir_ad_total_saidas = dados.at[0,'cir_ad_saidas'],
-                                                        cir_idoso_total_pacientes_dia = dados.at[0,'cir_idoso_pacientes_dia'],
-                                                        cir_idoso_total_saidas = dados.at[0,'cir_idoso_saidas'] )
-        self._6_tempo_medio_emergencia = self.kpi.kpi6( total_tempo_entrada_termino = dados.at[0,'total_tempo_permanencia_emergencia_hr'],
-                                                        total_pacientes_buscaram_atendimento = dados.at[0,'total_pacientes_emergencia'] )
-        self._7_tempo_medio_espera_emergencia = self.kpi.kpi7( nvl2_total_tempo_espera = dados.at[0,'tempo_total_emergencia_nvl2_min'],
-                                                               nvl2_total_pacientes_buscaram_atendimento = dados.at[0,'pacientes_emergencia_nvl2'],
-                                                               nvl3_total_tempo_espera = dados.at[0,'tempo_total_emergencia_nvl3_min'],
-                                                               nvl3_total_pacientes_buscaram_atendimento = dados.at[0,'pacientes_emergencia_nvl3'] )
-        self._8_taxa_atb_profilatico = self.kpi.kpi8( total_cirurgias_limpas_com_atb = dados.at[0,'cirurgias_com_antibiotico'],
-                                                      total_cirurgias_limpas = dados.at[0,'total_cirurgias_limpas'] )
-        self._9_taxa_infeccao_cirurgia_limpa = self.kpi.kpi9( total_isc_30_dias = dados.at[0,'total_infeccoes'],
-                                                              total_cirurgias_limpas_mes_anterior = dados.at[0,'total_cirurgias_limpas_anterior'] )
-        self._10_incidencia_ipcs_cvc = self.kpi.kpi10( ui_neo_total_ipcs = dados.at[0,'ui_neo_infec'],
-                                                       uti_neo_total_ipcs = dados.at[0,'uti_neo_infec'],
-                                                       ui_pedi_total_ipcs = dados.at[0,'ui_pedi_infec'],
-                                                       uti_pedi_total_ipcs = dados.at[0,'uti_pedi_infec'],
-                                                       ui_ad_total_ipcs = dados.at[0,'ui_ad_infec'],
-                                                       uti_ad_total_ipcs = dados.at[0,'uti_ad_infec'],
-                                                       ui_neo_total_cvc_dia = dados.at[0,'ui_neo_cvc_dia'],
-                                                       uti_neo_total_cvc_dia = dados.at[0,'uti_neo_cvc_dia'],
-                                                       ui_pedi_total_cvc_dia = dados.at[0,'ui_pedi_cvc_dia'],
-                                                       uti_pedi_total_cvc_dia = dados.at[0,'uti_pedi_cvc_dia'],
-                                                       ui_ad_total_cvc_dia = dados.at[0,'ui_ad_cvc_dia'],
-                                                       uti_ad_total_cvc_dia = dados.at[0,'uti_ad_cvc_dia'] )
-        self._11_incidencia_itu_cvd = self.kpi.kpi11( ui_neo_total_itu = dados.at[0,'ui_neo_itu'],
-                                                      uti_neo_total_itu = dados.at[0,'uti_neo_itu'],
-                                                      ui_pedi_total_itu = dados.at[0,'ui_pedi_itu'],
-                                                      uti_pedi_total_itu = dados.at[0,'uti_pedi_itu'],
-                                                      ui_ad_total_itu = dados.at[0,'ui_ad_itu'],
-                                                      uti_ad_total_itu = dados.at[0,'uti_ad_itu'],
-                                                      ui_neo_total_cvd_dia = dados.at[0,'ui_neo_cvd_dia'],
-                                                      uti_neo_total_cvd_dia = dados.at[0,'uti_neo_cvd_dia'],
-                                                      ui_pedi_total_cvd_dia = dados.at[0,'ui_pedi_cvd_dia'],
-                                                      uti_pedi_total_cvd_dia = dados.at[0,'uti_pedi_cvd_dia'],
-                                                      ui_ad_total_cvd_dia = dados.at[0,'ui_ad_cvd_dia'],
-                                                      uti_ad_total_cvd_dia = dados.at[0,'uti_ad_cvd_dia'] )
-        self._12_taxa_profilaxia_tromboembolismo = self.kpi.kpi12( cli_total_pacientes_risco_profilaxia_TEV = dados.at[0,'cli_profilaxia'],
-                                                                   cli_total_pacientes_risco = dados.at[0,'cli_total_pacientes'],
-                                                                   cir_orto_total_pacientes_risco_profilaxia_TEV = dados.at[0,'cir_orto_profilaxia'],
-                                                                   cir_orto_total_pacientes_risco = dados.at[0,'cir_orto_total_pacientes'],
-                                                                   cir_n_orto_total_pacientes_risco_profilaxia_TEV = dados.at[0,'cir_nao_orto_profilaxia'],
-                                                                   cir_n_orto_total_pacientes_risco = dados.at[0,'cir_nao_orto_total_pacientes'] )
-        self._13_incidencia_queda = self.kpi.kpi13( total_quedas_dano = dados.at[0,'quedas_com_dano'],
-                                                    total_pacientes_dia = dados.at[0,'pacientes_dia'] )
-        self._14_evento_sentinela = self.kpi.kpi14( total_eventos_sentinela = dados.at[0,'eventos_sentinela'],
-                                                    total_pacientes_dia = dados.at[0,'pacientes_dia'] )
-        dicionario_resultados = self.cria_dicionario_resultados( cd_cnes = int(dados.at[0,'cd_cnes']),
-                                                                 ano = int(dados.at[0,'ano']),
-                                                                 mes = int(dados.at[0,'mes']) )
-        return dicionario_resultados
+        Organiza documentos de resultados de vários meses (ou trimestres) em uma tabela com uma linha por KPI/estratificação
+        e uma coluna por mês (ou trimestre).
+
+        Args:
+            resultados (list): Documentos de resultados (ex.: calcular_rede, calcular_agregados).
+
+        Returns:
+            pd.DataFrame: Tabela com a coluna KPI e uma coluna por mês ou trimestre.
+        """
+        colunas = {}
+        for resultado in resultados:
+            valores = {}
+            for kpi, objeto in resultado['dados'].items():
+                valores[kpi] = objeto['valor']
+                for estrato in objeto['estratificacao']:
+                    valores[f"{kpi} ({estrato['tipo']})"] = estrato['valor']
+            rotulo = f"{resultado['trimestre']}º trimestre" if 'trimestre' in resultado else config.MONTH_MASK[resultado['mes']]
+            colunas[rotulo] = valores
+        return pd.DataFrame(colunas).rename_axis("KPI").reset_index()
+
+    def monta_tabela_ranking(self, ranking: dict) -> pd.DataFrame:
+        """
+        Organiza o documento de ranking de uma organização em uma tabela com uma linha por KPI/estratificação.
+
+        Args:
+            ranking (dict): Documento de ranking (ver dbConfig.busca_ranking).
+
+        Returns:
+            pd.DataFrame: Tabela com valor, percentil, quartil e estatísticas das organizações comparadas.
+        """
+        tabela = pd.DataFrame.from_dict(ranking['kpis'], orient='index').rename_axis("KPI").reset_index()
+        tabela = tabela.astype({ "quartil": "Int64", "organizacoes": "Int64" })
+        return tabela.rename(columns={ "valor": "Valor", "percentil": "Percentil", "quartil": "Quartil", "q1": "Q1",
+                                       "mediana": "Mediana", "q3": "Q3", "organizacoes": "Organizações" })
 
     def busca_chave_pelo_valor(self, dicionario: dict, valor):
         """
@@ -287,88 +343,190 @@ class App(object):
 
     def valida_arquivo(self, arquivo):
         """
-        Valida o arquivo CSV, verificando se contém as colunas e dados corretos.
+        Valida o arquivo CSV, verificando se contém as colunas e dados corretos e se os valores respeitam as regras de validação.
 
         Args:
             arquivo: Arquivo CSV a ser validado.
 
         Returns:
-            bool: Retorna True se o arquivo for válido, caso contrário, retorna False.
+            tuple: (True, DataFrame com a impressão digital das métricas) se o arquivo for válido, caso contrário (False, None).
         """
-        
-        invalido = None
         try:
             dataframe = pd.read_csv(arquivo)
-            colunas_validadas = self.valida_colunas(dataframe, config.COLUNAS_OBIGATORIAS)
-            if not colunas_validadas:
-                registros_validados = self.valida_registros(dataframe)
-                if not registros_validados:
-                    dados_validados = self.valida_dados(dataframe)
         except ValueError as e:
             st.error(f"Erro ao ler arquivo. {e}")
-            invalido = True
-        
+            return False, None
+
+        erros, relatorio = self.valida_bloco(dataframe)
+        if erros:
+            for erro in erros:
+                st.error(erro, icon="🚨")
+            if not relatorio.empty:
+                st.dataframe(relatorio.head(config.LIMITE_RELATORIO_VALIDACAO), use_container_width=True, hide_index=True)
+            return False, None
+        st.info(f"Arquivo validado. Empresa {dataframe['cd_cnes'][0]}.", icon="✅")
+        return True, self.adiciona_hash_metricas(dataframe)
+
+    def valida_bloco(self, dataframe: pd.DataFrame) -> tuple[list, pd.DataFrame]:
+        """
+        Valida um bloco do arquivo CSV: colunas obrigatórias, registros, valores nulos e regras de validação (config.REGRAS_VALIDACAO).
+
+        Args:
+            dataframe (pd.DataFrame): Bloco a ser validado.
+
+        Returns:
+            tuple: Mensagens de erro (lista vazia se o bloco for válido) e relatório de violações por linha e regra.
+        """
+        relatorio = pd.DataFrame()
+        colunas_validadas = self.valida_colunas(dataframe, config.COLUNAS_OBIGATORIAS)
         if colunas_validadas:
-            st.error(f"Uma ou mais colunas não encontradas. Esperado: {', '.join(colunas_validadas)}.", icon="🚨")
-            return False
-        elif registros_validados:
-            st.error(f"O arquivo não possui registros", icon="🚨")
-            return False
-        elif dados_validados:
-            st.error(f"Uma ou mais colunas estão com valor nulo: {', '.join(dados_validados)}.", icon="🚨")
+            return [f"Uma ou mais colunas não encontradas. Esperado: {', '.join(colunas_validadas)}."], relatorio
+        if self.valida_registros(dataframe):
+            return ["O arquivo não possui registros"], relatorio
+        dados_validados = self.valida_dados(dataframe)
+        if dados_validados:
+            return [f"Uma ou mais colunas estão com valor nulo: {', '.join(dados_validados)}."], relatorio
+        relatorio = self.validador.avalia(dataframe)
+        if not relatorio.empty:
+            return [f"Valores inválidos encontrados. {'; '.join(self.validador.resume(relatorio))}."], relatorio
+        return [], relatorio
+
+    def identifica_arquivo(self, arquivo) -> str:
+        """
+        Calcula o identificador (SHA-256 do conteúdo) de um arquivo, usado para retomar envios interrompidos.
+
+        Args:
+            arquivo: Arquivo enviado (objeto com read e seek).
+
+        Returns:
+            str: Identificador hexadecimal do arquivo.
+        """
+        resumo = hashlib.sha256()
+        arquivo.seek(0)
+        for parte in iter(lambda: arquivo.read(1024 * 1024), b""):
+            resumo.update(parte)
+        arquivo.seek(0)
+        return resumo.hexdigest()
+
+    def valida_arquivo_em_blocos(self, arquivo, tamanho_bloco: int = config.TAMANHO_BLOCO_UPLOAD) -> bool:
+        """
+        Valida o arquivo CSV inteiro, bloco a bloco e sem gravar nada, exibindo os erros e o relatório de violações por linha
+        como em valida_arquivo. Deve ser chamado antes do envio em blocos, para que um arquivo inválido não seja gravado parcialmente.
+
+        Args:
+            arquivo: Arquivo CSV a ser validado.
+            tamanho_bloco (int): Número de linhas por bloco.
+
+        Returns:
+            bool: True se todos os blocos forem válidos.
+        """
+        erros = []
+        partes = []
+        linhas_relatorio = 0
+        try:
+            for indice, bloco in enumerate(pd.read_csv(arquivo, chunksize=tamanho_bloco)):
+                erros_bloco, relatorio = self.valida_bloco(bloco)
+                erros.extend(f"Bloco {indice+1}: {erro}" for erro in erros_bloco)
+                if not relatorio.empty and linhas_relatorio < config.LIMITE_RELATORIO_VALIDACAO:
+                    partes.append(relatorio)
+                    linhas_relatorio = linhas_relatorio + len(relatorio)
+        except ValueError as e:
+            st.error(f"Erro ao ler arquivo. {e}")
             return False
-        elif invalido:
+        finally:
+            arquivo.seek(0)
+
+        if erros:
+            for erro in erros[:config.LIMITE_ERROS_BLOCOS]:
+                st.error(erro, icon="🚨")
+            if len(erros) > config.LIMITE_ERROS_BLOCOS:
+                st.error(f"E mais {len(erros) - config.LIMITE_ERROS_BLOCOS} bloco(s) com erros.", icon="🚨")
+            if partes:
+                st.dataframe(pd.concat(partes, ignore_index=True).head(config.LIMITE_RELATORIO_VALIDACAO), use_container_width=True, hide_index=True)
             return False
-        else:
-            st.info(f"Arquivo validado. Empresa {dataframe['cd_cnes'][0]}.", icon="✅")
-            return True, dataframe
+        st.info("Arquivo validado.", icon="✅")
+        return True
 
-    # HOME
-    def valida_historico(self, dados_brutos: list) -> pd.DataFrame:
+    def converte_tipos(self, dataframe: pd.DataFrame) -> pd.DataFrame:
         """
-        Valida e converte os dados de histórico para um DataFrame.
-        
+        Converte um bloco já validado para o esquema de tipos de config.TIPOS_COLUNAS.
+
         Args:
-            dados_brutos (list): Dados brutos a serem validados.
+            dataframe (pd.DataFrame): Bloco validado.
 
         Returns:
-            pd.DataFrame: DataFrame com os dados de histórico.
+            pd.DataFrame: Cópia do bloco com as colunas obrigatórias em int64 ou float64.
         """
-        if dados_brutos:
-            dataframe = pd.DataFrame(dados_brutos).T.drop('ano', axis=0)
-            dataframe = pd.DataFrame(dataframe.apply(lambda x: not pd.isna(x.any()), axis=0)).T
-        else:
-            dataframe = pd.DataFrame()
+        return dataframe.assign(**{ coluna: pd.to_numeric(dataframe[coluna]) for coluna in config.TIPOS_COLUNAS }).astype(config.TIPOS_COLUNAS)
+
+    def le_arquivo_em_blocos(self, arquivo, tamanho_bloco: int = config.TAMANHO_BLOCO_UPLOAD):
+        """
+        Lê o arquivo CSV em blocos, validando cada bloco antes de convertê-lo para o esquema de tipos de config.TIPOS_COLUNAS.
+        Os blocos são lidos com os tipos inferidos (números ou texto), para que valores não numéricos ou com casas decimais
+        em colunas inteiras sejam reportados pelas regras de validação, e não como erro de conversão.
+
+        Args:
+            arquivo: Arquivo CSV a ser lido.
+            tamanho_bloco (int): Número de linhas por bloco.
 
-        return dataframe
+        Yields:
+            tuple: Índice do bloco e DataFrame validado, já convertido para o esquema de tipos e com a impressão digital das métricas.
 
-    def monta_historico(self, dados_metricas: list, dados_resultados: list) -> pd.DataFrame:
+        Raises:
+            ValueError: Se algum bloco for inválido ou não puder ser lido.
+        """
+        for indice, bloco in enumerate(pd.read_csv(arquivo, chunksize=tamanho_bloco)):
+            erros, _ = self.valida_bloco(bloco)
+            if erros:
+                raise ValueError(f"Bloco {indice+1}: {' '.join(erros)}")
+            yield indice, self.adiciona_hash_metricas(self.converte_tipos(bloco))
+
+    # HOME
+    def monta_historico(self, resumo: dict) -> pd.DataFrame:
         """
-        Concatena e organiza os dados históricos de métricas e resultados em um único DataFrame.
+        Monta a grade de status do ano (enviado e consolidado por mês) a partir das máscaras de bits de dbConfig.busca_resumo.
 
         Args:
-            dados_metricas (pd.DataFrame): Dados das métricas.
-            dados_resultados (pd.DataFrame): Dados dos resultados.
+            resumo (dict): Máscaras {"enviado": int, "consolidado": int} (bit 0 = janeiro).
 
         Returns:
-            pd.DataFrame: DataFrame contendo o histórico completo.
-        """
-        df_metricas = self.valida_historico(dados_metricas)
-        df_resultados = self.valida_historico(dados_resultados)
-
-        historico = pd.concat([df_metricas, df_resultados]).reset_index()
-        if (historico.size > 0):
-            if(historico.shape[1] != 13):
-                for i in range(12):
-                    if i > historico.columns[-1]:
-                        historico[i] = None
-                    else:
-                        pass
-            historico['index'] = historico['index'].astype(str)
-            historico.at[0, 'index'] = 'Enviado'
-            historico.at[1, 'index'] = 'Consolidado'
-            historico.columns = ["STATUS", "JAN", "FEV", "MAR", "ABR", "MAIO", "JUN", "JUL", "AGO", "SET", "OUT", "NOV", "DEZ"]
-            historico = historico.fillna(False)
-        else:
-            historico = pd.DataFrame()   
+            pd.DataFrame: Grade com as colunas STATUS e JAN a DEZ e as linhas Enviado e Consolidado. Vazia se não houver dados.
+        """
+        mascaras = np.array([resumo.get("enviado", 0), resumo.get("consolidado", 0)], dtype=np.int64)
+        if not mascaras.any():
+            return pd.DataFrame()
+        grade = ((mascaras[:, None] >> np.arange(12)) & 1).astype(bool)
+        historico = pd.DataFrame(grade, columns=config.MESES_HISTORICO)
+        historico.insert(0, "STATUS", ["Enviado", "Consolidado"])
         return historico
+
+    def monta_grade_rede(self, status: list, lista_empresas: list, anos: list) -> pd.DataFrame:
+        """
+        Monta a grade de status da rede, com uma linha por organização e uma coluna por mês dos anos informados,
+        a partir dos documentos de dbConfig.busca_status_rede. Cada célula recebe o símbolo de config.SIMBOLOS_STATUS.
+
+        Args:
+            status (list): Documentos de status com cd_cnes, ano e as máscaras enviado e consolidado.
+            lista_empresas (list): Organizações ativas no formato "nome (cd_cnes)", exibidas mesmo sem dados.
+            anos (list): Anos das colunas.
+
+        Returns:
+            pd.DataFrame: Grade com a coluna Empresa e as colunas MÊS/AA, ordenada pelo nome da organização.
+        """
+        anos = sorted(int(ano) for ano in anos)
+        nomes = { int(re.search(r"\((\d+)\)$", empresa).group(1)): empresa for empresa in lista_empresas }
+        dados = pd.DataFrame(status, columns=["cd_cnes", "ano", "enviado", "consolidado"]).fillna(0).astype("int64")
+        cnes = sorted(set(nomes) | set(dados["cd_cnes"].tolist()))
+
+        # Máscaras (organizações x anos) e, por deslocamento de bits, códigos (organizações x anos x meses)
+        linhas = pd.Index(cnes).get_indexer(dados["cd_cnes"])
+        colunas = pd.Index(anos).get_indexer(dados["ano"])
+        mascaras = np.zeros((2, len(cnes), len(anos)), dtype=np.int64)
+        mascaras[:, linhas, colunas] = dados[["enviado", "consolidado"]].to_numpy().T
+        bits = (mascaras[..., None] >> np.arange(12)) & 1
+        codigos = (bits[0] + 2 * bits[1]).reshape(len(cnes), len(anos) * 12)
+
+        grade = pd.DataFrame(np.asarray(config.SIMBOLOS_STATUS, dtype=object)[codigos],
+                             columns=[f"{mes}/{ano % 100:02d}" for ano in anos for mes in config.MESES_HISTORICO])
+        grade.insert(0, "Empresa", [nomes.get(c, str(c)) for c in cnes])
+        return grade.sort_values("Empresa", kind="stable").reset_index(drop=True)
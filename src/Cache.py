@@ -0,0 +1,335 @@
+import os
+import time
+import pickle
+import sqlite3
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+import pandas as pd
+import config
+
+class CacheDisco(object):
+    """
+    Camada em disco do cache (SQLite local), para agregados caros que devem sobreviver a reinícios e reimplantações.
+    Os escopos de cada entrada ficam em uma tabela própria, para que a invalidação por (coleção, cd_cnes, ano) seja uma única instrução.
+    """
+
+    def __init__(self, caminho: str):
+        """
+        Abre (ou cria) o arquivo do cache em disco.
+
+        Args:
+            caminho (str): Caminho do arquivo SQLite.
+        """
+        diretorio = os.path.dirname(caminho)
+        if diretorio:
+            os.makedirs(diretorio, exist_ok=True)
+        self.caminho = caminho
+        self._trava = threading.Lock()
+        self._conexao = sqlite3.connect(caminho, check_same_thread=False, timeout=30)
+        with self._trava, self._conexao:
+            self._conexao.execute("PRAGMA journal_mode=WAL")
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS entradas (chave TEXT PRIMARY KEY, expiracao REAL, valor BLOB)")
+            self._conexao.execute("CREATE TABLE IF NOT EXISTS escopos (chave TEXT, colecao TEXT, cnes INTEGER, ano INTEGER)")
+            self._conexao.execute("CREATE INDEX IF NOT EXISTS escopos_colecao ON escopos (colecao, cnes, ano)")
+        pass
+
+    def busca(self, chave: str):
+        """
+        Recupera o valor serializado de uma entrada válida.
+
+        Args:
+            chave (str): Chave da entrada.
+
+        Returns:
+            tuple: Valor serializado, escopos e expiração (time.time()) da entrada,
+                ou (None, (), None) se a entrada não existir ou tiver expirado.
+        """
+        with self._trava:
+            linha = self._conexao.execute("SELECT valor, expiracao FROM entradas WHERE chave = ? AND expiracao >= ?", (chave, time.time())).fetchone()
+            if not linha:
+                return None, (), None
+            escopos = self._conexao.execute("SELECT colecao, cnes, ano FROM escopos WHERE chave = ?", (chave,)).fetchall()
+        return linha[0], tuple(escopos), linha[1]
+
+    def grava(self, chave: str, escopos: list, valor: bytes, ttl: float) -> None:
+        """
+        Grava (ou substitui) uma entrada serializada.
+
+        Args:
+            chave (str): Chave da entrada.
+            escopos (list): Escopos (coleção, cd_cnes, ano) dos dados lidos.
+            valor (bytes): Valor serializado.
+            ttl (float): Tempo de vida, em segundos.
+        """
+        with self._trava, self._conexao:
+            self._conexao.execute("DELETE FROM escopos WHERE chave = ?", (chave,))
+            self._conexao.execute("INSERT OR REPLACE INTO entradas VALUES (?, ?, ?)", (chave, time.time() + ttl, valor))
+            self._conexao.executemany("INSERT INTO escopos VALUES (?, ?, ?, ?)",
+                                      [(chave, colecao, None if cnes is None else int(cnes), None if ano is None else int(ano))
+                                       for colecao, cnes, ano in escopos])
+
+    def invalida(self, nome_colecao: str, cnes: int = None, ano: int = None) -> int:
+        """
+        Remove as entradas com algum escopo sobreposto à escrita em (coleção, cd_cnes, ano).
+
+        Returns:
+            int: Número de entradas removidas.
+        """
+        filtro = "SELECT chave FROM escopos WHERE colecao = ? AND (cnes IS NULL OR ? IS NULL OR cnes = ?) AND (ano IS NULL OR ? IS NULL OR ano = ?)"
+        parametros = (nome_colecao, cnes, None if cnes is None else int(cnes), ano, None if ano is None else int(ano))
+        with self._trava, self._conexao:
+            removidas = self._conexao.execute(f"DELETE FROM entradas WHERE chave IN ({filtro})", parametros).rowcount
+            self._conexao.execute("DELETE FROM escopos WHERE chave NOT IN (SELECT chave FROM entradas)")
+        return removidas
+
+    def remove_expiradas(self) -> int:
+        """
+        Remove as entradas expiradas.
+
+        Returns:
+            int: Número de entradas removidas.
+        """
+        with self._trava, self._conexao:
+            removidas = self._conexao.execute("DELETE FROM entradas WHERE expiracao < ?", (time.time(),)).rowcount
+            self._conexao.execute("DELETE FROM escopos WHERE chave NOT IN (SELECT chave FROM entradas)")
+        return removidas
+
+    def limpa(self) -> None:
+        """
+        Remove todas as entradas.
+        """
+        with self._trava, self._conexao:
+            self._conexao.execute("DELETE FROM entradas")
+            self._conexao.execute("DELETE FROM escopos")
+
+class Cache(object):
+    """
+    Cache em camadas das leituras do dbConfig e dos cálculos do App, independente do Streamlit:
+    uma camada em memória (descarte do menos usado, com limite de entradas e de bytes) e uma camada opcional em disco (CacheDisco).
+    As entradas têm tempo de vida e são invalidadas por escopo (coleção, cd_cnes, ano). Os valores são guardados serializados,
+    o que permite contabilizar a memória e devolver sempre uma cópia.
+    """
+
+    def __init__(self, tamanho_maximo: int = config.CACHE_TAMANHO_MAXIMO, ttl: float = config.CACHE_TTL_SEGUNDOS,
+                 memoria_maxima: int = config.CACHE_MEMORIA_MAXIMA, caminho_disco: str = config.CACHE_CAMINHO_DISCO):
+        """
+        Inicializa o cache vazio.
+
+        Args:
+            tamanho_maximo (int): Número máximo de entradas em memória.
+            ttl (float): Tempo de vida de cada entrada, em segundos.
+            memoria_maxima (int): Tamanho máximo, em bytes, dos valores em memória.
+            caminho_disco (str): Arquivo da camada em disco. Se None, apenas a camada em memória é usada.
+        """
+        self.tamanho_maximo = tamanho_maximo
+        self.ttl = ttl
+        self.memoria_maxima = memoria_maxima
+        self.disco = CacheDisco(caminho_disco) if caminho_disco else None
+        self._entradas = OrderedDict()  # chave -> (expiração, escopos, valor serializado), da menos para a mais usada
+        self._bytes = 0
+        self._contadores = dict.fromkeys(["acertos_memoria", "acertos_disco", "falhas", "descartes", "expiradas", "invalidadas"], 0)
+        self._trava = threading.Lock()
+        pass
+
+    def _remove(self, chave: tuple) -> None:
+        """
+        Remove uma entrada da camada em memória, atualizando a contabilidade de bytes. Deve ser chamada com a trava adquirida.
+        """
+        _, _, valor = self._entradas.pop(chave)
+        self._bytes = self._bytes - len(valor)
+
+    def _guarda_memoria(self, chave: tuple, expiracao: float, escopos: tuple, valor: bytes) -> None:
+        """
+        Guarda um valor serializado na camada em memória, descartando as entradas menos usadas até respeitar os limites.
+        Valores maiores que o limite de memória não são guardados. Deve ser chamada com a trava adquirida.
+        """
+        if chave in self._entradas:
+            self._remove(chave)
+        if len(valor) > self.memoria_maxima:
+            return
+        self._entradas[chave] = (expiracao, escopos, valor)
+        self._bytes = self._bytes + len(valor)
+        while len(self._entradas) > self.tamanho_maximo or self._bytes > self.memoria_maxima:
+            self._remove(next(iter(self._entradas)))
+            self._contadores["descartes"] += 1
+
+    def chave_disco(self, chave: tuple) -> str:
+        """
+        Converte a chave de uma entrada na chave textual da camada em disco.
+
+        Args:
+            chave (tuple): Chave da entrada.
+
+        Returns:
+            str: Resumo SHA-256 da chave.
+        """
+        return hashlib.sha256(repr(chave).encode("utf-8")).hexdigest()
+
+    def busca(self, chave: tuple, disco: bool = False) -> tuple[bool, object]:
+        """
+        Recupera uma entrada válida, primeiro em memória e, se solicitado, no disco (promovendo-a para a memória
+        com o tempo de vida restante da entrada em disco).
+
+        Args:
+            chave (tuple): Chave da entrada.
+            disco (bool): Se True, consulta também a camada em disco.
+
+        Returns:
+            tuple: Se a entrada foi encontrada e uma cópia do valor (None se não foi encontrada).
+        """
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and entrada[0] < time.monotonic():
+                self._remove(chave)
+                self._contadores["expiradas"] += 1
+                entrada = None
+            if entrada is not None:
+                self._entradas.move_to_end(chave)
+                self._contadores["acertos_memoria"] += 1
+                return True, pickle.loads(entrada[2])
+
+        valor, escopos, expiracao = self.disco.busca(self.chave_disco(chave)) if (disco and self.disco) else (None, (), None)
+        with self._trava:
+            if valor is None:
+                self._contadores["falhas"] += 1
+                return False, None
+            self._contadores["acertos_disco"] += 1
+            # A camada em disco usa o relógio do sistema e a em memória o monotônico: converte o tempo restante
+            self._guarda_memoria(chave, time.monotonic() + (expiracao - time.time()), escopos, valor)
+            return True, pickle.loads(valor)
+
+    def grava(self, chave: tuple, escopos: list, valor, disco: bool = False) -> None:
+        """
+        Grava uma entrada em memória e, se solicitado, no disco.
+
+        Args:
+            chave (tuple): Chave da entrada.
+            escopos (list): Escopos (coleção, cd_cnes, ano) dos dados lidos. None em cd_cnes ou ano indica todos.
+            valor: Valor a ser armazenado (é serializado com pickle).
+            disco (bool): Se True, grava também na camada em disco.
+        """
+        serializado = pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._trava:
+            self._guarda_memoria(chave, time.monotonic() + self.ttl, tuple(escopos), serializado)
+        if disco and self.disco:
+            self.disco.grava(self.chave_disco(chave), escopos, serializado, self.ttl)
+
+    def invalida(self, nome_colecao: str, cnes: int = None, ano: int = None) -> int:
+        """
+        Remove, nas duas camadas, as entradas cujos dados foram alterados por uma escrita em (coleção, cd_cnes, ano).
+        Uma entrada é removida quando algum de seus escopos é da mesma coleção e se sobrepõe à escrita em cd_cnes e ano.
+
+        Args:
+            nome_colecao (str): Coleção alterada.
+            cnes (int): CNES alterado. None indica todos.
+            ano (int): Ano alterado. None indica todos.
+
+        Returns:
+            int: Número de entradas removidas, somadas as duas camadas.
+        """
+        def sobrepoe(escopo):
+            colecao, cnes_escopo, ano_escopo = escopo
+            return (colecao == nome_colecao
+                    and (cnes is None or cnes_escopo is None or int(cnes_escopo) == int(cnes))
+                    and (ano is None or ano_escopo is None or int(ano_escopo) == int(ano)))
+
+        with self._trava:
+            removidas = [chave for chave, (_, escopos, _) in self._entradas.items() if any(sobrepoe(escopo) for escopo in escopos)]
+            for chave in removidas:
+                self._remove(chave)
+            numero_removidas = len(removidas)
+        if self.disco:
+            numero_removidas = numero_removidas + self.disco.invalida(nome_colecao, cnes, ano)
+        with self._trava:
+            self._contadores["invalidadas"] += numero_removidas
+        return numero_removidas
+
+    def estatisticas(self) -> dict:
+        """
+        Retorna as estatísticas do cache desde o início do processo.
+
+        Returns:
+            dict: Acertos por camada, falhas, descartes por limite, entradas expiradas e invalidadas,
+                número de entradas e bytes ocupados em memória.
+        """
+        with self._trava:
+            return { **self._contadores, "entradas": len(self._entradas), "bytes": self._bytes }
+
+    def limpa(self) -> None:
+        """
+        Remove todas as entradas das duas camadas.
+        """
+        with self._trava:
+            self._entradas.clear()
+            self._bytes = 0
+        if self.disco:
+            self.disco.limpa()
+
+# Cache único do processo, compartilhado pelas instâncias de dbConfig e App
+cache_leituras = Cache()
+
+def chave_argumento(valor) -> str:
+    """
+    Representa um argumento na chave do cache. DataFrames são representados pelo hash do conteúdo.
+
+    Args:
+        valor: Argumento do método.
+
+    Returns:
+        str: Representação do argumento.
+    """
+    if isinstance(valor, pd.DataFrame):
+        conteudo = pd.util.hash_pandas_object(valor, index=True).to_numpy().tobytes()
+        return f"DataFrame:{hashlib.sha256(conteudo + repr(list(valor.columns)).encode('utf-8')).hexdigest()}"
+    return str(valor)
+
+def identifica_conexao(string_conexao: str) -> str:
+    """
+    Representa a string de conexão na chave do cache pelo seu resumo SHA-256, para que as credenciais
+    não fiquem na memória do cache nem no arquivo da camada em disco.
+
+    Args:
+        string_conexao (str): String de conexão MongoDB (ou None).
+
+    Returns:
+        str: Resumo da string de conexão, ou None.
+    """
+    if string_conexao is None:
+        return None
+    return hashlib.sha256(str(string_conexao).encode("utf-8")).hexdigest()
+
+def cacheado(escopos, disco: bool = False):
+    """
+    Decorador de métodos de leitura e de cálculo: guarda o resultado em cache_leituras pela chave
+    (classe, conexão, banco, método, argumentos) e o associa aos escopos lidos, para que as escritas invalidem apenas as entradas afetadas.
+    A conexão entra na chave pelo resumo da string de conexão (ver identifica_conexao).
+
+    Args:
+        escopos (callable): Função que recebe os argumentos nomeados do método e retorna a lista de escopos (coleção, cd_cnes, ano).
+            Cálculos puros sobre os argumentos retornam lista vazia e dependem apenas do tempo de vida e do descarte.
+        disco (bool): Se True, o resultado também é guardado na camada em disco (agregados caros).
+
+    Returns:
+        callable: Decorador.
+    """
+    def decorador(metodo):
+        assinatura = inspect.signature(metodo)
+
+        @functools.wraps(metodo)
+        def envoltorio(self, *args, **kwargs):
+            argumentos = assinatura.bind(self, *args, **kwargs)
+            argumentos.apply_defaults()
+            nomeados = dict(list(argumentos.arguments.items())[1:])
+            chave = (type(self).__name__, identifica_conexao(getattr(self, "string_conexao", None)), getattr(self, "banco", None), metodo.__name__,
+                     tuple(sorted((nome, chave_argumento(valor)) for nome, valor in nomeados.items())))
+            encontrado, valor = cache_leituras.busca(chave, disco=disco)
+            if encontrado:
+                return valor
+            valor = metodo(self, *args, **kwargs)
+            cache_leituras.grava(chave, escopos(**nomeados), valor, disco=disco)
+            return valor
+        return envoltorio
+    return decorador
@@ -0,0 +1,461 @@
+import os
+import json
+import multiprocessing
+import concurrent.futures
+import pandas as pd
+import config
+from src.App import App
+from src.dbConfig import dbConfig
+
+def consolida_particao(db: dbConfig, cnes: list, ano_inicio: int = None, ano_fim: int = None, incremental: bool = True) -> list:
+    """
+    Calcula os documentos de resultados de uma partição de organizações. Executada nos processos da consolidação paralela:
+    cada processo abre seu próprio cliente MongoDB (ver GerenciadorConexao.chave) e apenas lê; a gravação fica com o processo principal.
+
+    Args:
+        db (dbConfig): Configuração do banco de dados (apenas URI, banco e opções são transferidos ao processo).
+        cnes (list): CNES da partição.
+        ano_inicio (int): Primeiro ano (inclusive).
+        ano_fim (int): Último ano (inclusive).
+        incremental (bool): Se True, calcula apenas as competências desatualizadas (ver Consolidacao.filtra_desatualizadas).
+
+    Returns:
+        tuple: Documentos de resultados em ordem de (cd_cnes, ano, mes) e componentes do cubo (ver KPI.calcula_componentes).
+    """
+    consolidacao = Consolidacao(db=db)
+    filtro = db.filtro_selecao(cnes=cnes, ano_inicio=ano_inicio, ano_fim=ano_fim)
+    lotes = list(db.busca_metricas_em_lotes(nome_colecao="metricas", filtro=filtro))
+    metricas = pd.DataFrame([documento for lote in lotes for documento in lote])
+    if incremental and not metricas.empty:
+        metricas = consolidacao.filtra_desatualizadas(metricas, set())
+    if metricas.empty:
+        return [], None
+    return consolidacao.calcula_documentos(metricas), consolidacao.kpi.calcula_componentes(metricas)
+
+class Consolidacao(object):
+    """
+    Classe que orquestra a consolidação em lote: cálculo dos KPIs, cálculo da variação mensal e gravação de métricas e resultados.
+    """
+
+    def __init__(self, db: dbConfig = None, app: App = None):
+        """
+        Inicializa a consolidação com as instâncias de banco de dados e de aplicativo.
+
+        Args:
+            db (dbConfig): Configuração do banco de dados. Padrão: dbConfig().
+            app (App): Aplicativo de KPIs. Padrão: App().
+        """
+        self.db = db or dbConfig()
+        self.app = app or App()
+        self.kpi = self.app.kpi
+        pass
+
+    def competencias_anteriores(self, competencias: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcula a competência anterior (mês anterior, com a virada de dezembro para janeiro) de cada competência.
+
+        Args:
+            competencias (pd.DataFrame): DataFrame com as colunas cd_cnes, ano e mes.
+
+        Returns:
+            pd.DataFrame: DataFrame com as colunas cd_cnes, ano e mes da competência anterior.
+        """
+        periodo = competencias['ano'].astype(int) * 12 + competencias['mes'].astype(int) - 2
+        return pd.DataFrame({ "cd_cnes": competencias['cd_cnes'].astype(int), "ano": periodo // 12, "mes": periodo % 12 + 1 })
+
+    def competencias_seguintes(self, competencias: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcula a competência seguinte (mês seguinte, com a virada de dezembro para janeiro) de cada competência.
+
+        Args:
+            competencias (pd.DataFrame): DataFrame com as colunas cd_cnes, ano e mes.
+
+        Returns:
+            pd.DataFrame: DataFrame com as colunas cd_cnes, ano e mes da competência seguinte.
+        """
+        periodo = competencias['ano'].astype(int) * 12 + competencias['mes'].astype(int)
+        return pd.DataFrame({ "cd_cnes": competencias['cd_cnes'].astype(int), "ano": periodo // 12, "mes": periodo % 12 + 1 })
+
+    def aplica_variacoes(self, documentos: list, anteriores: list) -> list:
+        """
+        Preenche a variação mensal dos documentos de resultados, usando os próprios documentos e os resultados anteriores já gravados.
+
+        Args:
+            documentos (list): Documentos de resultados a serem gravados.
+            anteriores (list): Resultados já gravados das competências anteriores (apenas os valores dos KPIs).
+
+        Returns:
+            list: Os mesmos documentos, com a variação preenchida quando houver mês anterior.
+        """
+        variacoes = self.kpi.calcula_variacao(self.kpi.monta_serie_valores(documentos + anteriores))
+        kpis = list(variacoes.columns)
+        por_competencia = dict(zip(variacoes.index, variacoes.astype(object).to_numpy().tolist()))
+        for documento in documentos:
+            linha = por_competencia.get((documento['cd_cnes'], documento['ano'], documento['mes']))
+            if linha is None:
+                continue
+            for kpi, variacao in zip(kpis, linha):
+                documento['dados'][kpi]['variacao'] = "" if pd.isna(variacao) else int(variacao)
+        return documentos
+
+    def filtra_desatualizadas(self, metricas: pd.DataFrame, alteradas: set) -> pd.DataFrame:
+        """
+        Seleciona as competências cujo resultado precisa ser recalculado: sem resultado gravado, com resultado calculado a partir de
+        métricas diferentes (impressão digital em config.CAMPO_HASH_METRICAS) ou cujo mês anterior mudou na mesma execução,
+        já que a variação mensal depende dele.
+
+        Args:
+            metricas (pd.DataFrame): Métricas de uma ou mais organizações e meses.
+            alteradas (set): Competências (cd_cnes, ano, mes) com métricas alteradas já encontradas na execução. É atualizado com as deste lote.
+
+        Returns:
+            pd.DataFrame: Linhas de métricas desatualizadas, na ordem original.
+        """
+        chaves = list(zip(metricas['cd_cnes'].astype(int), metricas['ano'].astype(int), metricas['mes'].astype(int)))
+        anteriores = list(self.competencias_anteriores(metricas).itertuples(index=False, name=None))
+        gravados = self.db.busca_hashes(nome_colecao="resultados_kpis", competencias=chaves)
+        alteradas.update(chave for chave, hash_metricas in zip(chaves, self.app.calcula_hash_metricas(metricas).tolist())
+                         if gravados.get(chave) != hash_metricas)
+        return metricas[[chave in alteradas or anterior in alteradas for chave, anterior in zip(chaves, anteriores)]]
+
+    def calcula_documentos(self, metricas: pd.DataFrame) -> list:
+        """
+        Calcula os documentos de resultados de todas as competências de um DataFrame de métricas, já com a variação mensal
+        e a impressão digital das métricas de origem.
+        Os resultados do mês anterior que não estão no lote são lidos do banco em uma única consulta.
+
+        Args:
+            metricas (pd.DataFrame): Métricas de uma ou mais organizações e meses.
+
+        Returns:
+            list: Documentos de resultados, um por competência.
+        """
+        documentos = self.app.calcular_lote(metricas)
+        for documento, hash_metricas in zip(documentos, self.app.calcula_hash_metricas(metricas).tolist()):
+            documento[config.CAMPO_HASH_METRICAS] = hash_metricas
+        chaves = set(zip(metricas['cd_cnes'].astype(int), metricas['ano'].astype(int), metricas['mes'].astype(int)))
+        anteriores = [competencia for competencia in self.competencias_anteriores(metricas).itertuples(index=False, name=None)
+                      if competencia not in chaves]
+        resultados_anteriores = self.db.busca_valores_kpis(nome_colecao="resultados_kpis", competencias=sorted(set(anteriores)))
+        return self.aplica_variacoes(documentos, resultados_anteriores)
+
+    def grava_resultados(self, documentos: list, componentes: pd.DataFrame, adiadas: set = None) -> tuple[bool, int]:
+        """
+        Grava os resultados recém-calculados junto com seus componentes no cubo de numeradores e denominadores
+        e atualiza os derivados das competências gravadas (ver atualiza_derivados).
+
+        Args:
+            documentos (list): Documentos de resultados.
+            componentes (pd.DataFrame): Componentes das mesmas competências (ver KPI.calcula_componentes).
+            adiadas (set): Se informado, os derivados não são atualizados: as competências (cd_cnes, ano, mes) gravadas são
+                acrescentadas ao conjunto e o chamador chama atualiza_derivados uma única vez ao final (ex.: envio em blocos, backfill).
+
+        Returns:
+            tuple: Confirmação da operação e número de resultados gravados.
+
+        Raises:
+            Exception: Se ocorrer erro ao gravar os documentos.
+        """
+        if not documentos:
+            return True, 0
+        confirmacao, numero_registros = self.db.upsert_documentos(nome_colecao="resultados_kpis", documentos=documentos)
+        self.db.upsert_cubo(nome_colecao=config.COLECAO_CUBO, componentes=componentes)
+        competencias = set((int(documento['cd_cnes']), int(documento['ano']), int(documento['mes'])) for documento in documentos)
+        if adiadas is None:
+            self.atualiza_derivados(competencias)
+        else:
+            adiadas.update(competencias)
+        return confirmacao, numero_registros
+
+    def atualiza_derivados(self, competencias: set, recalcula_gravadas: bool = False) -> None:
+        """
+        Atualiza o que deriva dos resultados de um conjunto de competências: a variação dos meses seguintes (ver atualiza_dependentes)
+        e o ranking dos meses afetados (ver atualiza_ranking), uma única vez para todo o conjunto.
+
+        Args:
+            competencias (set): Competências (cd_cnes, ano, mes) gravadas.
+            recalcula_gravadas (bool): Ver atualiza_dependentes.
+        """
+        if not competencias:
+            return
+        self.atualiza_dependentes(competencias, recalcula_gravadas=recalcula_gravadas)
+        self.atualiza_ranking(set((ano, mes) for _, ano, mes in competencias))
+
+    def competencias_sem_seguinte(self, competencias: set) -> set:
+        """
+        Filtra as competências cuja competência seguinte não faz parte do conjunto, as únicas que atualiza_dependentes usa.
+        Permite acumular as competências adiadas de um backfill (e registrá-las no checkpoint) sem guardar a seleção inteira.
+
+        Args:
+            competencias (set): Competências (cd_cnes, ano, mes).
+
+        Returns:
+            set: Competências do conjunto sem a competência seguinte no conjunto.
+        """
+        if not competencias:
+            return set()
+        chaves = pd.DataFrame(sorted(competencias), columns=['cd_cnes', 'ano', 'mes'])
+        seguintes = self.competencias_seguintes(chaves).itertuples(index=False, name=None)
+        return set(competencia for competencia, seguinte in zip(chaves.itertuples(index=False, name=None), seguintes)
+                   if seguinte not in competencias)
+
+    def atualiza_ranking(self, meses: set) -> int:
+        """
+        Recalcula o ranking das organizações ativas entre as pares nos meses informados: para cada mês, uma leitura colunar dos
+        resultados, percentis e quartis vetorizados e uma escrita em lote em config.COLECAO_RANKING. Cada documento de ranking
+        traz também as estatísticas do mês (q1, mediana, q3), para que a página de uma organização precise de uma única leitura.
+
+        Args:
+            meses (set): Competências (ano, mes) a atualizar.
+
+        Returns:
+            int: Número de documentos de ranking gravados.
+        """
+        if not meses:
+            return 0
+        ativos = self.db.busca_cnes_ativos(nome_colecao="empresas")
+        numero_registros = 0
+        for ano, mes in sorted(meses):
+            valores = self.kpi.monta_tabela_valores(self.db.busca_resultados_mes(nome_colecao="resultados_kpis", ano=ano, mes=mes, cnes=ativos))
+            if valores.empty:
+                continue
+            percentis, quartis, estatisticas = self.kpi.calcula_ranking(valores)
+            colunas = list(valores.columns)
+            estatisticas_colunas = { coluna: { chave: (None if pd.isna(valor) else float(valor)) for chave, valor in estatisticas[coluna].items() }
+                                     for coluna in colunas }
+            documentos = []
+            for cd_cnes, linha_valores, linha_percentis, linha_quartis in zip(valores.index, valores.to_numpy().tolist(),
+                                                                             percentis.to_numpy().tolist(), quartis.to_numpy().tolist()):
+                documentos.append({
+                    "cd_cnes": int(cd_cnes),
+                    "ano": int(ano),
+                    "mes": int(mes),
+                    "kpis": { coluna: { "valor": valor,
+                                        "percentil": None if pd.isna(percentil) else percentil,
+                                        "quartil": None if pd.isna(quartil) else int(quartil),
+                                        **estatisticas_colunas[coluna] }
+                              for coluna, valor, percentil, quartil in zip(colunas, linha_valores, linha_percentis, linha_quartis) }
+                })
+            _, gravados = self.db.upsert_documentos(nome_colecao=config.COLECAO_RANKING, documentos=documentos)
+            numero_registros = numero_registros + gravados
+        return numero_registros
+
+    def atualiza_dependentes(self, competencias: set, recalcula_gravadas: bool = False) -> int:
+        """
+        Recalcula a variação mensal dos meses seguintes às competências recém-gravadas que não fazem parte delas.
+        A variação do mês M+1 depende apenas dos valores de M e M+1, então só os sucessores diretos são afetados;
+        os valores dos sucessores e de seus meses anteriores são lidos em uma única consulta projetada
+        e as variações são gravadas em uma única escrita em lote.
+
+        Args:
+            competencias (set): Competências (cd_cnes, ano, mes) recém-gravadas.
+            recalcula_gravadas (bool): Se True, recalcula também os sucessores que fazem parte do conjunto. Necessário quando
+                o conjunto foi gravado em várias chamadas fora de ordem (ex.: envio em blocos), em que um mês pode ter sido
+                consolidado antes do mês anterior.
+
+        Returns:
+            int: Número de resultados seguintes atualizados.
+        """
+        anteriores = sorted(competencias if recalcula_gravadas else self.competencias_sem_seguinte(competencias))
+        if not anteriores:
+            return 0
+        seguintes = list(self.competencias_seguintes(pd.DataFrame(anteriores, columns=['cd_cnes', 'ano', 'mes'])).itertuples(index=False, name=None))
+        resultados = self.db.busca_valores_kpis(nome_colecao="resultados_kpis", competencias=sorted(set(anteriores + seguintes)))
+        chaves_seguintes = set(seguintes)
+        encontrados = [(resultado['cd_cnes'], resultado['ano'], resultado['mes']) for resultado in resultados
+                       if (resultado['cd_cnes'], resultado['ano'], resultado['mes']) in chaves_seguintes]
+        if not encontrados:
+            return 0
+
+        variacoes = self.kpi.calcula_variacao(self.kpi.monta_serie_valores(resultados))
+        _, numero_registros = self.db.atualiza_variacoes(nome_colecao="resultados_kpis", variacoes=variacoes.loc[encontrados])
+        return numero_registros
+
+    def consolida_mes(self, cnes: int, ano: int, mes: int, adiadas: set = None) -> tuple[bool, bool]:
+        """
+        Consolida uma competência com uma leitura das métricas, uma leitura projetada do resultado do mês anterior e um único upsert
+        do documento de resultados já com a variação mensal, sem janela em que o resultado fique gravado sem variação.
+
+        Args:
+            cnes (int): CNES da organização.
+            ano (int): Ano da competência.
+            mes (int): Mês da competência.
+            adiadas (set): Se informado, adia a atualização dos derivados (ver grava_resultados).
+
+        Returns:
+            tuple: Sucesso da operação e se havia mês anterior consolidado (variação calculada).
+
+        Raises:
+            Exception: Se as métricas da competência não forem encontradas ou ocorrer erro ao gravar o resultado.
+        """
+        metricas = self.app.cria_dataframe(dados=self.db.busca_metricas( nome_colecao="metricas",
+                                                                         query={ "cd_cnes": int(cnes), "ano": int(ano), "mes": int(mes) } ))
+        documentos = self.calcula_documentos(metricas)
+        confirmacao, _ = self.grava_resultados(documentos, self.kpi.calcula_componentes(metricas), adiadas=adiadas)
+        return confirmacao, any(kpi['variacao'] != "" for kpi in documentos[0]['dados'].values())
+
+    def consolida_lote(self, metricas: pd.DataFrame, grava_metricas: bool = True, incremental: bool = True,
+                       adiadas: set = None) -> tuple[bool, int, int]:
+        """
+        Consolida de uma só vez todas as competências de um DataFrame de métricas validado:
+        calcula KPIs e variações, grava métricas e resultados com upserts em lote e, ao final, atualiza uma única vez
+        a variação dos meses seguintes e o ranking dos meses afetados (ver atualiza_derivados).
+
+        Args:
+            metricas (pd.DataFrame): Métricas validadas de uma ou mais organizações e meses.
+            grava_metricas (bool): Se True, grava também as métricas (False quando já foram gravadas, ex.: envio em blocos).
+            incremental (bool): Se True, recalcula apenas as competências desatualizadas (ver filtra_desatualizadas).
+            adiadas (set): Se informado, adia a atualização dos derivados (ver grava_resultados), ex.: envio em blocos,
+                que consolida cada bloco e atualiza os derivados de todo o arquivo ao final (com recalcula_gravadas).
+
+        Returns:
+            tuple: Sucesso da operação, número de métricas gravadas (0 se grava_metricas for False)
+                e número de competências consolidadas (recalculadas).
+
+        Raises:
+            Exception: Se ocorrer erro ao gravar os documentos.
+        """
+        if metricas.empty:
+            return True, 0, 0
+        metricas = metricas.drop_duplicates(['cd_cnes', 'ano', 'mes'], keep='last').reset_index(drop=True)
+        metricas_gravadas = 0
+        if grava_metricas:
+            _, metricas_gravadas = self.db.upsert_documentos(nome_colecao="metricas", documentos=self.app.adiciona_hash_metricas(metricas).to_dict(orient='records'))
+        if incremental:
+            metricas = self.filtra_desatualizadas(metricas, set())
+            if metricas.empty:
+                return True, metricas_gravadas, 0
+
+        documentos = self.calcula_documentos(metricas)
+        confirmacao, numero_registros = self.grava_resultados(documentos, self.kpi.calcula_componentes(metricas), adiadas=adiadas)
+        return confirmacao, metricas_gravadas, numero_registros
+
+    def backfill(self, cnes: list = None, ano_inicio: int = None, ano_fim: int = None,
+                 tamanho_lote: int = config.TAMANHO_LOTE_BACKFILL, progresso=None,
+                 processos: int = config.PROCESSOS_CONSOLIDACAO, incremental: bool = True) -> tuple[bool, int]:
+        """
+        Reconsolida em lote uma seleção de competências (todas as organizações, um intervalo de anos ou uma lista de CNES).
+        As métricas são lidas em lotes na ordem (cd_cnes, ano, mes), de modo que a cadeia de variações é recalculada em ordem:
+        o mês anterior de cada lote já foi gravado pelo lote anterior ou é lido do banco, e a variação dos meses seguintes
+        fora da seleção é atualizada por atualiza_dependentes.
+        O progresso é registrado em um checkpoint e uma execução interrompida com a mesma seleção continua de onde parou.
+        A variação dos meses seguintes e o ranking dos meses afetados são atualizados uma única vez, ao final.
+
+        Args:
+            cnes (list): Lista de CNES. Padrão: todas as organizações.
+            ano_inicio (int): Primeiro ano (inclusive).
+            ano_fim (int): Último ano (inclusive).
+            tamanho_lote (int): Número de competências por lote.
+            progresso (callable): Função opcional chamada após cada lote com (competências consolidadas, última competência).
+            processos (int): Número de processos. Acima de 1, usa backfill_paralelo.
+            incremental (bool): Se True, recalcula apenas as competências desatualizadas (ver filtra_desatualizadas).
+                Use False para recalcular tudo, ex.: após mudar a fórmula de um KPI.
+
+        Returns:
+            tuple: Sucesso da operação e número de competências consolidadas (recalculadas) nesta execução.
+        """
+        if processos > 1:
+            return self.backfill_paralelo(cnes=cnes, ano_inicio=ano_inicio, ano_fim=ano_fim, processos=processos,
+                                          progresso=progresso, incremental=incremental)
+
+        identificador = self.identifica_selecao("backfill", cnes, ano_inicio, ano_fim)
+        checkpoint = self.db.busca_checkpoint(identificador) or {}
+        ultima = checkpoint.get("ultima")
+        meses = set(tuple(competencia) for competencia in checkpoint.get("meses", []))
+        fronteira = set(tuple(competencia) for competencia in checkpoint.get("fronteira", []))
+        numero_registros = 0
+        alteradas = set()
+
+        filtro = self.db.filtro_selecao(cnes=cnes, ano_inicio=ano_inicio, ano_fim=ano_fim)
+        for lote in self.db.busca_metricas_em_lotes(nome_colecao="metricas", filtro=filtro, apos=ultima, tamanho_lote=tamanho_lote):
+            metricas = pd.DataFrame(lote)
+            if incremental:
+                metricas = self.filtra_desatualizadas(metricas, alteradas)
+            if not metricas.empty:
+                documentos = self.calcula_documentos(metricas)
+                self.grava_resultados(documentos, self.kpi.calcula_componentes(metricas), adiadas=fronteira)
+            else:
+                documentos = []
+            numero_registros = numero_registros + len(documentos)
+            meses.update((documento['ano'], documento['mes']) for documento in documentos)
+            fronteira = self.competencias_sem_seguinte(fronteira)
+            ultima = [int(lote[-1]["cd_cnes"]), int(lote[-1]["ano"]), int(lote[-1]["mes"])]
+            self.db.grava_checkpoint(identificador, ultima=ultima, meses=sorted(meses), fronteira=sorted(fronteira),
+                                     competencias=checkpoint.get("competencias", 0) + numero_registros)
+            if progresso:
+                progresso(numero_registros, tuple(ultima))
+
+        self.atualiza_dependentes(fronteira)
+        self.atualiza_ranking(meses)
+        self.db.remove_checkpoint(identificador)
+        return True, numero_registros
+
+    def identifica_selecao(self, prefixo: str, cnes: list = None, ano_inicio: int = None, ano_fim: int = None) -> str:
+        """
+        Monta o identificador do checkpoint de uma seleção de competências.
+
+        Args:
+            prefixo (str): Tipo da operação.
+            cnes (list): Lista de CNES.
+            ano_inicio (int): Primeiro ano (inclusive).
+            ano_fim (int): Último ano (inclusive).
+
+        Returns:
+            str: Identificador do checkpoint.
+        """
+        selecao = { "cnes": sorted(int(c) for c in cnes) if cnes else None, "ano_inicio": ano_inicio, "ano_fim": ano_fim }
+        return f"{prefixo}:{json.dumps(selecao, sort_keys=True)}"
+
+    def backfill_paralelo(self, cnes: list = None, ano_inicio: int = None, ano_fim: int = None,
+                          processos: int = None, progresso=None, incremental: bool = True) -> tuple[bool, int]:
+        """
+        Reconsolida uma seleção de competências em um pool de processos, particionando o trabalho por cd_cnes.
+        Cada partição reúne meses completos de suas organizações, então a cadeia de variações é a mesma do caminho serial;
+        os resultados são gravados pelo processo principal com upserts em lote. As organizações concluídas são registradas
+        em um checkpoint e uma execução interrompida com a mesma seleção continua pelas pendentes.
+        A variação dos meses seguintes e o ranking dos meses afetados são atualizados uma única vez, ao final.
+
+        Args:
+            cnes (list): Lista de CNES. Padrão: todas as organizações.
+            ano_inicio (int): Primeiro ano (inclusive).
+            ano_fim (int): Último ano (inclusive).
+            processos (int): Número de processos. Padrão: número de CPUs.
+            progresso (callable): Função opcional chamada após cada partição com (competências consolidadas, última competência).
+            incremental (bool): Se True, recalcula apenas as competências desatualizadas (ver filtra_desatualizadas).
+
+        Returns:
+            tuple: Sucesso da operação e número de competências consolidadas (recalculadas) nesta execução.
+        """
+        processos = processos or os.cpu_count()
+        identificador = self.identifica_selecao("backfill-paralelo", cnes, ano_inicio, ano_fim)
+        checkpoint = self.db.busca_checkpoint(identificador) or {}
+        concluidos = set(checkpoint.get("cnes_concluidos", []))
+        meses = set(tuple(competencia) for competencia in checkpoint.get("meses", []))
+        fronteira = set(tuple(competencia) for competencia in checkpoint.get("fronteira", []))
+        numero_registros = 0
+
+        filtro = self.db.filtro_selecao(cnes=cnes, ano_inicio=ano_inicio, ano_fim=ano_fim)
+        pendentes = [c for c in self.db.busca_cnes_selecao(nome_colecao="metricas", filtro=filtro) if c not in concluidos]
+        numero_particoes = min(len(pendentes), processos * config.PARTICOES_POR_PROCESSO)
+        particoes = [pendentes[i::numero_particoes] for i in range(numero_particoes)]
+
+        # spawn em vez de fork: o processo do Streamlit tem várias threads (servidor, monitores do pymongo, sessões) e um fork
+        # poderia copiar para o filho uma trava adquirida (ex.: Cache._trava, GerenciadorConexao._trava) e travar o processo
+        with concurrent.futures.ProcessPoolExecutor(max_workers=processos, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futuros = { executor.submit(consolida_particao, self.db, particao, ano_inicio, ano_fim, incremental): particao for particao in particoes }
+            for futuro in concurrent.futures.as_completed(futuros):
+                documentos, componentes = futuro.result()
+                self.grava_resultados(documentos, componentes, adiadas=fronteira)
+                numero_registros = numero_registros + len(documentos)
+                meses.update((documento['ano'], documento['mes']) for documento in documentos)
+                fronteira = self.competencias_sem_seguinte(fronteira)
+                concluidos.update(futuros[futuro])
+                self.db.grava_checkpoint(identificador, cnes_concluidos=sorted(concluidos), meses=sorted(meses), fronteira=sorted(fronteira),
+                                         competencias=checkpoint.get("competencias", 0) + numero_registros)
+                if progresso and documentos:
+                    progresso(numero_registros, (documentos[-1]["cd_cnes"], documentos[-1]["ano"], documentos[-1]["mes"]))
+
+        self.atualiza_dependentes(fronteira)
+        self.atualiza_ranking(meses)
+        self.db.remove_checkpoint(identificador)
+        return True, numero_registros
@@ -1,5 +1,26 @@
-import re
+import operator
+import functools
+import numpy as np
 import pandas as pd
+import config
+from typing import NamedTuple
+
+class ResultadoKPI(NamedTuple):
+    """
+    Resultado imutável de um KPI em uma competência: valor total e estratificações em ordem fixa.
+    """
+    nome: str
+    valor: float
+    estratificacao: tuple
+
+    def cria_objeto(self) -> dict:
+        """
+        Cria o objeto do KPI no formato do documento de resultados.
+
+        Returns:
+            dict: Objeto do KPI com o valor, a variação e a estratificação.
+        """
+        return { "valor": self.valor, "variacao": "", "estratificacao": [{ "tipo": tipo, "valor": valor } for tipo, valor in self.estratificacao] }
 
 class KPI(object):
     """
@@ -8,185 +29,70 @@ class KPI(object):
 
     def __init__(self):
         """
-        Inicializa os atributos necessários para armazenar o valor do KPI e dados relacionados.
-        """
-        self.rkpi_1 = None
-        self.rkpi_2_clinico = None
-        self.rkpi_2_cirurgico = None
-        self.rkpi_2 = None
-        self.rkpi_3 = None
-        self.rkpi_4_cli_neo_precoce = None
-        self.rkpi_4_cli_neo_tardio = None
-        self.rkpi_4_cli_pedi = None
-        self.rkpi_4_cli_ad = None
-        self.rkpi_4_cli_idoso = None
-        self.rkpi_4_cir_neo_precoce = None
-        self.rkpi_4_cir_neo_tardio = None
-        self.rkpi_4_cir_pedi = None
-        self.rkpi_4_cir_ad = None
-        self.rkpi_4_cir_idoso = None
-        self.rkpi_4_clinico = None
-        self.rkpi_4_cirurgico = None
-        self.rkpi_4_neo_precoce = None
-        self.rkpi_4_neo_tardio = None
-        self.rkpi_4_pedi = None
-        self.rkpi_4_ad = None
-        self.rkpi_4_idoso = None
-        self.rkpi_4 = None
-        self.rkpi_5_cli_pedi = None
-        self.rkpi_5_cli_ad = None
-        self.rkpi_5_cli_idoso = None
-        self.rkpi_5_cir_pedi = None
-        self.rkpi_5_cir_ad = None
-        self.rkpi_5_cir_idoso = None
-        self.rkpi_5_clinico = None
-        self.rkpi_5_cirurgico = None
-        self.rkpi_5_pedi = None
-        self.rkpi_5_ad = None
-        self.rkpi_5_idoso = None
-        self.rkpi_5 = None
-        self.rkpi_6 = None
-        self.rkpi_7_nvl2 = None
-        self.rkpi_7_nvl3 = None
-        self.rkpi_7 = None
-        self.rkpi_8 = None
-        self.rkpi_9 = None
-        self.rkpi_10_ui_neo = None
-        self.rkpi_10_ui_pedi = None
-        self.rkpi_10_ui_ad = None
-        self.rkpi_10_uti_neo = None
-        self.rkpi_10_uti_pedi = None
-        self.rkpi_10_uti_ad = None
-        self.rkpi_10_neo = None
-        self.rkpi_10_pedi = None
-        self.rkpi_10_ad = None
-        self.rkpi_10_ui = None
-        self.rkpi_10_uti = None
-        self.rkpi_10 = None
-        self.rkpi_11_ui_neo = None
-        self.rkpi_11_ui_pedi = None
-        self.rkpi_11_ui_ad = None
-        self.rkpi_11_uti_neo = None
-        self.rkpi_11_uti_pedi = None
-        self.rkpi_11_uti_ad = None
-        self.rkpi_11_neo = None
-        self.rkpi_11_pedi = None
-        self.rkpi_11_ad = None
-        self.rkpi_11_ui = None
-        self.rkpi_11_uti = None
-        self.rkpi_11 = None
-        self.rkpi_12_cir_orto = None
-        self.rkpi_12_cir_n_orto = None
-        self.rkpi_12_cirurgico = None
-        self.rkpi_12 = None
-        self.rkpi_13 = None
-        self.rkpi_14 = None
-        self.dados_resultado_kpi = None
+        Inicializa o KPI compilando o registro declarativo em um plano de avaliação imutável.
+        A instância não guarda resultados entre chamadas e pode ser compartilhada entre sessões e threads.
+        """
+        self.plano = self.compila_plano(config.REGISTRO_KPIS)
         pass
 
-    def validar_kwargs(self, kwargs, chaves_obrigatorias):
+    def monta_serie_valores(self, dados_resultado: list) -> pd.DataFrame:
         """
-        Valida se as chaves obrigatórias estão presentes em kwargs e se seus valores não são nulos.
-        
+        Converte documentos de resultados em uma série temporal colunar com o valor total de cada KPI.
+
         Args:
-            kwargs (dict): Dicionário de argumentos a ser validado.
-            chaves_obrigatorias (list): Lista de chaves obrigatórias que devem existir em kwargs.
+            dados_resultado (list): Objetos mongoDB de resultados de uma ou mais organizações e meses.
 
         Returns:
-            bool: True se todas as validações forem bem-sucedidas.
-
-        Raises:
-            ValueError: Se kwargs estiver vazio ou se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente em kwargs.
-        """
-        if not kwargs:
-            raise ValueError("Os argumentos kwargs não podem estar vazios.")
-        
-        for chave in chaves_obrigatorias:
-            if chave not in kwargs:
-                raise KeyError(f"A chave obrigatória '{chave}' está ausente.")
-        
-        for chave in chaves_obrigatorias:
-            if kwargs[chave] is None:
-                raise ValueError(f"O valor da chave '{chave}' não pode ser nulo.")
-        
-        return True
-    
-    def cria_variavel(self, mascara: str) -> dict:
+            pd.DataFrame: DataFrame com as colunas cd_cnes, ano, mes e uma coluna por KPI.
         """
-        Cria um dicionário com variáveis cujo nome começa com a máscara fornecida.
-        
-        Args:
-            mascara (str): Máscara a ser usada para filtrar as variáveis da classe.
-        
-        Returns:
-            dict: Dicionário com as variáveis filtradas.
-        """        
-        if mascara == 'rkpi_1':            
-            return {name: value for name, value in self.__dict__.items() if name==(mascara)}
-        else:            
-            return {name: value for name, value in self.__dict__.items() if name.startswith(mascara)}
+        kpis = list(config.REGISTRO_KPIS.keys())
+        linhas = [[resultado['cd_cnes'], resultado['ano'], resultado['mes'], *(resultado['dados'][kpi]['valor'] for kpi in kpis)]
+                  for resultado in dados_resultado]
+        return pd.DataFrame(linhas, columns=['cd_cnes', 'ano', 'mes', *kpis])
 
-    def cria_estratificacao(self, mascara: str) -> dict:
+    def calcula_variacao(self, serie: pd.DataFrame, sentidos: dict = None) -> pd.DataFrame:
         """
-        Cria a estratificação com base nas variáveis filtradas pela máscara.
+        Calcula a variação mensal de todos os KPIs para todos os meses e organizações de uma série em uma única operação vetorizada.
+        A variação é 1 quando o KPI melhorou em relação ao mês imediatamente anterior, segundo o sentido de melhora, e 0 caso contrário.
+        Meses sem o mês anterior na série ficam sem variação.
 
         Args:
-            mascara (str): Máscara usada para filtrar as variáveis da classe.
-        
-        Returns:
-            tuple: Contém o dicionário dados_resultado_kpi, o nome da variável principal e a estratificação.
-        """
-        dados_resultado_kpi = self.cria_variavel(mascara)        
-        nome = re.match("^.+_\\d+", list(dados_resultado_kpi.keys())[0]).group(0)
-        estratificacao = []
-
-        if type(dados_resultado_kpi) in [float, int]:
-            pass  # Caso os dados não sejam um dicionário, não há estratificação
-        else:
-            for key in dados_resultado_kpi.keys():                
-                if key != nome:
-                    estratificacao.append({ "tipo": key.replace(nome+'_', ''), "valor": dados_resultado_kpi[key] })                    
-                else:
-                    break
-        return dados_resultado_kpi, nome, estratificacao
-    
-    def cria_objeto(self, mascara: str) -> dict:
-        """
-        Cria um objeto de KPI com base nas variáveis filtradas pela máscara.
-        
-        Args:
-            mascara (str): Máscara a ser usada para filtrar as variáveis da classe.
+            serie (pd.DataFrame): DataFrame com as colunas cd_cnes, ano, mes e uma coluna de valor por KPI (ver monta_serie_valores).
+            sentidos (dict): Sentido de melhora por KPI (1 maior é melhor, -1 menor é melhor). Padrão: config.SENTIDO_KPIS.
 
         Returns:
-            dict: Objeto do KPI com o valor e a estratificação.
+            pd.DataFrame: DataFrame indexado por (cd_cnes, ano, mes) com a variação (Int8, nula sem mês anterior) de cada KPI.
         """
-        dados_resultado_kpi, nome, estratificacao = self.cria_estratificacao(mascara)        
-        return { nome: { "valor": dados_resultado_kpi[nome], "variacao": "", "estratificacao": estratificacao } }
+        sentidos = config.SENTIDO_KPIS if sentidos is None else sentidos
+        kpis = [kpi for kpi in sentidos.keys() if kpi in serie.columns]
+        serie = serie.sort_values(['cd_cnes', 'ano', 'mes']).drop_duplicates(['cd_cnes', 'ano', 'mes'], keep='last')
+
+        periodo = serie['ano'] * 12 + serie['mes']
+        grupos = serie.groupby('cd_cnes', sort=False)
+        consecutivo = (periodo - periodo.groupby(serie['cd_cnes'], sort=False).shift(1)) == 1
+        diferenca = (serie[kpis] - grupos[kpis].shift(1)) * pd.Series(sentidos)[kpis]
+
+        variacao = (diferenca > 0).astype('Int8').where(consecutivo, pd.NA)
+        variacao.index = pd.MultiIndex.from_frame(serie[['cd_cnes', 'ano', 'mes']])
+        return variacao
 
     def calcula_variacao_mensal(self, dados_resultado: list) -> list:
         """
-        Calcula o tipo de variação dos valores entre meses.
+        Calcula o tipo de variação dos valores entre o mês consolidado e o anterior.
         
         Args:
-            dados (list): Objetos mongoDB dos resultados dos meses encontrado.
+            dados_resultado (list): Objetos mongoDB dos resultados dos meses encontrados.
 
         Returns:
-            list: Lista com a variação de cada KPI.
+            list: Lista com a variação de cada KPI do mês mais recente, ou lista vazia se não houver mês anterior.
         """
         if len(dados_resultado) < 2:
             return []
-                
-        df_resultado = pd.DataFrame()
-        for resultado in dados_resultado:
-            ultimo_mes = resultado['dados']
-            df = pd.DataFrame(ultimo_mes).drop(['variacao','estratificacao'], axis=0).reset_index()
-            df.at[0, 'index'] = f"{resultado['ano']}-{resultado['mes']}"
-            df_resultado = pd.concat([df_resultado,df])
-        df_resultado = df_resultado.reset_index(drop=True).sort_values(by='index').T[1:]
-        df_resultado['variacao'] = df_resultado.apply(lambda x: 1 if x[1]>x[0] else 0, axis=1)
 
-        return df_resultado.reset_index()[['index', 'variacao']].to_dict(orient='records')
+        ultimo_mes = self.calcula_variacao(self.monta_serie_valores(dados_resultado)).iloc[-1]
+        if ultimo_mes.isna().all():
+            return []
+        return [{ "index": kpi, "variacao": int(variacao) } for kpi, variacao in ultimo_mes.items()]
 
     def kpi_taxa(self, numerador: int, denominador: int) -> float:
         """
@@ -227,537 +133,219 @@ class KPI(object):
         """
         return (numerador / denominador) * 1000
 
-    def kpi1(self, **kwargs) -> dict:
+    def compila_plano(self, registro: dict) -> tuple:
         """
-        Calcula a proporção de partos vaginais em relação ao total de partos.
+        Compila o registro declarativo de KPIs em um plano de avaliação.
+        Somas de colunas repetidas entre KPIs e estratificações (ex.: saídas por faixa etária nos KPIs 4 e 5) são registradas uma única vez.
 
         Args:
-            kwargs (dict): Dicionário com o total de partos vaginais e cesáreos.
+            registro (dict): Registro no formato de config.REGISTRO_KPIS.
 
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            tuple: Somas distintas (chave, colunas), passos (coluna de resultado, cálculo, chave do numerador, chave do denominador)
+                e estrutura dos resultados (KPI, tipos de estratificação, posição da primeira coluna).
 
         Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """
-        chaves_obrigatorias = ['total_partos_vaginais', 'total_partos_cesareos']
-        if self.validar_kwargs(kwargs, chaves_obrigatorias):        
-            total_partos = kwargs['total_partos_vaginais'] + kwargs['total_partos_cesareos']            
-            self.rkpi_1 = self.kpi_taxa(numerador=kwargs['total_partos_vaginais'],
-                                         denominador=total_partos)
-            return self.cria_objeto('rkpi_1')
-        else:
-            return None
-    
-    def kpi2(self, **kwargs) -> dict:
-        """
-        Calcula a proporção de reinternações em até 30 dias da saída hospitalar.
-        Estratificações: clínico e cirúrgico.
+            ValueError: Se o tipo de cálculo de algum KPI for desconhecido.
+        """
+        calculos = { "taxa": "kpi_taxa", "densidade": "kpi_densidade", "tempo_medio": "kpi_tempo_medio" }
+        somas = {}
+        passos = []
+        estrutura = []
+        for nome, kpi in registro.items():
+            if kpi["calculo"] not in calculos:
+                raise ValueError(f"Tipo de cálculo '{kpi['calculo']}' do KPI '{nome}' desconhecido.")
+            componentes = [(f"{nome}_{tipo}", partes) for tipo, partes in kpi["estratificacao"].items()]
+            componentes.append((nome, kpi["valor"]))
+            estrutura.append((nome, tuple(kpi["estratificacao"].keys()), len(passos)))
+            for coluna_resultado, (numerador, denominador) in componentes:
+                chave_numerador, chave_denominador = tuple(sorted(numerador)), tuple(sorted(denominador))
+                somas.setdefault(chave_numerador, tuple(numerador))
+                somas.setdefault(chave_denominador, tuple(denominador))
+                passos.append((coluna_resultado, calculos[kpi["calculo"]], chave_numerador, chave_denominador))
+        return tuple(somas.items()), tuple(passos), tuple(estrutura)
+
+    def calcula_somas(self, dados: pd.DataFrame) -> dict:
+        """
+        Calcula as somas distintas de colunas do plano compilado (numeradores e denominadores).
 
         Args:
-            kwargs (dict): Dicionário com o total de saídas no mês anterior e o total de reinternações em 30 dias
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dados (pd.DataFrame): DataFrame com as métricas de N competências.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """   
-        chaves_obrigatorias = [
-            'cli_total_reinternacoes_30_dias','cli_total_saida_mes_anterior',
-            'cir_total_reinternacoes_30_dias','cir_total_saida_mes_anterior'
-        ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):                
-            total_reinternacoes_ate_30_dias = kwargs['cli_total_reinternacoes_30_dias']+kwargs['cir_total_reinternacoes_30_dias']
-            total_saidas_mes_anterior = kwargs['cli_total_saida_mes_anterior']+kwargs['cir_total_saida_mes_anterior']
-            self.rkpi_2_clinico = self.kpi_taxa( numerador = kwargs['cli_total_reinternacoes_30_dias'],
-                                         denominador = kwargs['cli_total_saida_mes_anterior'])
-            self.rkpi_2_cirurgico = self.kpi_taxa( numerador = kwargs['cir_total_reinternacoes_30_dias'],
-                                           denominador = kwargs['cir_total_saida_mes_anterior'])
-            self.rkpi_2 = self.kpi_taxa( numerador = total_reinternacoes_ate_30_dias,
-                                       denominador = total_saidas_mes_anterior )            
-            return self.cria_objeto('rkpi_2')
-        else:
-            return None
-    
-    def kpi3(self, **kwargs) -> dict:
-        """
-        Calcula a taxa de parada cardiorrespiratória em unidade de internação.
-        
-        Args:
-            kwargs (dict): Dicionário com o total de pacientes-dia e o total de PCRs
-            
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dict: Série somada por chave de soma do plano.
 
         Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
+            KeyError: Se alguma coluna exigida pelo plano estiver ausente.
         """
-        chaves_obrigatorias = ['total_pcr','total_pacientes_dia']
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):
-            self.rkpi_3 = self.kpi_densidade( numerador = kwargs['total_pcr'],
-                                              denominador = kwargs['total_pacientes_dia'] )
-            return self.cria_objeto('rkpi_3')
-        else:
-            return None        
+        somas_plano = self.plano[0]
+        for _, colunas in somas_plano:
+            for coluna in colunas:
+                if coluna not in dados.columns:
+                    raise KeyError(f"A chave obrigatória '{coluna}' está ausente.")
 
-    def kpi4(self, **kwargs) -> dict:
+        # Cada soma distinta é calculada uma única vez por avaliação
+        return { chave: functools.reduce(operator.add, (dados[coluna] for coluna in colunas)) for chave, colunas in somas_plano }
+
+    def calcula_componentes(self, dados: pd.DataFrame) -> pd.DataFrame:
         """
-        Calcula a taxa de mortalidade institucional.
-        Estratificações: clínico, cirúrgico, neo precoce, neo tardio, pediátrico, adulto, idoso.
+        Calcula o numerador e o denominador de cada KPI/estratificação de várias competências, no formato do cubo (config.COLECAO_CUBO).
 
         Args:
-            kwargs (dict): Dicionário com o total de saídas e o total de óbitos 
-            
+            dados (pd.DataFrame): DataFrame com as métricas de N competências (cd_cnes, ano, mes e métricas).
+
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            pd.DataFrame: Uma linha por competência, KPI e estrato ("" para o valor total), com as colunas
+                cd_cnes, ano, mes, periodo (ano * 12 + mes - 1), kpi, estrato, numerador e denominador.
+        """
+        somas = self.calcula_somas(dados)
+        _, passos, estrutura = self.plano
+        chaves = dados[['cd_cnes', 'ano', 'mes']].astype('int64').reset_index(drop=True)
+        chaves['periodo'] = chaves['ano'] * 12 + chaves['mes'] - 1
+        partes = []
+        for nome, tipos, inicio in estrutura:
+            for estrato, (_, _, numerador, denominador) in zip([*tipos, ""], passos[inicio:inicio+len(tipos)+1]):
+                partes.append(chaves.assign(kpi=nome, estrato=estrato,
+                                            numerador=somas[numerador].to_numpy(dtype='float64'),
+                                            denominador=somas[denominador].to_numpy(dtype='float64')))
+        return pd.concat(partes, ignore_index=True)
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """   
-        # 4. Taxa de mortalidade institucional
-        chaves_obrigatorias = [
-            'cli_neo_precoce_total_obitos','cli_neo_precoce_total_saidas',
-            'cli_neo_tardio_total_obitos','cli_neo_tardio_total_saidas',
-            'cli_pedi_total_obitos','cli_pedi_total_saidas',
-            'cli_ad_total_obitos','cli_ad_total_saidas',
-            'cli_idoso_total_obitos','cli_idoso_total_saidas',
-            'cir_neo_precoce_total_obitos','cir_neo_precoce_total_saidas',
-            'cir_neo_tardio_total_obitos','cir_neo_tardio_total_saidas',
-            'cir_pedi_total_obitos','cir_pedi_total_saidas',
-            'cir_ad_total_obitos','cir_ad_total_saidas',
-            'cir_idoso_total_obitos','cir_idoso_total_saidas'
-        ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):
-            cli_total_obitos = kwargs['cli_neo_precoce_total_obitos']+kwargs['cli_neo_tardio_total_obitos']+kwargs['cli_pedi_total_obitos']+kwargs['cli_ad_total_obitos']+kwargs['cli_idoso_total_obitos']
-            cir_total_obitos = kwargs['cir_neo_precoce_total_obitos']+kwargs['cir_neo_tardio_total_obitos']+kwargs['cir_pedi_total_obitos']+kwargs['cir_ad_total_obitos']+kwargs['cir_idoso_total_obitos']
-            cli_total_saidas = kwargs['cli_neo_precoce_total_saidas']+kwargs['cli_neo_tardio_total_saidas']+kwargs['cli_pedi_total_saidas']+kwargs['cli_ad_total_saidas']+kwargs['cli_idoso_total_saidas']
-            cir_total_saidas = kwargs['cir_neo_precoce_total_saidas']+kwargs['cir_neo_tardio_total_saidas']+kwargs['cir_pedi_total_saidas']+kwargs['cir_ad_total_saidas']+kwargs['cir_idoso_total_saidas']
-            neo_precoce_total_obitos = kwargs['cli_neo_precoce_total_obitos']+kwargs['cir_neo_precoce_total_obitos']
-            neo_tardio_total_obitos = kwargs['cli_neo_tardio_total_obitos']+kwargs['cir_neo_tardio_total_obitos']
-            pedi_total_obitos = kwargs['cli_pedi_total_obitos']+kwargs['cir_pedi_total_obitos']
-            ad_total_obitos = kwargs['cli_ad_total_obitos']+kwargs['cir_ad_total_obitos']
-            idoso_total_obitos = kwargs['cli_idoso_total_obitos']+kwargs['cir_idoso_total_obitos']
-            neo_precoce_total_saidas = kwargs['cli_neo_precoce_total_saidas']+kwargs['cir_neo_precoce_total_saidas']
-            neo_tardio_total_saidas = kwargs['cli_neo_tardio_total_saidas']+kwargs['cir_neo_tardio_total_saidas']
-            pedi_total_saidas = kwargs['cli_pedi_total_saidas']+kwargs['cir_pedi_total_saidas']
-            ad_total_saidas = kwargs['cli_ad_total_saidas']+kwargs['cir_ad_total_saidas']
-            idoso_total_saidas = kwargs['cli_idoso_total_saidas']+kwargs['cir_idoso_total_saidas']
-            total_obitos = cli_total_obitos + cir_total_obitos
-            total_saidas = cli_total_saidas + cir_total_saidas
-
-            self.rkpi_4_cli_neo_precoce = self.kpi_tempo_medio( numerador = kwargs['cli_neo_precoce_total_obitos'],
-                                                          denominador = kwargs['cli_neo_precoce_total_saidas'])
-            self.rkpi_4_cli_neo_tardio = self.kpi_tempo_medio( numerador = kwargs['cli_neo_tardio_total_obitos'],
-                                                         denominador = kwargs['cli_neo_tardio_total_saidas'])
-            self.rkpi_4_cli_pedi = self.kpi_tempo_medio( numerador = kwargs['cli_pedi_total_obitos'],
-                                                   denominador = kwargs['cli_pedi_total_saidas'])
-            self.rkpi_4_cli_ad = self.kpi_tempo_medio( numerador = kwargs['cli_ad_total_obitos'],
-                                                 denominador = kwargs['cli_ad_total_saidas'])
-            self.rkpi_4_cli_idoso = self.kpi_tempo_medio( numerador = kwargs['cli_idoso_total_obitos'],
-                                                    denominador = kwargs['cli_idoso_total_saidas'])
-            self.rkpi_4_cir_neo_precoce = self.kpi_tempo_medio( numerador = kwargs['cir_neo_precoce_total_obitos'],
-                                                          denominador = kwargs['cir_neo_precoce_total_saidas'])
-            self.rkpi_4_cir_neo_tardio = self.kpi_tempo_medio( numerador = kwargs['cir_neo_tardio_total_obitos'],
-                                                         denominador = kwargs['cir_neo_tardio_total_saidas'])
-            self.rkpi_4_cir_pedi = self.kpi_tempo_medio( numerador = kwargs['cir_pedi_total_obitos'],
-                                                   denominador = kwargs['cir_pedi_total_saidas'])
-            self.rkpi_4_cir_ad = self.kpi_tempo_medio( numerador = kwargs['cir_ad_total_obitos'],
-                                                 denominador = kwargs['cir_ad_total_saidas'])
-            self.rkpi_4_cir_idoso = self.kpi_tempo_medio( numerador = kwargs['cir_idoso_total_obitos'],
-                                                    denominador = kwargs['cir_idoso_total_saidas'])            
-            self.rkpi_4_clinico = self.kpi_tempo_medio( numerador = cli_total_obitos,
-                                                  denominador = cli_total_saidas)
-            self.rkpi_4_cirurgico = self.kpi_tempo_medio( numerador = cir_total_obitos,
-                                                    denominador = cir_total_saidas)
-            self.rkpi_4_neo_precoce = self.kpi_tempo_medio( numerador = neo_precoce_total_obitos,
-                                                      denominador = neo_precoce_total_saidas)
-            self.rkpi_4_neo_tardio = self.kpi_tempo_medio( numerador = neo_tardio_total_obitos,
-                                                     denominador = neo_tardio_total_saidas)
-            self.rkpi_4_pedi = self.kpi_tempo_medio( numerador = pedi_total_obitos,
-                                               denominador = pedi_total_saidas)
-            self.rkpi_4_ad = self.kpi_tempo_medio( numerador = ad_total_obitos,
-                                             denominador = ad_total_saidas)
-            self.rkpi_4_idoso = self.kpi_tempo_medio( numerador = idoso_total_obitos,
-                                                denominador = idoso_total_saidas)
-            self.rkpi_4 = self.kpi_tempo_medio( numerador = total_obitos,
-                                                denominador = total_saidas)            
-            return self.cria_objeto('rkpi_4')
-        else:
-            return None
-
-    def kpi5(self, **kwargs) -> dict:
-        """
-        Calcula o tempo médio de internação.
-        Estratificações: clínico, cirúrgico, pediátrico, adulto, idoso.
+    def avalia_componentes(self, componentes: pd.DataFrame) -> pd.Series:
+        """
+        Avalia a fórmula de cada KPI (config.REGISTRO_KPIS) sobre numeradores e denominadores já somados (ex.: fatias do cubo).
 
         Args:
-            kwargs (dict): Dicionário com o total de saídas e o total de pacientes-dia 
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            componentes (pd.DataFrame): DataFrame com as colunas kpi, numerador e denominador.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """        
-        chaves_obrigatorias = [
-            'cli_pedi_total_pacientes_dia','cli_pedi_total_saidas',
-            'cli_ad_total_pacientes_dia','cli_ad_total_saidas',
-            'cli_idoso_total_pacientes_dia','cli_idoso_total_saidas',
-            'cir_pedi_total_pacientes_dia','cir_pedi_total_saidas',
-            'cir_ad_total_pacientes_dia','cir_ad_total_saidas',
-            'cir_idoso_total_pacientes_dia','cir_idoso_total_saidas',
-            ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):
-            cli_total_pacientes_dia = kwargs['cli_pedi_total_pacientes_dia']+kwargs['cli_ad_total_pacientes_dia']+kwargs['cli_idoso_total_pacientes_dia']
-            cir_total_pacientes_dia = kwargs['cir_pedi_total_pacientes_dia']+kwargs['cir_ad_total_pacientes_dia']+kwargs['cir_idoso_total_pacientes_dia']
-            pedi_total_pacientes_dia = kwargs['cir_pedi_total_pacientes_dia']+kwargs['cli_pedi_total_pacientes_dia']
-            ad_total_pacientes_dia = kwargs['cir_ad_total_pacientes_dia']+kwargs['cli_ad_total_pacientes_dia']
-            idoso_total_pacientes_dia = kwargs['cir_idoso_total_pacientes_dia']+kwargs['cli_idoso_total_pacientes_dia']
-            cli_total_saidas = kwargs['cli_pedi_total_saidas']+kwargs['cli_ad_total_saidas']+kwargs['cli_idoso_total_saidas']
-            cir_total_saidas = kwargs['cir_pedi_total_saidas']+kwargs['cir_ad_total_saidas']+kwargs['cir_idoso_total_saidas']
-            pedi_total_saidas = kwargs['cir_pedi_total_saidas']+kwargs['cli_pedi_total_saidas']
-            ad_total_saidas = kwargs['cir_ad_total_saidas']+kwargs['cli_ad_total_saidas']
-            idoso_total_saidas = kwargs['cir_idoso_total_saidas']+kwargs['cli_idoso_total_saidas']
-            total_pacientes_dia = cli_total_pacientes_dia + cir_total_pacientes_dia
-            total_saidas = cli_total_saidas + cir_total_saidas
-
-            self.rkpi_5_cli_pedi = self.kpi_tempo_medio( numerador = kwargs['cli_pedi_total_pacientes_dia'],
-                                                   denominador = kwargs['cli_pedi_total_saidas'])
-            self.rkpi_5_cli_ad = self.kpi_tempo_medio( numerador = kwargs['cli_ad_total_pacientes_dia'],
-                                                 denominador = kwargs['cli_ad_total_saidas'])
-            self.rkpi_5_cli_idoso = self.kpi_tempo_medio( numerador = kwargs['cli_idoso_total_pacientes_dia'],
-                                                    denominador = kwargs['cli_idoso_total_saidas'])
-            self.rkpi_5_cir_pedi = self.kpi_tempo_medio( numerador = kwargs['cir_pedi_total_pacientes_dia'],
-                                                   denominador = kwargs['cir_pedi_total_saidas'])
-            self.rkpi_5_cir_ad = self.kpi_tempo_medio( numerador = kwargs['cir_ad_total_pacientes_dia'],
-                                                 denominador = kwargs['cir_ad_total_saidas'])
-            self.rkpi_5_cir_idoso = self.kpi_tempo_medio( numerador = kwargs['cir_idoso_total_pacientes_dia'],
-                                                    denominador = kwargs['cir_idoso_total_saidas'])
-            self.rkpi_5_clinico = self.kpi_tempo_medio( numerador = cli_total_pacientes_dia,
-                                                  denominador = cli_total_saidas)
-            self.rkpi_5_cirurgico = self.kpi_tempo_medio( numerador = cir_total_pacientes_dia,
-                                                    denominador = cir_total_saidas)
-            self.rkpi_5_pedi = self.kpi_tempo_medio( numerador = pedi_total_pacientes_dia,
-                                               denominador = pedi_total_saidas)
-            self.rkpi_5_ad = self.kpi_tempo_medio( numerador = ad_total_pacientes_dia,
-                                             denominador = ad_total_saidas)
-            self.rkpi_5_idoso = self.kpi_tempo_medio( numerador = idoso_total_pacientes_dia,
-                                                denominador = idoso_total_saidas)
-            self.rkpi_5 = self.kpi_tempo_medio( numerador = total_pacientes_dia,
-                                                denominador = total_saidas)            
-            return self.cria_objeto('rkpi_5')
-        else:
-            return None
-
-    def kpi6(self, **kwargs) -> dict:
-        """
-        Calcula o tempo médio de permanência na emergência.
-        
-        Args:
-            kwargs (dict): Dicionário com o total de pacientes que buscaram atendimento e o total de tempo entre a chegada e o término do atendimento.
-            
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            pd.Series: Valor do KPI de cada linha, com o mesmo índice da entrada.
+        """
+        calculos = { "taxa": self.kpi_taxa, "densidade": self.kpi_densidade, "tempo_medio": self.kpi_tempo_medio }
+        fatores = componentes['kpi'].map({ nome: calculos[kpi["calculo"]](numerador=1, denominador=1) for nome, kpi in config.REGISTRO_KPIS.items() })
+        return componentes['numerador'] / componentes['denominador'] * fatores
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """          
-        chaves_obrigatorias = [ 'total_tempo_entrada_termino', 'total_pacientes_buscaram_atendimento' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):
-            self.rkpi_6 = self.kpi_tempo_medio( numerador = kwargs['total_tempo_entrada_termino'],
-                                                denominador = kwargs['total_pacientes_buscaram_atendimento'] )
-            return self.cria_objeto('rkpi_6')
-        else:
-            return None
-
-    def kpi7(self, **kwargs) -> dict:
-        """
-        Calcula o tempo médio de espera na emergência para primeiro atendimento.
-        Estratificações: nível 2 (Laranja, Muito Urgente), nível 3 (Amarelo, Urgente)
+    def calcula_lote(self, dados: pd.DataFrame) -> pd.DataFrame:
+        """
+        Calcula todos os KPIs e suas estratificações para várias competências de uma só vez, avaliando o plano compilado.
+        Cada linha do DataFrame de entrada é uma competência (cd_cnes, ano, mes) no formato de config.COLUNAS_OBIGATORIAS.
 
         Args:
-            kwargs (dict): Dicionário com o total de pacientes que buscaram atendimento e o total de tempo entre a triagem e o início do atendimento médico.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dados (pd.DataFrame): DataFrame com as métricas de N competências.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """          
-        chaves_obrigatorias = [ 'nvl2_total_tempo_espera', 'nvl2_total_pacientes_buscaram_atendimento',
-                                'nvl3_total_tempo_espera', 'nvl3_total_pacientes_buscaram_atendimento' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):
-            total_tempo_espera = kwargs['nvl2_total_tempo_espera']+kwargs['nvl3_total_tempo_espera']
-            total_pacientes_buscaram_atendimento = kwargs['nvl2_total_pacientes_buscaram_atendimento']+kwargs['nvl3_total_pacientes_buscaram_atendimento']
-            self.rkpi_7_nvl2 = self.kpi_tempo_medio( numerador = kwargs['nvl2_total_tempo_espera'],
-                                               denominador = kwargs['nvl2_total_pacientes_buscaram_atendimento'])
-            self.rkpi_7_nvl3 = self.kpi_tempo_medio( numerador = kwargs['nvl3_total_tempo_espera'],
-                                               denominador = kwargs['nvl2_total_pacientes_buscaram_atendimento'])
-            self.rkpi_7 = self.kpi_tempo_medio( numerador = total_tempo_espera,
-                                                denominador = total_pacientes_buscaram_atendimento )
-            return self.cria_objeto('rkpi_7')
-        else:
-            return None
-
-    def kpi8(self, **kwargs) -> dict:
-        """
-        Calcula a taxa de início de antibiótico intravenoso profilático.
-        
-        Args:
-            kwargs (dict): Dicionário com o total cirurgias limpas e o total de cirurgias limpas com ATB.
-            
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            pd.DataFrame: DataFrame com uma coluna por KPI/estratificação (rkpi_*), na ordem do registro, e o mesmo índice da entrada.
 
         Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
+            KeyError: Se alguma coluna exigida pelo plano estiver ausente.
         """
-        chaves_obrigatorias = [ 'total_cirurgias_limpas_com_atb', 'total_cirurgias_limpas' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            self.rkpi_8 = self.kpi_taxa( numerador = kwargs['total_cirurgias_limpas_com_atb'],
-                                         denominador = kwargs['total_cirurgias_limpas'] )
-            return self.cria_objeto('rkpi_8')
-        else:
-            return None
+        passos = self.plano[1]
+        somas = self.calcula_somas(dados)
+        resultados = { coluna_resultado: getattr(self, calculo)(numerador=somas[numerador], denominador=somas[denominador])
+                       for coluna_resultado, calculo, numerador, denominador in passos }
+        return pd.DataFrame(resultados, index=dados.index)
 
-    def kpi9(self, **kwargs) -> dict:
+    def calcula_resultados(self, dados: pd.DataFrame) -> list:
         """
-        Calcula a taxa de infecção de sítio cirúrgico em cirurgia limpa.
-        
+        Calcula os KPIs de várias competências e os devolve como registros imutáveis.
+
         Args:
-            kwargs (dict): Dicionário com o total cirurgias limpas no mês anterior e o total de infecções de sítio cirúrgico em até 30 dias.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dados (pd.DataFrame): DataFrame com as métricas de N competências.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
+        Returns:
+            list: Uma tupla de ResultadoKPI por linha, na ordem do registro de KPIs.
         """
-        chaves_obrigatorias = [ 'total_isc_30_dias', 'total_cirurgias_limpas_mes_anterior' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            self.rkpi_9 = self.kpi_taxa( numerador = kwargs['total_isc_30_dias'],
-                                         denominador = kwargs['total_cirurgias_limpas_mes_anterior'] )    
-            return self.cria_objeto('rkpi_9')  
-        else:
-            return None
+        estrutura = self.plano[2]
+        resultados = []
+        for linha in self.calcula_lote(dados).to_numpy().tolist():
+            resultados.append(tuple( ResultadoKPI(nome, linha[inicio+len(tipos)], tuple(zip(tipos, linha[inicio:inicio+len(tipos)])))
+                                     for nome, tipos, inicio in estrutura ))
+        return resultados
 
-    def kpi10(self, **kwargs) -> dict:
+    def agrega_metricas(self, dados: pd.DataFrame, periodo: str) -> pd.DataFrame:
         """
-        Calcula a densidade de incidência de infecção primária de corrente sanguínea (IPCS) em pacientes em uso de cateter venoso central (CVC).
-        Estratificações: uti, unidade de internação, neonatal, pediátrico, adulto.
-        
-        Args:
-            kwargs (dict): Dicionário com o total cateter-dia e o total de infecções de corrente sanguínea.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+        Soma as métricas (config.COLUNAS_METRICAS) de cada organização em janelas de período.
+        Como todos os KPIs são razões de somas de colunas, avaliar o plano sobre as métricas somadas equivale a somar
+        numeradores e denominadores no período, em vez de fazer a média das taxas mensais.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """        
-        chaves_obrigatorias = [
-            'ui_neo_total_ipcs', 'uti_neo_total_ipcs',
-            'ui_pedi_total_ipcs', 'uti_pedi_total_ipcs',
-            'ui_ad_total_ipcs', 'uti_ad_total_ipcs',
-            'ui_neo_total_cvc_dia', 'uti_neo_total_cvc_dia',            
-            'ui_pedi_total_cvc_dia', 'uti_pedi_total_cvc_dia',
-            'ui_ad_total_cvc_dia', 'uti_ad_total_cvc_dia'            
-        ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            ui_total_ipcs = kwargs['ui_neo_total_ipcs']+kwargs['ui_pedi_total_ipcs']+kwargs['ui_ad_total_ipcs']
-            uti_total_ipcs = kwargs['uti_neo_total_ipcs']+kwargs['uti_pedi_total_ipcs']+kwargs['uti_ad_total_ipcs']
-            ui_total_cvc_dia = kwargs['ui_neo_total_cvc_dia']+kwargs['ui_pedi_total_cvc_dia']+kwargs['ui_ad_total_cvc_dia']
-            uti_total_cvc_dia = kwargs['uti_neo_total_cvc_dia']+kwargs['uti_pedi_total_cvc_dia']+kwargs['uti_ad_total_cvc_dia']
-            neo_total_ipcs = kwargs['ui_neo_total_ipcs']+kwargs['uti_neo_total_ipcs']
-            pedi_total_ipcs = kwargs['ui_pedi_total_ipcs']+kwargs['uti_pedi_total_ipcs']
-            ad_total_ipcs = kwargs['ui_ad_total_ipcs']+kwargs['uti_ad_total_ipcs']
-            neo_total_cvc_dia = kwargs['ui_neo_total_cvc_dia']+kwargs['uti_neo_total_cvc_dia']
-            pedi_total_cvc_dia = kwargs['ui_pedi_total_cvc_dia']+kwargs['uti_pedi_total_cvc_dia']
-            ad_total_cvc_dia = kwargs['ui_ad_total_cvc_dia']+kwargs['uti_ad_total_cvc_dia']  
-            total_ipcs = ui_total_ipcs + uti_total_ipcs
-            total_cvc_dia = ui_total_cvc_dia + uti_total_cvc_dia            
-
-            self.rkpi_10_ui_neo = self.kpi_densidade( numerador = kwargs['ui_neo_total_ipcs'],
-                                                denominador = kwargs['ui_neo_total_cvc_dia'] )  
-            self.rkpi_10_ui_pedi = self.kpi_densidade( numerador = kwargs['ui_pedi_total_ipcs'],
-                                                 denominador = kwargs['ui_pedi_total_cvc_dia'] )  
-            self.rkpi_10_ui_ad = self.kpi_densidade( numerador = kwargs['ui_ad_total_ipcs'],
-                                               denominador = kwargs['ui_ad_total_cvc_dia'] )  
-            self.rkpi_10_uti_neo = self.kpi_densidade( numerador = kwargs['uti_neo_total_ipcs'],
-                                                 denominador = kwargs['uti_neo_total_cvc_dia'] )  
-            self.rkpi_10_uti_pedi = self.kpi_densidade( numerador = kwargs['uti_pedi_total_ipcs'],
-                                                  denominador = kwargs['uti_pedi_total_cvc_dia'] )  
-            self.rkpi_10_uti_ad = self.kpi_densidade( numerador = kwargs['uti_ad_total_ipcs'],
-                                                denominador = kwargs['uti_ad_total_cvc_dia'] )  
-            self.rkpi_10_neo = self.kpi_densidade( numerador = neo_total_ipcs,
-                                             denominador = neo_total_cvc_dia )
-            self.rkpi_10_pedi = self.kpi_densidade( numerador = pedi_total_ipcs,
-                                              denominador = pedi_total_cvc_dia )
-            self.rkpi_10_ad = self.kpi_densidade( numerador = ad_total_ipcs,
-                                            denominador = ad_total_cvc_dia )
-            self.rkpi_10_ui = self.kpi_densidade( numerador = ui_total_ipcs,
-                                            denominador = ui_total_cvc_dia )
-            self.rkpi_10_uti = self.kpi_densidade( numerador = uti_total_ipcs,
-                                             denominador = uti_total_cvc_dia ) 
-            self.rkpi_10 = self.kpi_densidade( numerador = total_ipcs,
-                                               denominador = total_cvc_dia )             
-            return self.cria_objeto('rkpi_10')
-        else:
-            return None
-
-    def kpi11(self, **kwargs) -> dict:
-        """
-        Calcula a densidade de incidência de infecção do trato urinário (ITU) associada a um cateter vesical de demora (CVD).
-        Estratificações: uti, unidade de internação, neonatal, pediátrico, adulto.
-        
         Args:
-            kwargs (dict): Dicionário com o total cateter-dia e o total de infecções do trato urinário.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dados (pd.DataFrame): Métricas mensais de uma ou mais organizações (cd_cnes, ano, mes e config.COLUNAS_METRICAS).
+            periodo (str): Janela de agregação (config.PERIODOS_AGREGACAO):
+                "trimestre" (uma linha por trimestre), "acumulado_ano" (do início do ano até cada mês)
+                ou "movel_12" (12 meses terminando em cada mês, atravessando a virada do ano).
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """        
-        chaves_obrigatorias = [
-            'ui_neo_total_itu', 'uti_neo_total_itu',
-            'ui_pedi_total_itu', 'uti_pedi_total_itu',
-            'ui_ad_total_itu', 'uti_ad_total_itu',
-            'ui_neo_total_cvd_dia', 'uti_neo_total_cvd_dia',            
-            'ui_pedi_total_cvd_dia', 'uti_pedi_total_cvd_dia',
-            'ui_ad_total_cvd_dia', 'uti_ad_total_cvd_dia'            
-        ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            ui_total_itu = kwargs['ui_neo_total_itu']+kwargs['ui_pedi_total_itu']+kwargs['ui_ad_total_itu']
-            uti_total_itu = kwargs['uti_neo_total_itu']+kwargs['uti_pedi_total_itu']+kwargs['uti_ad_total_itu']
-            ui_total_cvd_dia = kwargs['ui_neo_total_cvd_dia']+kwargs['ui_pedi_total_cvd_dia']+kwargs['ui_ad_total_cvd_dia']
-            uti_total_cvd_dia = kwargs['uti_neo_total_cvd_dia']+kwargs['uti_pedi_total_cvd_dia']+kwargs['uti_ad_total_cvd_dia']
-            neo_total_itu = kwargs['ui_neo_total_itu']+kwargs['uti_neo_total_itu']
-            pedi_total_itu = kwargs['ui_pedi_total_itu']+kwargs['uti_pedi_total_itu']
-            ad_total_itu = kwargs['ui_ad_total_itu']+kwargs['uti_ad_total_itu']
-            neo_total_cvd_dia = kwargs['ui_neo_total_cvd_dia']+kwargs['uti_neo_total_cvd_dia']
-            pedi_total_cvd_dia = kwargs['ui_pedi_total_cvd_dia']+kwargs['uti_pedi_total_cvd_dia']
-            ad_total_cvd_dia = kwargs['ui_ad_total_cvd_dia']+kwargs['uti_ad_total_cvd_dia']  
-            total_itu = ui_total_itu + uti_total_itu
-            total_cvd_dia = ui_total_cvd_dia + uti_total_cvd_dia            
-
-            self.rkpi_11_ui_neo = self.kpi_densidade( numerador = kwargs['ui_neo_total_itu'],
-                                                denominador = kwargs['ui_neo_total_cvd_dia'] )  
-            self.rkpi_11_ui_pedi = self.kpi_densidade( numerador = kwargs['ui_pedi_total_itu'],
-                                                 denominador = kwargs['ui_pedi_total_cvd_dia'] )  
-            self.rkpi_11_ui_ad = self.kpi_densidade( numerador = kwargs['ui_ad_total_itu'],
-                                               denominador = kwargs['ui_ad_total_cvd_dia'] )  
-            self.rkpi_11_uti_neo = self.kpi_densidade( numerador = kwargs['uti_neo_total_itu'],
-                                                 denominador = kwargs['uti_neo_total_cvd_dia'] )  
-            self.rkpi_11_uti_pedi = self.kpi_densidade( numerador = kwargs['uti_pedi_total_itu'],
-                                                  denominador = kwargs['uti_pedi_total_cvd_dia'] )  
-            self.rkpi_11_uti_ad = self.kpi_densidade( numerador = kwargs['uti_ad_total_itu'],
-                                                denominador = kwargs['uti_ad_total_cvd_dia'] )  
-            self.rkpi_11_neo = self.kpi_densidade( numerador = neo_total_itu,
-                                             denominador = neo_total_cvd_dia )
-            self.rkpi_11_pedi = self.kpi_densidade( numerador = pedi_total_itu,
-                                              denominador = pedi_total_cvd_dia )
-            self.rkpi_11_ad = self.kpi_densidade( numerador = ad_total_itu,
-                                            denominador = ad_total_cvd_dia )
-            self.rkpi_11_ui = self.kpi_densidade( numerador = ui_total_itu,
-                                            denominador = ui_total_cvd_dia )
-            self.rkpi_11_uti = self.kpi_densidade( numerador = uti_total_itu,
-                                             denominador = uti_total_cvd_dia ) 
-            self.rkpi_11 = self.kpi_densidade( numerador = total_itu,
-                                               denominador = total_cvd_dia )            
-            return self.cria_objeto('rkpi_11')
-        else:
-            return None
-
-    def kpi12(self, **kwargs) -> dict:
-        """
-        Calcula a taxa de profilaxia de tromboembolismo venoso.
-        Estratificações: clínico, cirúrgico ortopédico, cirúrgico não ortopédico.
-        
-        Args:
-            kwargs (dict): Dicionário com o total de pacientes em risco trombótico não baixo e o total de pacientes com risco que receberam profilaxia.
-            
         Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            pd.DataFrame: Chaves (cd_cnes, ano e trimestre ou mes), número de meses com dados na janela (meses) e métricas somadas.
 
         Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """           
-        chaves_obrigatorias = [
-            'cli_total_pacientes_risco_profilaxia_TEV','cli_total_pacientes_risco',
-            'cir_orto_total_pacientes_risco_profilaxia_TEV','cir_orto_total_pacientes_risco',
-            'cir_n_orto_total_pacientes_risco_profilaxia_TEV','cir_n_orto_total_pacientes_risco'
-        ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            cir_total_pacientes_risco_profilaxia_TEV = kwargs['cir_orto_total_pacientes_risco_profilaxia_TEV']+kwargs['cir_n_orto_total_pacientes_risco_profilaxia_TEV']
-            total_pacientes_risco_profilaxia_TEV = cir_total_pacientes_risco_profilaxia_TEV+kwargs['cli_total_pacientes_risco_profilaxia_TEV']
-            cir_total_pacientes_risco = kwargs['cir_orto_total_pacientes_risco']+kwargs['cir_n_orto_total_pacientes_risco']
-            total_pacientes_risco = cir_total_pacientes_risco+kwargs['cli_total_pacientes_risco']
-            self.rkpi_12_cir_orto = self.kpi_taxa( numerador = kwargs['cir_orto_total_pacientes_risco_profilaxia_TEV'],
-                                             denominador = kwargs['cir_orto_total_pacientes_risco'])
-            self.rkpi_12_cir_n_orto = self.kpi_taxa( numerador = kwargs['cir_n_orto_total_pacientes_risco_profilaxia_TEV'],
-                                               denominador = kwargs['cir_n_orto_total_pacientes_risco'])
-            self.rkpi_12_cirurgico = self.kpi_taxa( numerador = cir_total_pacientes_risco_profilaxia_TEV,
-                                              denominador = cir_total_pacientes_risco)
-            self.rkpi_12 = self.kpi_taxa( numerador = total_pacientes_risco_profilaxia_TEV,
-                                          denominador = total_pacientes_risco )
-            return self.cria_objeto('rkpi_12')
-        else:
-            return None
-        
-    def kpi13(self, **kwargs) -> dict:
+            ValueError: Se o período for desconhecido.
+        """
+        colunas = config.COLUNAS_METRICAS
+        dados = dados[['cd_cnes', 'ano', 'mes', *colunas]].astype({ 'cd_cnes': 'int64', 'ano': 'int64', 'mes': 'int64', **{ coluna: 'float64' for coluna in colunas } })
+        dados = dados.sort_values(['cd_cnes', 'ano', 'mes']).drop_duplicates(['cd_cnes', 'ano', 'mes'], keep='last').assign(meses=1)
+
+        if periodo == "trimestre":
+            dados = dados.assign(trimestre=(dados['mes'] - 1) // 3 + 1)
+            return dados.groupby(['cd_cnes', 'ano', 'trimestre'], as_index=False)[['meses', *colunas]].sum()
+
+        if periodo == "acumulado_ano":
+            somas = dados.groupby(['cd_cnes', 'ano'], sort=False)[['meses', *colunas]].cumsum()
+            return pd.concat([dados[['cd_cnes', 'ano', 'mes']], somas], axis=1).reset_index(drop=True)
+
+        if periodo == "movel_12":
+            # Grade mensal completa por organização (meses sem dados somam zero), para que a janela conte meses e não linhas
+            dados = dados.assign(periodo=dados['ano'] * 12 + dados['mes'] - 1).set_index(['cd_cnes', 'periodo'])
+            limites = dados.reset_index().groupby('cd_cnes')['periodo'].agg(['min', 'max'])
+            tamanhos = (limites['max'] - limites['min'] + 1).to_numpy()
+            inicios = np.repeat(limites['min'].to_numpy(), tamanhos)
+            deslocamentos = np.arange(tamanhos.sum()) - np.repeat(np.cumsum(tamanhos) - tamanhos, tamanhos)
+            grade = pd.MultiIndex.from_arrays([np.repeat(limites.index.to_numpy(), tamanhos), inicios + deslocamentos], names=['cd_cnes', 'periodo'])
+            completa = dados[['meses', *colunas]].reindex(grade, fill_value=0)
+            somas = completa.groupby(level='cd_cnes').rolling(12, min_periods=1).sum().droplevel(0).loc[dados.index]
+            return pd.concat([dados[['ano', 'mes']], somas], axis=1).reset_index().drop(columns='periodo')
+
+        raise ValueError(f"Período de agregação '{periodo}' desconhecido. Esperado: {', '.join(config.PERIODOS_AGREGACAO)}.")
+
+    def monta_tabela_valores(self, dados_resultado: list) -> pd.DataFrame:
         """
-        Calcula a densidade de incidência de queda resultando em lesão em paciente.
-                
+        Converte documentos de resultados de um mesmo mês em uma tabela colunar com o valor de cada KPI e estratificação.
+
         Args:
-            kwargs (dict): Dicionário com o total de pacientes-dia e o total de quedas com dano.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            dados_resultado (list): Objetos mongoDB de resultados de várias organizações.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
+        Returns:
+            pd.DataFrame: DataFrame indexado por cd_cnes, com uma coluna por KPI/estratificação nos nomes de calcula_lote (rkpi_*).
         """
-        chaves_obrigatorias = [ 'total_quedas_dano', 'total_pacientes_dia' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            self.rkpi_13 = self.kpi_densidade( numerador = kwargs['total_quedas_dano'],
-                                               denominador = kwargs['total_pacientes_dia'] )  
-            return self.cria_objeto('rkpi_13')
-        else:
-            return None
+        linhas = {}
+        for resultado in dados_resultado:
+            valores = {}
+            for kpi, objeto in resultado['dados'].items():
+                for estrato in objeto.get('estratificacao', []):
+                    valores[f"{kpi}_{estrato['tipo']}"] = estrato['valor']
+                valores[kpi] = objeto['valor']
+            linhas[resultado['cd_cnes']] = valores
+        colunas = [coluna for coluna, _, _, _ in self.plano[1]]
+        return pd.DataFrame.from_dict(linhas, orient='index').reindex(columns=colunas).astype('float64').rename_axis('cd_cnes')
 
-    def kpi14(self, **kwargs) -> dict:
+    def calcula_ranking(self, valores: pd.DataFrame, sentidos: dict = None) -> tuple:
         """
-        Calcula a densidade de eventos sentinela.
-                
+        Calcula, de forma vetorizada, a posição de cada organização entre as pares em cada KPI/estratificação de um mês.
+        O percentil considera o sentido de melhora do KPI: 1 é o melhor desempenho. Valores nulos ou infinitos não entram na comparação.
+
         Args:
-            kwargs (dict): Dicionário com o total de pacientes-dia e o total de eventos sentinela.
-            
-        Returns:
-            dict: Objeto com o valor do KPI calculado e a estratificação.
+            valores (pd.DataFrame): Tabela colunar de um mês (ver monta_tabela_valores).
+            sentidos (dict): Sentido de melhora por KPI (1 maior é melhor, -1 menor é melhor). Padrão: config.SENTIDO_KPIS.
 
-        Raises:
-            ValueError: Se algum valor de chave obrigatória for nulo.
-            KeyError: Se alguma chave obrigatória estiver ausente.
-        """
-        chaves_obrigatorias = [ 'total_eventos_sentinela', 'total_pacientes_dia' ]
-        if (self.validar_kwargs(kwargs,chaves_obrigatorias)):        
-            self.rkpi_14 = self.kpi_densidade( numerador = kwargs['total_eventos_sentinela'],
-                                               denominador = kwargs['total_pacientes_dia'] )  
-            return self.cria_objeto('rkpi_14')
-        else:
-            return None     
+        Returns:
+            tuple: Percentis (mesmo formato de valores), quartis de desempenho (1 a 4, sendo 4 o melhor quartil)
+                e estatísticas por coluna (q1, mediana, q3 dos valores e número de organizações comparadas).
+        """
+        sentidos = config.SENTIDO_KPIS if sentidos is None else sentidos
+        kpi_coluna = { coluna: nome for nome, tipos, _ in self.plano[2] for coluna in [*(f"{nome}_{tipo}" for tipo in tipos), nome] }
+        valores = valores.replace([np.inf, -np.inf], np.nan)
+
+        percentis = (valores * pd.Series({ coluna: sentidos[kpi_coluna[coluna]] for coluna in valores.columns })).rank(pct=True)
+        quartis = np.ceil(percentis * 4).clip(1, 4)
+        estatisticas = valores.quantile([0.25, 0.5, 0.75])
+        estatisticas.index = ['q1', 'mediana', 'q3']
+        estatisticas.loc['organizacoes'] = valores.count()
+        return percentis, quartis, estatisticas
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import config
+
+class Validador(object):
+    """
+    Classe para validação vetorizada das métricas enviadas, com base em um conjunto compilado de regras de tipo, intervalo e consistência entre colunas.
+    """
+
+    def __init__(self, regras: list = None):
+        """
+        Inicializa o validador compilando as regras declaradas.
+
+        Args:
+            regras (list): Regras no formato de config.REGRAS_VALIDACAO. Padrão: config.REGRAS_VALIDACAO.
+        """
+        self.regras = self.compila_regras(regras if regras is not None else config.REGRAS_VALIDACAO)
+        pass
+
+    def compila_regras(self, regras: list) -> tuple:
+        """
+        Compila as regras em tuplas imutáveis (nome, tipo, colunas avaliadas, colunas de referência, mínimo, máximo).
+
+        Args:
+            regras (list): Regras a serem compiladas.
+
+        Returns:
+            tuple: Regras compiladas.
+
+        Raises:
+            ValueError: Se o tipo de alguma regra for desconhecido.
+        """
+        compiladas = []
+        for regra in regras:
+            if regra["tipo"] in ["numerico", "inteiro", "intervalo"]:
+                colunas, referencias = tuple(regra["colunas"]), ()
+            elif regra["tipo"] == "menor_igual":
+                colunas, referencias = tuple(a for a, _ in regra["pares"]), tuple(b for _, b in regra["pares"])
+            else:
+                raise ValueError(f"Tipo de regra '{regra['tipo']}' desconhecido.")
+            compiladas.append((regra["nome"], regra["tipo"], colunas, referencias, regra.get("minimo"), regra.get("maximo")))
+        return tuple(compiladas)
+
+    def avalia(self, dataframe: pd.DataFrame) -> pd.DataFrame:
+        """
+        Avalia todas as regras sobre o DataFrame inteiro com máscaras vetorizadas.
+
+        Args:
+            dataframe (pd.DataFrame): Métricas a serem validadas.
+
+        Returns:
+            pd.DataFrame: Relatório compacto com uma linha por violação (linha_arquivo, regra, coluna, valor). Vazio se não houver violações.
+        """
+        colunas_presentes = [coluna for coluna in dataframe.columns if coluna in config.COLUNAS_OBIGATORIAS]
+        originais = dataframe[colunas_presentes]
+        numericos = originais.apply(pd.to_numeric, errors='coerce')
+        linhas_arquivo = dataframe.index.to_numpy() + 2  # Linha 1 do arquivo é o cabeçalho
+
+        partes = []
+        for nome, tipo, colunas, referencias, minimo, maximo in self.regras:
+            pares = [(coluna, referencia) for coluna, referencia in zip(colunas, referencias or colunas)
+                     if coluna in numericos.columns and referencia in numericos.columns]
+            if not pares:
+                continue
+            colunas_regra = [coluna for coluna, _ in pares]
+            valores = numericos[colunas_regra].to_numpy(dtype='float64', na_value=np.nan)
+
+            if tipo == "numerico":
+                mascara = np.isnan(valores) & originais[colunas_regra].notna().to_numpy()
+            elif tipo == "inteiro":
+                mascara = ~np.isnan(valores) & (valores != np.floor(valores))
+            elif tipo == "intervalo":
+                mascara = np.zeros(valores.shape, dtype=bool)
+                if minimo is not None:
+                    mascara |= valores < minimo
+                if maximo is not None:
+                    mascara |= valores > maximo
+            else:
+                referencia = numericos[[referencia for _, referencia in pares]].to_numpy(dtype='float64', na_value=np.nan)
+                mascara = valores > referencia
+
+            linhas, posicoes = np.nonzero(mascara)
+            if len(linhas):
+                partes.append(pd.DataFrame({ "linha_arquivo": linhas_arquivo[linhas],
+                                             "regra": nome,
+                                             "coluna": np.asarray(colunas_regra, dtype=object)[posicoes],
+                                             "valor": valores[linhas, posicoes] }))
+
+        if not partes:
+            return pd.DataFrame(columns=["linha_arquivo", "regra", "coluna", "valor"])
+        return pd.concat(partes, ignore_index=True).sort_values(["linha_arquivo", "regra"], kind="stable").reset_index(drop=True)
+
+    def resume(self, relatorio: pd.DataFrame) -> list:
+        """
+        Resume o relatório de violações por regra.
+
+        Args:
+            relatorio (pd.DataFrame): Relatório gerado por avalia.
+
+        Returns:
+            list: Mensagens no formato "regra: N linha(s)".
+        """
+        contagem = relatorio.groupby("regra", sort=False)["linha_arquivo"].nunique()
+        return [f"{regra}: {quantidade} linha(s)" for regra, quantidade in contagem.items()]
@@ -1,18 +1,146 @@
+import os
+import json
+import datetime
+import threading
 import pandas as pd
 import pymongo as db
 import streamlit as st
 import config
+from src.Cache import cache_leituras, cacheado
+
+class GerenciadorConexao(object):
+    """
+    Mantém um único MongoClient (com seu pool de conexões) por processo, compartilhado por todas as instâncias de dbConfig e sessões.
+    """
+    _clientes = {}
+    _trava = threading.Lock()
+
+    @classmethod
+    def chave(cls, string_conexao: str, opcoes: dict) -> tuple:
+        """
+        Monta a chave do cliente. As opções entram em forma canônica (JSON com chaves ordenadas), pois podem conter listas
+        (ex.: compressors = ["zstd", "zlib"]). O PID faz com que processos filhos criem seus próprios clientes.
+
+        Args:
+            string_conexao (str): URI de conexão do MongoDB.
+            opcoes (dict): Opções do MongoClient.
+
+        Returns:
+            tuple: Chave do cliente.
+        """
+        return (string_conexao, json.dumps(opcoes, sort_keys=True, default=str), os.getpid())
+
+    @classmethod
+    def obtem_cliente(cls, string_conexao: str, opcoes: dict) -> db.MongoClient:
+        """
+        Retorna o cliente compartilhado, criando-o na primeira chamada do processo.
+
+        Args:
+            string_conexao (str): URI de conexão do MongoDB.
+            opcoes (dict): Opções do MongoClient (tamanho do pool, timeouts, compressão).
+
+        Returns:
+            db.MongoClient: Cliente compartilhado.
+        """
+        chave = cls.chave(string_conexao, opcoes)
+        cliente = cls._clientes.get(chave)
+        if cliente is None:
+            with cls._trava:
+                cliente = cls._clientes.get(chave)
+                if cliente is None:
+                    cliente = db.MongoClient(string_conexao, **opcoes)
+                    cls._clientes[chave] = cliente
+        return cliente
+
+    @classmethod
+    def verifica_conexao(cls, string_conexao: str, opcoes: dict) -> bool:
+        """
+        Verifica a conexão com um ping e, em caso de falha, descarta o cliente e tenta reconectar uma vez.
+
+        Args:
+            string_conexao (str): URI de conexão do MongoDB.
+            opcoes (dict): Opções do MongoClient.
+
+        Returns:
+            bool: True se o servidor respondeu ao ping.
+        """
+        try:
+            cls.obtem_cliente(string_conexao, opcoes).admin.command("ping")
+            return True
+        except Exception:
+            with cls._trava:
+                cliente = cls._clientes.pop(cls.chave(string_conexao, opcoes), None)
+            if cliente is not None:
+                cliente.close()
+        try:
+            cls.obtem_cliente(string_conexao, opcoes).admin.command("ping")
+            return True
+        except Exception:
+            return False
+
+    @classmethod
+    def fecha_conexoes(cls) -> None:
+        """
+        Fecha todos os clientes abertos pelo processo atual.
+        """
+        with cls._trava:
+            clientes = [chave for chave in cls._clientes if chave[2] == os.getpid()]
+            for chave in clientes:
+                cls._clientes.pop(chave).close()
 
 class dbConfig(object):
     """
     Classe para gerenciar a configuração e operações do banco de dados MongoDB.
     """
-    def __init__(self):
+    _indices_garantidos = set()
+    _falhas_indices = {}
+    _trava_indices = threading.Lock()
+
+    def __init__(self, string_conexao: str = None, banco: str = None, opcoes: dict = None):
         """
         Inicializa a configuração do banco de dados usando as variáveis armazenadas em Streamlit secrets.
+        As opções de conexão partem de config.MONGO_OPCOES e podem ser sobrescritas na seção [database.OPCOES] dos secrets.
+
+        Args:
+            string_conexao (str): URI de conexão. Padrão: secrets database.MONGO_URI.
+            banco (str): Nome do banco. Padrão: secrets database.DATABASE.
+            opcoes (dict): Opções do MongoClient. Padrão: config.MONGO_OPCOES com as sobrescritas dos secrets.
+        """
+        self.string_conexao = string_conexao or st.secrets.database.MONGO_URI
+        self.banco = banco or st.secrets.database.DATABASE
+        if opcoes is None:
+            opcoes = {**config.MONGO_OPCOES, **st.secrets.database.get("OPCOES", {})}
+        self.opcoes = dict(opcoes)
+
+    def banco_dados(self):
+        """
+        Retorna o banco de dados a partir do cliente compartilhado do processo.
+
+        Returns:
+            Database: Banco de dados MongoDB.
+        """
+        return GerenciadorConexao.obtem_cliente(self.string_conexao, self.opcoes).get_database(self.banco)
+
+    def colecao(self, nome_colecao: str):
+        """
+        Retorna uma coleção a partir do cliente compartilhado do processo.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+
+        Returns:
+            Collection: Coleção MongoDB.
+        """
+        return self.banco_dados().get_collection(nome_colecao)
+
+    def verifica_conexao(self) -> bool:
+        """
+        Verifica se o banco responde e reconecta em caso de falha.
+
+        Returns:
+            bool: True se a conexão estiver saudável.
         """
-        self.string_conexao = st.secrets.database.MONGO_URI
-        self.banco = st.secrets.database.DATABASE
+        return GerenciadorConexao.verifica_conexao(self.string_conexao, self.opcoes)
 
     def validar_query(self, dicionario: dict, chaves_obrigatorias: list) -> bool:
         """
@@ -69,11 +197,8 @@ class dbConfig(object):
             if type(query["mes"]) is not int:
                 raise ValueError("Tipo da chave 'mes' incorreto. Esperado int.")
             try:
-                cursor = db.MongoClient(self.string_conexao)
-                banco = cursor.get_database(self.banco)
-                colecao = banco.get_collection(nome_colecao)
+                colecao = self.colecao(nome_colecao)
                 metricas = colecao.find_one(query)
-                cursor.close()
             except Exception as e:
                 raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
             if not metricas:
@@ -81,8 +206,8 @@ class dbConfig(object):
             else:
                 return metricas
 
-    @st.cache_data(show_spinner=False)
-    def busca_empresas(_self, nome_colecao: str) -> list:
+    @cacheado(lambda nome_colecao: [(nome_colecao, None, None)])
+    def busca_empresas(self, nome_colecao: str) -> list:
         """
         Recupera organizações ativas do banco de dados.
 
@@ -97,24 +222,45 @@ class dbConfig(object):
         """
         query = {"status": "Ativo"}
         try:
-            cursor = db.MongoClient(_self.string_conexao)
-            banco = cursor.get_database(_self.banco)
-            colecao = banco.get_collection(nome_colecao)
+            colecao = self.colecao(nome_colecao)
             empresas = colecao.find(query)
             lista_empresas = [f"{empresa['nome']} ({empresa['cd_cnes']})" for empresa in empresas]
-            cursor.close()
         except Exception as e:
             raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
         return lista_empresas
 
 
-    @st.cache_data(show_spinner=False)
-    def busca_consolidacoes_disponiveis(_self, nome_colecao: str, cnes: int) -> tuple[list, list]:
+    @cacheado(lambda nome_colecao: [(nome_colecao, None, None)])
+    def busca_redes(self, nome_colecao: str) -> dict:
         """
-        Recupera anos e meses disponíveis para consolidar.
+        Recupera as redes (grupos de CNES) definidas no campo config.CAMPO_REDE das organizações ativas.
 
         Args:
             nome_colecao (str): Nome da coleção MongoDB.
+
+        Returns:
+            dict: Lista de CNES por nome de rede.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        query = {"status": "Ativo", config.CAMPO_REDE: {"$exists": True}}
+        campos = {"_id": 0, "cd_cnes": 1, config.CAMPO_REDE: 1}
+        redes = {}
+        try:
+            for empresa in self.colecao(nome_colecao).find(query, campos):
+                redes.setdefault(empresa[config.CAMPO_REDE], []).append(int(empresa["cd_cnes"]))
+        except Exception as e:
+            raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
+        return { rede: sorted(lista_cnes) for rede, lista_cnes in sorted(redes.items()) }
+
+    @cacheado(lambda nome_colecao, cnes: [(config.COLECAO_STATUS, cnes, None)])
+    def busca_consolidacoes_disponiveis(self, nome_colecao: str, cnes: int) -> tuple[list, list]:
+        """
+        Recupera anos e meses disponíveis para consolidar, a partir dos documentos de status da organização (config.COLECAO_STATUS).
+
+        Args:
+            nome_colecao (str): Coleção cujos meses gravados são consultados (chave de config.CAMPOS_STATUS).
             cnes (int): CNES da organização.
 
         Returns:
@@ -123,54 +269,44 @@ class dbConfig(object):
         Raises:
             Exception: Se ocorrer erro ao recuperar os documentos.
         """
-        query = {"cd_cnes": int(cnes)}
-        campos = {"ano": 1, "mes": 1, "_id": 0}
+        campo = config.CAMPOS_STATUS[nome_colecao]
+        query = {"cd_cnes": int(cnes), campo: {"$gt": 0}}
+        campos = {"ano": 1, campo: 1, "_id": 0}
         try:
-            cursor = db.MongoClient(_self.string_conexao)
-            banco = cursor.get_database(_self.banco)
-            colecao = banco.get_collection(nome_colecao)
-            metricas = colecao.find(query, campos)
-            lista_metricas = list(metricas)
-            cursor.close()
+            lista_status = list(self.colecao(config.COLECAO_STATUS).find(query, campos).sort("ano", db.ASCENDING))
         except Exception as e:
             raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
-        return list(pd.array([metrica['ano'] for metrica in lista_metricas]).unique()), [metrica['mes'] for metrica in lista_metricas]
+        return [status['ano'] for status in lista_status], [mes for status in lista_status for mes in range(1, 13) if status[campo] >> (mes - 1) & 1]
 
-    @st.cache_data(show_spinner=False)
-    def busca_ultima_consolidacao(_self, nome_colecao: str, cnes: int) -> list:
+    @cacheado(lambda nome_colecao, cnes: [(config.COLECAO_STATUS, cnes, None)])
+    def busca_ultima_consolidacao(self, nome_colecao: str, cnes: int) -> list:
         """
-        Recupera o último registro de consolidação de dados com base no CNES.
+        Recupera a última competência gravada para o CNES, a partir do documento de status mais recente (config.COLECAO_STATUS).
 
         Args:
-            nome_colecao (str): Nome da coleção MongoDB.
+            nome_colecao (str): Coleção consultada (chave de config.CAMPOS_STATUS).
             cnes (int): CNES da organização.
 
         Returns:
-            list: Dados do último registro encontrado.
+            list: Ano e mês da última competência ou None se não houver resultados.
 
         Raises:
-            IndexError: Se não houver resultados.
             Exception: Se ocorrer erro ao recuperar os documentos.
         """
-        query = {"cd_cnes": int(cnes)}
-        campos = {"ano": 1, "mes": 1, "_id": 0}
-        ordem = [("ano", db.DESCENDING), ("mes", db.DESCENDING)]
+        campo = config.CAMPOS_STATUS[nome_colecao]
+        query = {"cd_cnes": int(cnes), campo: {"$gt": 0}}
+        campos = {"ano": 1, f"ultimo_{campo}": 1, "_id": 0}
         try:
-            cursor = db.MongoClient(_self.string_conexao)
-            banco = cursor.get_database(_self.banco)
-            colecao = banco.get_collection(nome_colecao)
-            ultima_consolidacao = colecao.find(query, campos).sort(ordem)
-            consolidacao = list(ultima_consolidacao)[0]
-            cursor.close()
-        except IndexError:
-            return None
+            status = self.colecao(config.COLECAO_STATUS).find_one(query, campos, sort=[("ano", db.DESCENDING)])
         except Exception as e:
             raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
-        return consolidacao
+        if not status:
+            return None
+        return {"ano": status["ano"], "mes": status[f"ultimo_{campo}"]}
 
     def carrega_dados(self, nome_colecao: str, query: dict) -> bool:
         """
-        Insere dados no banco de dados.
+        Insere ou substitui (upsert) os dados de uma competência (cd_cnes, ano, mes) no banco de dados.
 
         Args:
             nome_colecao (str): Nome da coleção MongoDB.
@@ -189,12 +325,12 @@ class dbConfig(object):
         if self.validar_query(query, chaves_obrigatorias):
             if type(query["cd_cnes"]) is not int:
                 raise ValueError("Tipo da chave 'cd_cnes' incorreto. Esperado int.")
+        filtro = {"cd_cnes": query["cd_cnes"], "ano": int(query["ano"]), "mes": int(query["mes"])}
         try:
-            cursor = db.MongoClient(self.string_conexao)
-            banco = cursor.get_database(self.banco)
-            colecao = banco.get_collection(nome_colecao)
-            retorno = colecao.insert_one(query)
-            cursor.close()
+            colecao = self.colecao(nome_colecao)
+            retorno = colecao.replace_one(filtro, query, upsert=True)  # Reconsolidar a competência substitui o documento existente
+            cache_leituras.invalida(nome_colecao, filtro["cd_cnes"], filtro["ano"])
+            self.atualiza_status(nome_colecao, [filtro], [retorno.upserted_id is not None])
         except Exception as e:
             raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
         if not retorno.acknowledged:
@@ -204,71 +340,585 @@ class dbConfig(object):
 
     def upload_arquivo(self, dataframe: pd.DataFrame, nome_colecao: str) -> tuple[bool, str]:
         """
-        Faz upload de um DataFrame para a coleção MongoDB.
+        Faz upload de um DataFrame para a coleção MongoDB, substituindo as competências já enviadas.
 
         Args:
             dataframe (pd.DataFrame): DataFrame a ser inserido.
             nome_colecao (str): Nome da coleção MongoDB.
 
         Returns:
-            tuple: Sucesso da operação e número de registros inseridos.
-
-        Raises:
-            Exception: Se ocorrer erro ao inserir os dados.
+            tuple: Sucesso da operação e número de registros inseridos ou substituídos.
         """
         if not dataframe.empty:
             query = dataframe.to_dict(orient='records')
             try:
-                cursor = db.MongoClient(self.string_conexao)
-                banco = cursor.get_database(self.banco)
-                colecao = banco.get_collection(nome_colecao)
-                if len(query) == 1:
-                    dados_inseridos = colecao.insert_one(query[0])
-                    numero_registros = 1
-                else:
-                    dados_inseridos = colecao.insert_many(query)
-                    numero_registros = len(dados_inseridos.inserted_ids)
-                cursor.close()
-                return dados_inseridos.acknowledged, str(numero_registros)
+                confirmacao, numero_registros = self.upsert_documentos(nome_colecao=nome_colecao, documentos=query)
+                return confirmacao, str(numero_registros)
             except Exception as e:
                 error = f"Não foi possível salvar os dados devido erro interno do servidor. {e}"
                 return False, error
         else:
             return False, "Dados inválidos"
 
-    @st.cache_data(show_spinner=False)
-    def busca_resumo(_self, cd_cnes: int, ano: int):
+    def busca_checkpoint(self, identificador: str) -> dict:
         """
-        Recupera resumo de métricas e resultados com base em CNES e ano.
+        Recupera o checkpoint de uma operação em lote (envio de arquivo, backfill).
 
         Args:
-            cd_cnes (int): CNES da organização.
-            ano (int): Ano da consulta.
+            identificador (str): Identificador da operação.
 
         Returns:
-            tuple: Métricas e resultados encontrados.
+            dict: Checkpoint encontrado ou None.
+        """
+        try:
+            return self.colecao(config.COLECAO_CHECKPOINTS).find_one({"_id": identificador})
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar o checkpoint devido ao seguinte erro: {e}")
+
+    def grava_checkpoint(self, identificador: str, **dados) -> None:
+        """
+        Grava (upsert) o progresso de uma operação em lote.
+
+        Args:
+            identificador (str): Identificador da operação.
+            dados: Campos do checkpoint (ex.: bloco, registros).
+        """
+        try:
+            self.colecao(config.COLECAO_CHECKPOINTS).update_one({"_id": identificador},
+                                                                {"$set": {**dados, "atualizado_em": datetime.datetime.now(datetime.timezone.utc)}},
+                                                                upsert=True)
+        except Exception as e:
+            raise Exception(f"Não foi possível gravar o checkpoint devido ao seguinte erro: {e}")
+
+    def remove_checkpoint(self, identificador: str) -> None:
+        """
+        Remove o checkpoint de uma operação concluída.
+
+        Args:
+            identificador (str): Identificador da operação.
+        """
+        try:
+            self.colecao(config.COLECAO_CHECKPOINTS).delete_one({"_id": identificador})
+        except Exception as e:
+            raise Exception(f"Não foi possível remover o checkpoint devido ao seguinte erro: {e}")
+
+    def upload_arquivo_em_blocos(self, blocos, nome_colecao: str, identificador: str, progresso=None, apos_bloco=None) -> tuple[bool, str]:
+        """
+        Faz upload de um arquivo em blocos com upserts em lote não ordenados, registrando um checkpoint após cada bloco gravado.
+        Um envio interrompido do mesmo arquivo é retomado a partir do último bloco gravado. Os blocos devem ter sido validados antes
+        do envio (ex.: App.valida_arquivo_em_blocos); se um bloco falhar, os anteriores permanecem gravados e a mensagem informa quantos registros.
+        A memória usada é limitada pelo tamanho do bloco; o pico informado é o maior bloco em memória (DataFrame.memory_usage),
+        medido apenas para este envio, sem rastrear o processo inteiro.
+
+        Args:
+            blocos: Iterável de tuplas (índice do bloco, DataFrame validado), ex.: App.le_arquivo_em_blocos.
+            nome_colecao (str): Nome da coleção MongoDB.
+            identificador (str): Identificador do arquivo (ex.: App.identifica_arquivo).
+            progresso (callable): Função opcional chamada após cada bloco com (índice do bloco, registros gravados, pico de memória em bytes).
+            apos_bloco (callable): Função opcional chamada com o DataFrame de cada bloco gravado, antes do checkpoint (ex.: consolidação automática).
+
+        Returns:
+            tuple: Sucesso da operação e mensagem com o número de registros gravados e o pico de memória.
+        """
+        chave_checkpoint = f"upload:{nome_colecao}:{identificador}"
+        checkpoint = self.busca_checkpoint(chave_checkpoint) or {}
+        ultimo_bloco = checkpoint.get("bloco", -1)
+        numero_registros = checkpoint.get("registros", 0)
+        pico_memoria = 0
+
+        try:
+            for indice, bloco in blocos:
+                if indice <= ultimo_bloco:
+                    continue  # Bloco já gravado em um envio anterior
+                pico_memoria = max(pico_memoria, int(bloco.memory_usage(deep=True).sum()))
+                _, gravados = self.upsert_documentos(nome_colecao=nome_colecao, documentos=bloco.to_dict(orient='records'))
+                numero_registros = numero_registros + gravados
+                if apos_bloco:
+                    apos_bloco(bloco)
+                self.grava_checkpoint(chave_checkpoint, bloco=indice, registros=numero_registros)
+                if progresso:
+                    progresso(indice, numero_registros, pico_memoria)
+        except Exception as e:
+            return False, (f"Não foi possível salvar os dados devido ao seguinte erro: {e}. Os blocos anteriores já foram gravados "
+                           f"({numero_registros} registros); reenvie o arquivo para continuar.")
+
+        self.remove_checkpoint(chave_checkpoint)
+        return True, f"{numero_registros} registros gravados (pico de memória: {pico_memoria / 1024 / 1024:.1f} MB)"
+
+    def invalida_cache(self, nome_colecao: str, filtros: list) -> None:
+        """
+        Invalida as leituras em cache afetadas por escritas em uma coleção, uma vez por (cd_cnes, ano) distinto.
+
+        Args:
+            nome_colecao (str): Coleção alterada.
+            filtros (list): Filtros das escritas, com as chaves cd_cnes e ano.
+        """
+        for cnes, ano in set((filtro["cd_cnes"], filtro["ano"]) for filtro in filtros):
+            cache_leituras.invalida(nome_colecao, cnes, ano)
+
+    def atualiza_status(self, nome_colecao: str, filtros: list, inseridos: list) -> None:
+        """
+        Atualiza os documentos de status (config.COLECAO_STATUS) após escritas em metricas ou resultados_kpis:
+        liga o bit de cada mês gravado, avança o último mês e soma os documentos novos, com operadores atômicos ($bit, $max, $inc).
+        Escritas em outras coleções são ignoradas.
+
+        Args:
+            nome_colecao (str): Coleção alterada.
+            filtros (list): Competências gravadas, com as chaves cd_cnes, ano e mes.
+            inseridos (list): Para cada competência, se o documento foi inserido (True) ou substituído (False).
 
         Raises:
-            Exception: Se ocorrer erro ao recuperar os documentos.
+            Exception: Se ocorrer erro ao gravar os documentos de status.
         """
-        query = {"cd_cnes": cd_cnes, "ano": ano}
-        campos = {"ano": 1, "mes": 1, "_id": 0}
+        campo = config.CAMPOS_STATUS.get(nome_colecao)
+        if not campo or not filtros:
+            return
+        status = {}
+        for filtro, inserido in zip(filtros, inseridos):
+            mascara, ultimo, novos = status.get((int(filtro["cd_cnes"]), int(filtro["ano"])), (0, 0, 0))
+            status[(int(filtro["cd_cnes"]), int(filtro["ano"]))] = (mascara | 1 << (int(filtro["mes"]) - 1), max(ultimo, int(filtro["mes"])), novos + int(inserido))
+        operacoes = [db.UpdateOne({"cd_cnes": cnes, "ano": ano},
+                                  {"$bit": {campo: {"or": mascara}}, "$max": {f"ultimo_{campo}": ultimo}, "$inc": {f"registros_{campo}": novos}},
+                                  upsert=True)
+                     for (cnes, ano), (mascara, ultimo, novos) in status.items()]
         try:
-            cursor = db.MongoClient(_self.string_conexao)
-            banco = cursor.get_database(_self.banco)
-            colecao_resultados = banco.get_collection("resultados_kpis")
-            resultados = colecao_resultados.find(query, campos)
-            lista_resultados = list(resultados)
+            self.colecao(config.COLECAO_STATUS).bulk_write(operacoes, ordered=False)
+        except Exception as e:
+            raise Exception(f"Não foi possível atualizar o status das competências devido ao seguinte erro: {e}")
+        finally:
+            self.invalida_cache(config.COLECAO_STATUS, [{"cd_cnes": cnes, "ano": ano} for cnes, ano in status])
 
-            colecao_metricas = banco.get_collection("metricas")
-            metricas = colecao_metricas.find(query, campos)
-            lista_metricas = list(metricas)
+    def reconstroi_status(self) -> int:
+        """
+        Recalcula todos os documentos de status (config.COLECAO_STATUS) a partir de metricas e resultados_kpis,
+        ex.: para dados gravados antes da sua criação ou após remover duplicados.
+
+        Returns:
+            int: Número de documentos de status gravados.
 
-            cursor.close()
+        Raises:
+            Exception: Se ocorrer erro ao agregar ou gravar os documentos.
+        """
+        pipeline = [ {"$group": {"_id": {"cd_cnes": "$cd_cnes", "ano": "$ano"}, "meses": {"$addToSet": "$mes"}, "registros": {"$sum": 1}}} ]
+        status = {}
+        try:
+            for nome_colecao, campo in config.CAMPOS_STATUS.items():
+                for grupo in self.colecao(nome_colecao).aggregate(pipeline, allowDiskUse=True):
+                    documento = status.setdefault((int(grupo["_id"]["cd_cnes"]), int(grupo["_id"]["ano"])),
+                                                  { chave: 0 for campo_status in config.CAMPOS_STATUS.values()
+                                                    for chave in (campo_status, f"ultimo_{campo_status}", f"registros_{campo_status}") })
+                    meses = [int(mes) for mes in grupo["meses"]]
+                    documento.update({ campo: sum(1 << (mes - 1) for mes in set(meses)),
+                                       f"ultimo_{campo}": max(meses),
+                                       f"registros_{campo}": grupo["registros"] })
+            colecao = self.colecao(config.COLECAO_STATUS)
+            colecao.delete_many({})
+            if status:
+                colecao.insert_many([{"cd_cnes": cnes, "ano": ano, **documento} for (cnes, ano), documento in status.items()])
         except Exception as e:
-            raise Exception("Não foi possível recuperar o documento devido ao seguinte erro: ", e)
+            raise Exception(f"Não foi possível reconstruir o status das competências devido ao seguinte erro: {e}")
+        finally:
+            cache_leituras.invalida(config.COLECAO_STATUS)
+        return len(status)
+
+    def upsert_documentos(self, nome_colecao: str, documentos: list, tamanho_lote: int = 1000) -> tuple[bool, int]:
+        """
+        Insere ou substitui documentos pela chave (cd_cnes, ano, mes) com escritas em lote não ordenadas.
+        Repetir a operação com os mesmos documentos não aumenta a coleção.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            documentos (list): Documentos com as chaves cd_cnes, ano e mes.
+            tamanho_lote (int): Quantidade máxima de operações por bulk_write.
+
+        Returns:
+            tuple: Confirmação da operação e número de documentos inseridos ou substituídos.
+
+        Raises:
+            Exception: Se ocorrer erro ao gravar os documentos.
+        """
+        filtros = [{"cd_cnes": int(documento["cd_cnes"]), "ano": int(documento["ano"]), "mes": int(documento["mes"])} for documento in documentos]
+        operacoes = [db.ReplaceOne(filtro, documento, upsert=True) for filtro, documento in zip(filtros, documentos)]
+        if not operacoes:
+            return True, 0
+
+        numero_registros = 0
+        confirmacao = True
+        try:
+            colecao = self.colecao(nome_colecao)
+            for inicio in range(0, len(operacoes), tamanho_lote):
+                lote = filtros[inicio:inicio+tamanho_lote]
+                try:
+                    resultado = colecao.bulk_write(operacoes[inicio:inicio+tamanho_lote], ordered=False)
+                except db.errors.BulkWriteError as e:
+                    # Escritas não ordenadas: as operações sem erro foram gravadas e entram no status antes de propagar o erro
+                    falhas = set(erro["index"] for erro in e.details.get("writeErrors", []))
+                    inseridos = set(upsert["index"] for upsert in e.details.get("upserted", []))
+                    gravados = [indice for indice in range(len(lote)) if indice not in falhas]
+                    self.atualiza_status(nome_colecao, [lote[indice] for indice in gravados], [indice in inseridos for indice in gravados])
+                    raise
+                numero_registros = numero_registros + resultado.upserted_count + resultado.matched_count
+                confirmacao = confirmacao and resultado.acknowledged
+                self.atualiza_status(nome_colecao, lote, [indice in resultado.upserted_ids for indice in range(len(lote))])
+        except Exception as e:
+            raise Exception(f"Não foi possível salvar os documentos devido ao seguinte erro: {e}")
+        finally:
+            self.invalida_cache(nome_colecao, filtros)
+        return confirmacao, numero_registros
+
+    def upsert_cubo(self, nome_colecao: str, componentes: pd.DataFrame, tamanho_lote: int = 5000) -> tuple[bool, int]:
+        """
+        Insere ou substitui os componentes do cubo pela chave (cd_cnes, ano, mes, kpi, estrato) com escritas em lote não ordenadas.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            componentes (pd.DataFrame): Componentes no formato de KPI.calcula_componentes.
+            tamanho_lote (int): Quantidade máxima de operações por bulk_write.
+
+        Returns:
+            tuple: Confirmação da operação e número de componentes inseridos ou substituídos.
+
+        Raises:
+            Exception: Se ocorrer erro ao gravar os documentos.
+        """
+        if componentes is None or componentes.empty:
+            return True, 0
+        operacoes = [db.ReplaceOne({"cd_cnes": documento["cd_cnes"], "ano": documento["ano"], "mes": documento["mes"],
+                                    "kpi": documento["kpi"], "estrato": documento["estrato"]}, documento, upsert=True)
+                     for documento in componentes.to_dict(orient='records')]
+        numero_registros = 0
+        confirmacao = True
+        try:
+            colecao = self.colecao(nome_colecao)
+            for inicio in range(0, len(operacoes), tamanho_lote):
+                resultado = colecao.bulk_write(operacoes[inicio:inicio+tamanho_lote], ordered=False)
+                numero_registros = numero_registros + resultado.upserted_count + resultado.matched_count
+                confirmacao = confirmacao and resultado.acknowledged
+        except Exception as e:
+            raise Exception(f"Não foi possível salvar os componentes devido ao seguinte erro: {e}")
+        finally:
+            self.invalida_cache(nome_colecao, componentes[["cd_cnes", "ano"]].drop_duplicates().astype(int).to_dict(orient='records'))
+        return confirmacao, numero_registros
+
+    def pipeline_fatia_cubo(self, cnes: list = None, inicio: tuple = None, fim: tuple = None,
+                            kpis: list = None, estratos: list = None, agrupamento: list = None) -> list:
+        """
+        Monta o pipeline de agregação de fatia_cubo (também usado por consultas_catalogadas).
+
+        Args:
+            cnes (list): CNES das organizações. Padrão: todas.
+            inicio (tuple): Competência inicial (ano, mes), inclusive.
+            fim (tuple): Competência final (ano, mes), inclusive.
+            kpis (list): KPIs. Padrão: todos.
+            estratos (list): Estratos ("" para o valor total). Padrão: todos.
+            agrupamento (list): Dimensões do resultado. Padrão: kpi e estrato.
 
-        return lista_metricas, lista_resultados
+        Returns:
+            list: Estágios $match, $group e $sort.
+        """
+        agrupamento = agrupamento or ["kpi", "estrato"]
+        filtro = {}
+        if cnes:
+            filtro["cd_cnes"] = {"$in": [int(c) for c in cnes]}
+        if kpis:
+            filtro["kpi"] = {"$in": list(kpis)}
+        if estratos is not None:
+            filtro["estrato"] = {"$in": list(estratos)}
+        if inicio or fim:
+            filtro["periodo"] = {}
+            if inicio:
+                filtro["periodo"]["$gte"] = int(inicio[0]) * 12 + int(inicio[1]) - 1
+            if fim:
+                filtro["periodo"]["$lte"] = int(fim[0]) * 12 + int(fim[1]) - 1
+        return [ {"$match": filtro},
+                 {"$group": {"_id": {dimensao: f"${dimensao}" for dimensao in agrupamento},
+                             "numerador": {"$sum": "$numerador"},
+                             "denominador": {"$sum": "$denominador"},
+                             "competencias": {"$sum": 1}}},
+                 {"$sort": {f"_id.{dimensao}": 1 for dimensao in agrupamento}} ]
+
+    @cacheado(lambda nome_colecao, cnes, inicio, fim, kpis, estratos, agrupamento: [(nome_colecao, c, None) for c in (cnes or [None])], disco=True)
+    def fatia_cubo(self, nome_colecao: str, cnes: list = None, inicio: tuple = None, fim: tuple = None,
+                   kpis: list = None, estratos: list = None, agrupamento: list = None) -> list:
+        """
+        Recorta o cubo de numeradores e denominadores e soma os componentes no servidor, agrupados pelas dimensões pedidas.
+        Qualquer agregação (período, conjunto de organizações, estrato) é uma soma seguida de uma divisão (ver KPI.avalia_componentes).
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            cnes (list): CNES das organizações. Padrão: todas.
+            inicio (tuple): Competência inicial (ano, mes), inclusive.
+            fim (tuple): Competência final (ano, mes), inclusive.
+            kpis (list): KPIs (ex.: ["rkpi_10"]). Padrão: todos.
+            estratos (list): Estratos (ex.: ["uti_neo"]; "" para o valor total). Padrão: todos.
+            agrupamento (list): Dimensões do resultado, entre cd_cnes, ano, mes, kpi e estrato. Padrão: kpi e estrato.
+
+        Returns:
+            list: Um documento por grupo com as dimensões, numerador, denominador e o número de componentes somados (competencias).
+
+        Raises:
+            Exception: Se ocorrer erro ao executar a agregação.
+        """
+        pipeline = self.pipeline_fatia_cubo(cnes=cnes, inicio=inicio, fim=fim, kpis=kpis, estratos=estratos, agrupamento=agrupamento)
+        try:
+            return [ {**documento["_id"], **{chave: valor for chave, valor in documento.items() if chave != "_id"}}
+                     for documento in self.colecao(nome_colecao).aggregate(pipeline) ]
+        except Exception as e:
+            raise Exception(f"Não foi possível agregar os documentos devido ao seguinte erro: {e}")
+
+    def cria_indices(self, falhas: list = None) -> list:
+        """
+        Cria os índices declarados em config.INDICES_MONGO. A criação é idempotente: índices existentes não são recriados.
+
+        Args:
+            falhas (list): Lista opcional que recebe as mensagens dos índices únicos impedidos por documentos duplicados;
+                quando informada, a criação continua com os demais índices em vez de lançar a exceção.
+
+        Returns:
+            list: Nomes dos índices garantidos.
+
+        Raises:
+            Exception: Se houver documentos duplicados impedindo um índice único (sem a lista de falhas) ou outro erro do banco.
+        """
+        nomes = []
+        for nome_colecao, indices in config.INDICES_MONGO.items():
+            colecao = self.colecao(nome_colecao)
+            for indice in indices:
+                try:
+                    nomes.append(colecao.create_index(indice["chaves"], name=indice["nome"], unique=indice.get("unico", False)))
+                except db.errors.DuplicateKeyError as e:
+                    mensagem = (f"A coleção '{nome_colecao}' possui documentos duplicados para o índice '{indice['nome']}'. "
+                                f"Execute remove_duplicados antes de criar os índices. {e}")
+                    if falhas is None:
+                        raise Exception(mensagem)
+                    falhas.append(mensagem)
+                except Exception as e:
+                    raise Exception(f"Não foi possível criar o índice '{indice['nome']}' devido ao seguinte erro: {e}")
+        return nomes
+
+    def garante_indices(self) -> list:
+        """
+        Cria os índices uma única vez por processo e banco de dados. Índices únicos impedidos por documentos duplicados
+        não interrompem a aplicação: as falhas são registradas e retornadas nas chamadas seguintes, sem nova tentativa.
+        Outros erros (ex.: banco indisponível) são retornados e a criação é tentada novamente na próxima chamada.
+
+        Returns:
+            list: Mensagens dos índices que não puderam ser criados. Vazia se todos foram garantidos.
+        """
+        chave = (self.string_conexao, self.banco, os.getpid())
+        if chave not in dbConfig._indices_garantidos:
+            with dbConfig._trava_indices:
+                if chave not in dbConfig._indices_garantidos:
+                    falhas = []
+                    try:
+                        self.cria_indices(falhas=falhas)
+                    except Exception as e:
+                        return [str(e)]
+                    dbConfig._falhas_indices[chave] = falhas
+                    dbConfig._indices_garantidos.add(chave)
+        return dbConfig._falhas_indices.get(chave, [])
+
+    def consultas_catalogadas(self) -> list:
+        """
+        Lista os formatos de consulta usados pelos métodos de dbConfig, com valores de exemplo, para verificação dos planos de execução.
+        As agregações são catalogadas com o pipeline completo, montado pelos mesmos métodos usados na consulta.
+
+        Returns:
+            list: Tuplas (nome, coleção, filtro de find ou pipeline de aggregate, ordenação).
+        """
+        competencia = {"cd_cnes": 0, "ano": 1900, "mes": 1}
+        return [ ("busca_metricas", "metricas", competencia, None),
+                 ("busca_empresas", "empresas", {"status": "Ativo"}, None),
+                 ("busca_consolidacoes_disponiveis", config.COLECAO_STATUS, {"cd_cnes": 0, "enviado": {"$gt": 0}}, [("ano", db.ASCENDING)]),
+                 ("busca_ultima_consolidacao", config.COLECAO_STATUS, {"cd_cnes": 0, "consolidado": {"$gt": 0}}, [("ano", db.DESCENDING)]),
+                 ("busca_resumo", config.COLECAO_STATUS, {"cd_cnes": 0, "ano": 1900}, None),
+                 ("busca_status_rede", config.COLECAO_STATUS, {"ano": {"$in": [1900, 1901]}}, None),
+                 ("busca_ultimos_resultados", "resultados_kpis", {"cd_cnes": 0, "$or": [{"ano": 1900, "mes": 2}, {"ano": 1900, "mes": 1}]}, None),
+                 ("carrega_dados / upsert_documentos", "resultados_kpis", competencia, None),
+                 ("fatia_cubo", config.COLECAO_CUBO, self.pipeline_fatia_cubo(inicio=(1900, 1), fim=(1900, 12), kpis=["rkpi_0"], estratos=[""]), None),
+                 ("fatia_cubo (cnes)", config.COLECAO_CUBO, self.pipeline_fatia_cubo(cnes=[0], kpis=["rkpi_0"]), None),
+                 ("fatia_cubo (cnes, período)", config.COLECAO_CUBO,
+                  self.pipeline_fatia_cubo(cnes=[0, 1], inicio=(1900, 1), fim=(1900, 12), agrupamento=["kpi", "estrato"]), None),
+                 ("fatia_cubo (estrato, período)", config.COLECAO_CUBO,
+                  self.pipeline_fatia_cubo(inicio=(1900, 1), fim=(1900, 12), estratos=[""], agrupamento=["kpi"]), None),
+                 ("busca_resultados_mes", "resultados_kpis", {"cd_cnes": {"$in": [0, 1]}, "ano": 1900, "mes": 1}, None),
+                 ("busca_ranking", config.COLECAO_RANKING, competencia, None),
+                 ("soma_metricas_rede", "metricas", self.pipeline_soma_metricas_rede(cnes=[0, 1], ano=1900), None),
+                 ("busca_metricas_selecao", "metricas", {"cd_cnes": {"$in": [0]}, "ano": {"$gte": 1900, "$lte": 1901}}, None),
+                 ("busca_metricas_em_lotes", "metricas", {"cd_cnes": {"$in": [0, 1]}, "ano": {"$gte": 1900}},
+                  [("cd_cnes", db.ASCENDING), ("ano", db.ASCENDING), ("mes", db.ASCENDING)]) ]
+
+    def estagios_plano(self, plano) -> list:
+        """
+        Percorre um plano de execução (explain) e coleta o nome de todos os estágios.
+
+        Args:
+            plano: Plano de execução ou parte dele.
+
+        Returns:
+            list: Nomes dos estágios encontrados.
+        """
+        estagios = []
+        if isinstance(plano, dict):
+            if "stage" in plano:
+                estagios.append(plano["stage"])
+            for valor in plano.values():
+                estagios.extend(self.estagios_plano(valor))
+        elif isinstance(plano, list):
+            for valor in plano:
+                estagios.extend(self.estagios_plano(valor))
+        return estagios
+
+    def planos_vencedores(self, explicacao) -> list:
+        """
+        Coleta os planos vencedores (winningPlan) de um explain. O explain de uma agregação traz um plano por cursor
+        (ex.: em stages[0].$cursor.queryPlanner ou em shards), em vez de um único queryPlanner.
+
+        Args:
+            explicacao: Resultado do explain ou parte dele.
+
+        Returns:
+            list: Planos vencedores encontrados.
+        """
+        planos = []
+        if isinstance(explicacao, dict):
+            for chave, valor in explicacao.items():
+                if chave == "winningPlan":
+                    planos.append(valor)
+                else:
+                    planos.extend(self.planos_vencedores(valor))
+        elif isinstance(explicacao, list):
+            for valor in explicacao:
+                planos.extend(self.planos_vencedores(valor))
+        return planos
+
+    def plano_acesso(self, plano):
+        """
+        Localiza, em um plano de agregação executado no motor de consultas, a entrada do estágio GROUP: o acesso aos documentos.
+        Um SORT acima do GROUP ordena os grupos já somados, não os documentos, e não indica falta de índice.
+
+        Args:
+            plano: Plano vencedor ou parte dele.
+
+        Returns:
+            dict: Entrada do primeiro GROUP, ou None se o plano não tiver GROUP.
+        """
+        if isinstance(plano, dict):
+            if plano.get("stage") == "GROUP":
+                return plano.get("inputStage", {})
+            for valor in plano.values():
+                acesso = self.plano_acesso(valor)
+                if acesso is not None:
+                    return acesso
+        elif isinstance(plano, list):
+            for valor in plano:
+                acesso = self.plano_acesso(valor)
+                if acesso is not None:
+                    return acesso
+        return None
+
+    def verifica_consultas(self) -> list:
+        """
+        Executa explain() para cada consulta catalogada (find ou aggregate) e verifica se nenhum plano vencedor usa COLLSCAN
+        ou SORT em memória. Nas agregações, apenas o acesso aos documentos (abaixo do $group) é verificado (ver plano_acesso).
+
+        Returns:
+            list: Tuplas (nome, estágios do plano) de todas as consultas verificadas.
+
+        Raises:
+            Exception: Se alguma consulta usar um estágio proibido (config.ESTAGIOS_PROIBIDOS).
+        """
+        relatorio = []
+        falhas = []
+        for nome, nome_colecao, consulta, ordem in self.consultas_catalogadas():
+            if isinstance(consulta, list):
+                explicacao = self.banco_dados().command("explain", {"aggregate": nome_colecao, "pipeline": consulta, "cursor": {}},
+                                                        verbosity="queryPlanner")
+                estagios = []
+                for plano in self.planos_vencedores(explicacao):
+                    acesso = self.plano_acesso(plano)
+                    estagios.extend(self.estagios_plano(plano if acesso is None else acesso))
+            else:
+                cursor = self.colecao(nome_colecao).find(consulta)
+                if ordem:
+                    cursor = cursor.sort(ordem)
+                plano = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+                estagios = self.estagios_plano(plano)
+            relatorio.append((nome, estagios))
+            proibidos = [estagio for estagio in estagios if estagio in config.ESTAGIOS_PROIBIDOS]
+            if proibidos:
+                falhas.append(f"{nome} ({nome_colecao}): {', '.join(proibidos)}")
+        if falhas:
+            raise Exception(f"Consultas sem índice adequado: {'; '.join(falhas)}")
+        return relatorio
+
+    def remove_duplicados(self, nome_colecao: str) -> int:
+        """
+        Remove documentos duplicados por (cd_cnes, ano, mes), mantendo o inserido por último.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+
+        Returns:
+            int: Número de documentos removidos.
+        """
+        pipeline = [ {"$sort": {"_id": 1}},
+                     {"$group": {"_id": {"cd_cnes": "$cd_cnes", "ano": "$ano", "mes": "$mes"}, "ids": {"$push": "$_id"}, "total": {"$sum": 1}}},
+                     {"$match": {"total": {"$gt": 1}}} ]
+        try:
+            colecao = self.colecao(nome_colecao)
+            removidos = [_id for grupo in colecao.aggregate(pipeline, allowDiskUse=True) for _id in grupo["ids"][:-1]]
+            if not removidos:
+                return 0
+            cache_leituras.invalida(nome_colecao)
+            numero_removidos = colecao.delete_many({"_id": {"$in": removidos}}).deleted_count
+            self.reconstroi_status()
+            return numero_removidos
+        except Exception as e:
+            raise Exception(f"Não foi possível remover os duplicados devido ao seguinte erro: {e}")
+
+    @cacheado(lambda anos: [(config.COLECAO_STATUS, None, ano) for ano in anos])
+    def busca_status_rede(self, anos: list) -> list:
+        """
+        Recupera, em uma única consulta, os documentos de status (config.COLECAO_STATUS) de todas as organizações nos anos informados.
+
+        Args:
+            anos (list): Anos da consulta.
+
+        Returns:
+            list: Documentos com cd_cnes, ano e as máscaras de meses enviados e consolidados.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        campos = {"cd_cnes": 1, "ano": 1, **{campo: 1 for campo in config.CAMPOS_STATUS.values()}, "_id": 0}
+        try:
+            return list(self.colecao(config.COLECAO_STATUS).find({"ano": {"$in": [int(ano) for ano in anos]}}, campos))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar o status das organizações devido ao seguinte erro: {e}")
+
+    @cacheado(lambda cd_cnes, ano: [(config.COLECAO_STATUS, cd_cnes, ano)])
+    def busca_resumo(self, cd_cnes: int, ano: int) -> dict:
+        """
+        Recupera os meses enviados (metricas) e consolidados (resultados_kpis) de uma organização em um ano,
+        como máscaras de bits (bit 0 = janeiro), com uma leitura do documento de status (config.COLECAO_STATUS).
+
+        Args:
+            cd_cnes (int): CNES da organização.
+            ano (int): Ano da consulta.
+
+        Returns:
+            dict: Máscaras {"enviado": int, "consolidado": int}. Ambas 0 se não houver dados.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar o documento.
+        """
+        campos = {campo: 1 for campo in config.CAMPOS_STATUS.values()}
+        try:
+            status = self.colecao(config.COLECAO_STATUS).find_one({"cd_cnes": int(cd_cnes), "ano": int(ano)}, {**campos, "_id": 0}) or {}
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar o resumo devido ao seguinte erro: {e}")
+        return { campo: int(status.get(campo, 0)) for campo in campos }
 
     def busca_ultimos_resultados(self, nome_colecao: str, cnes: int, ano_atual: int, mes_atual: int) -> list:
         """
@@ -299,16 +949,264 @@ class dbConfig(object):
                  "$or": [ {"ano": int(ano_atual), "mes": int(mes_atual)},
                           {"ano": int(ano_anterior), "mes": int(mes_anterior)} ]}
         try:
-            cursor = db.MongoClient(self.string_conexao)
-            banco = cursor.get_database(self.banco)
-            colecao = banco.get_collection(nome_colecao)
+            colecao = self.colecao(nome_colecao)
             resultado_kpis = colecao.find(query)
             resultados = resultado_kpis.to_list()
-            cursor.close()
             return resultados
         except Exception as e:
             raise Exception(f"Não foi possível recuperar o documento devido ao seguinte erro: {e}")
         
+    def filtro_selecao(self, cnes: list = None, ano_inicio: int = None, ano_fim: int = None) -> dict:
+        """
+        Monta o filtro de uma seleção de competências: organizações e intervalo de anos (todos quando omitidos).
+
+        Args:
+            cnes (list): Lista de CNES. Padrão: todas as organizações.
+            ano_inicio (int): Primeiro ano (inclusive).
+            ano_fim (int): Último ano (inclusive).
+
+        Returns:
+            dict: Filtro MongoDB.
+        """
+        filtro = {}
+        if cnes:
+            filtro["cd_cnes"] = {"$in": [int(c) for c in cnes]}
+        if ano_inicio is not None or ano_fim is not None:
+            filtro["ano"] = {}
+            if ano_inicio is not None:
+                filtro["ano"]["$gte"] = int(ano_inicio)
+            if ano_fim is not None:
+                filtro["ano"]["$lte"] = int(ano_fim)
+        return filtro
+
+    def busca_metricas_selecao(self, nome_colecao: str, filtro: dict) -> list:
+        """
+        Recupera em uma única consulta as métricas de uma seleção de competências, projetadas para as chaves e config.COLUNAS_METRICAS
+        (ex.: para os KPIs agregados por período de App.calcular_agregados).
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            filtro (dict): Filtro da seleção (ver filtro_selecao).
+
+        Returns:
+            list: Documentos de métricas.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        campos = {"_id": 0, "cd_cnes": 1, "ano": 1, "mes": 1, **{coluna: 1 for coluna in config.COLUNAS_METRICAS}}
+        try:
+            return list(self.colecao(nome_colecao).find(filtro, campos))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def pipeline_soma_metricas_rede(self, cnes: list, ano: int) -> list:
+        """
+        Monta o pipeline de agregação de soma_metricas_rede (também usado por consultas_catalogadas).
+
+        Args:
+            cnes (list): CNES das organizações do grupo.
+            ano (int): Ano.
+
+        Returns:
+            list: Estágios $match, $group e $sort.
+        """
+        return [ {"$match": {"cd_cnes": {"$in": [int(c) for c in cnes]}, "ano": int(ano)}},
+                 {"$group": {"_id": {"ano": "$ano", "mes": "$mes"},
+                             "organizacoes": {"$sum": 1},
+                             **{coluna: {"$sum": f"${coluna}"} for coluna in config.COLUNAS_METRICAS}}},
+                 {"$sort": {"_id.ano": 1, "_id.mes": 1}} ]
+
+    @cacheado(lambda nome_colecao, cnes, ano: [(nome_colecao, c, ano) for c in cnes], disco=True)
+    def soma_metricas_rede(self, nome_colecao: str, cnes: list, ano: int) -> list:
+        """
+        Soma no servidor, mês a mês, as métricas (config.COLUNAS_METRICAS) de um grupo de organizações em um ano.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            cnes (list): CNES das organizações do grupo.
+            ano (int): Ano.
+
+        Returns:
+            list: Um documento por mês com ano, mes, o número de organizações com dados (organizacoes) e as métricas somadas.
+
+        Raises:
+            Exception: Se ocorrer erro ao executar a agregação.
+        """
+        pipeline = self.pipeline_soma_metricas_rede(cnes=cnes, ano=ano)
+        try:
+            return [ {"ano": documento["_id"]["ano"], "mes": documento["_id"]["mes"], **{chave: valor for chave, valor in documento.items() if chave != "_id"}}
+                     for documento in self.colecao(nome_colecao).aggregate(pipeline) ]
+        except Exception as e:
+            raise Exception(f"Não foi possível agregar os documentos devido ao seguinte erro: {e}")
+
+    def busca_cnes_ativos(self, nome_colecao: str) -> list:
+        """
+        Recupera o CNES das organizações ativas.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+
+        Returns:
+            list: CNES em ordem crescente.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        try:
+            return sorted(int(cnes) for cnes in self.colecao(nome_colecao).distinct("cd_cnes", {"status": "Ativo"}))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def busca_resultados_mes(self, nome_colecao: str, ano: int, mes: int, cnes: list) -> list:
+        """
+        Recupera os resultados de um mês para um conjunto de organizações, projetados para os valores e estratificações.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            ano (int): Ano da competência.
+            mes (int): Mês da competência.
+            cnes (list): CNES das organizações.
+
+        Returns:
+            list: Documentos de resultados (cd_cnes e dados).
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        query = {"cd_cnes": {"$in": [int(c) for c in cnes]}, "ano": int(ano), "mes": int(mes)}
+        campos = {"_id": 0, "cd_cnes": 1, **{f"dados.{kpi}.valor": 1 for kpi in config.REGISTRO_KPIS},
+                  **{f"dados.{kpi}.estratificacao": 1 for kpi in config.REGISTRO_KPIS}}
+        try:
+            return list(self.colecao(nome_colecao).find(query, campos))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def busca_ranking(self, nome_colecao: str, cnes: int, ano: int, mes: int) -> dict:
+        """
+        Recupera, com uma leitura pontual, a posição de uma organização entre as pares em um mês.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            cnes (int): CNES da organização.
+            ano (int): Ano da competência.
+            mes (int): Mês da competência.
+
+        Returns:
+            dict: Documento de ranking ou None se não houver.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar o documento.
+        """
+        try:
+            return self.colecao(nome_colecao).find_one({"cd_cnes": int(cnes), "ano": int(ano), "mes": int(mes)}, {"_id": 0})
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar o documento devido ao seguinte erro: {e}")
+
+    def busca_cnes_selecao(self, nome_colecao: str, filtro: dict) -> list:
+        """
+        Recupera os CNES distintos de uma seleção de competências.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            filtro (dict): Filtro da seleção (ver filtro_selecao).
+
+        Returns:
+            list: CNES em ordem crescente.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        try:
+            return sorted(int(cnes) for cnes in self.colecao(nome_colecao).distinct("cd_cnes", filtro))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def busca_metricas_em_lotes(self, nome_colecao: str, filtro: dict, apos: tuple = None, tamanho_lote: int = 500):
+        """
+        Percorre as métricas de uma seleção em ordem de (cd_cnes, ano, mes), entregando-as em lotes.
+        A ordenação segue o índice único, sem ordenação em memória.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            filtro (dict): Filtro da seleção (ver filtro_selecao).
+            apos (tuple): Competência (cd_cnes, ano, mes) a partir da qual continuar, exclusiva. Usada para retomar a partir de um checkpoint.
+            tamanho_lote (int): Número de documentos por lote.
+
+        Yields:
+            list: Lote de documentos de métricas.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        query = dict(filtro)
+        if apos:
+            cnes, ano, mes = (int(valor) for valor in apos)
+            query = {"$and": [filtro, {"$or": [{"cd_cnes": {"$gt": cnes}},
+                                                {"cd_cnes": cnes, "ano": {"$gt": ano}},
+                                                {"cd_cnes": cnes, "ano": ano, "mes": {"$gt": mes}}]}]}
+        ordem = [("cd_cnes", db.ASCENDING), ("ano", db.ASCENDING), ("mes", db.ASCENDING)]
+        try:
+            cursor = self.colecao(nome_colecao).find(query, {"_id": 0}).sort(ordem).batch_size(tamanho_lote)
+            lote = []
+            for documento in cursor:
+                lote.append(documento)
+                if len(lote) == tamanho_lote:
+                    yield lote
+                    lote = []
+            if lote:
+                yield lote
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def busca_valores_kpis(self, nome_colecao: str, competencias: list) -> list:
+        """
+        Recupera apenas o valor total de cada KPI dos resultados de uma lista de competências.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            competencias (list): Tuplas (cd_cnes, ano, mes).
+
+        Returns:
+            list: Documentos de resultados projetados para cd_cnes, ano, mes e dados.<kpi>.valor.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        if not competencias:
+            return []
+        query = {"$or": [{"cd_cnes": int(cnes), "ano": int(ano), "mes": int(mes)} for cnes, ano, mes in competencias]}
+        campos = {"_id": 0, "cd_cnes": 1, "ano": 1, "mes": 1, **{f"dados.{kpi}.valor": 1 for kpi in config.REGISTRO_KPIS}}
+        try:
+            return list(self.colecao(nome_colecao).find(query, campos))
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
+    def busca_hashes(self, nome_colecao: str, competencias: list) -> dict:
+        """
+        Recupera a impressão digital das métricas (config.CAMPO_HASH_METRICAS) gravada em uma lista de competências.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            competencias (list): Tuplas (cd_cnes, ano, mes).
+
+        Returns:
+            dict: Impressão digital por competência (cd_cnes, ano, mes). Competências sem impressão não são retornadas.
+
+        Raises:
+            Exception: Se ocorrer erro ao recuperar os documentos.
+        """
+        if not competencias:
+            return {}
+        query = {"$or": [{"cd_cnes": int(cnes), "ano": int(ano), "mes": int(mes)} for cnes, ano, mes in competencias]}
+        campos = {"_id": 0, "cd_cnes": 1, "ano": 1, "mes": 1, config.CAMPO_HASH_METRICAS: 1}
+        try:
+            documentos = self.colecao(nome_colecao).find(query, campos)
+            return { (documento["cd_cnes"], documento["ano"], documento["mes"]): documento[config.CAMPO_HASH_METRICAS]
+                     for documento in documentos if config.CAMPO_HASH_METRICAS in documento }
+        except Exception as e:
+            raise Exception(f"Não foi possível recuperar os documentos devido ao seguinte erro: {e}")
+
     def atualiza_variacao_mensal(self, nome_colecao: str, cnes: int, ano: int, mes: int, dados:list) -> tuple[bool, bool]:
         """
         Atualiza os resultados dos KPIs de determinado mês com o tipo de variação dos valores entre meses.
@@ -342,20 +1240,51 @@ class dbConfig(object):
         query = {"cd_cnes": int(cnes),
                 "ano": int(ano),
                 "mes": int(mes)}
-        registros_encontrados = 0
-        registros_atualizados = 0
+        upd = {"$set": {f"dados.{j['index']}.variacao": int(j['variacao']) for j in dados}}
 
         try:
-            cursor = db.MongoClient(self.string_conexao)
-            banco = cursor.get_database(self.banco)
-            colecao = banco.get_collection(nome_colecao)
-            for i,j in enumerate(dados):
-                upd = {"$set": {f"dados.{j['index']}.variacao": int(j['variacao'])}}
-                resultado_atualizacao = colecao.update_one(query,upd)
-                registros_encontrados = registros_encontrados + resultado_atualizacao.matched_count
-                registros_atualizados = registros_atualizados + resultado_atualizacao.modified_count
-            cursor.close()
+            colecao = self.colecao(nome_colecao)
+            colecao.update_one(query, upd)  # Todas as variações do mês em uma única ida ao banco
+            cache_leituras.invalida(nome_colecao, query["cd_cnes"], query["ano"])
             return True, True
         except Exception as e:
             raise Exception(f"Não foi possível recuperar o documento devido ao seguinte erro: {e}")
+
+    def atualiza_variacoes(self, nome_colecao: str, variacoes: pd.DataFrame, tamanho_lote: int = 1000) -> tuple[bool, int]:
+        """
+        Atualiza a variação mensal de várias organizações e meses com escritas em lote não ordenadas.
+
+        Args:
+            nome_colecao (str): Nome da coleção MongoDB.
+            variacoes (pd.DataFrame): Variações indexadas por (cd_cnes, ano, mes), uma coluna por KPI (ver KPI.calcula_variacao).
+                Linhas sem variação (sem mês anterior) são ignoradas.
+            tamanho_lote (int): Quantidade máxima de operações por bulk_write.
+
+        Returns:
+            tuple: Confirmação da operação e número de documentos encontrados.
+
+        Raises:
+            Exception: Se ocorrer erro ao atualizar os documentos.
+        """
+        filtros = []
+        operacoes = []
+        for (cnes, ano, mes), linha in zip(variacoes.index, variacoes.astype(object).to_numpy().tolist()):
+            campos = {f"dados.{kpi}.variacao": int(valor) for kpi, valor in zip(variacoes.columns, linha) if not pd.isna(valor)}
+            if campos:
+                filtros.append({"cd_cnes": int(cnes), "ano": int(ano), "mes": int(mes)})
+                operacoes.append(db.UpdateOne(filtros[-1], {"$set": campos}))
+        if not operacoes:
+            return True, 0
+
+        registros_encontrados = 0
+        try:
+            colecao = self.colecao(nome_colecao)
+            for inicio in range(0, len(operacoes), tamanho_lote):
+                resultado = colecao.bulk_write(operacoes[inicio:inicio+tamanho_lote], ordered=False)
+                registros_encontrados = registros_encontrados + resultado.matched_count
+            return True, registros_encontrados
+        except Exception as e:
+            raise Exception(f"Não foi possível atualizar os documentos devido ao seguinte erro: {e}")
+        finally:
+            self.invalida_cache(nome_colecao, filtros)
         